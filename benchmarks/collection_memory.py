@@ -0,0 +1,49 @@
+"""Memory of sub-collections created by one CSV collector
+
+Usage: python -m benchmarks.collection_memory [count]
+"""
+
+import sys
+import tracemalloc
+
+from django.conf import settings
+
+settings.configure(USE_TZ=True)
+
+from insights_analytics_collector import register  # noqa: E402
+from tests.classes.analytics_collector import AnalyticsCollector  # noqa: E402
+from tests.classes.package import Package  # noqa: E402
+
+
+@register("big_table", "1.0", format="csv", description="Benchmark CSV")
+def big_table(**kwargs):
+    return []
+
+
+def measure(count):
+    collector = AnalyticsCollector(collection_type=AnalyticsCollector.DRY_RUN)
+    collector.last_gathered_entries = {}
+    collection = collector._create_collection(big_table)
+    file_paths = [f"/tmp/big_table_split{i}.csv" for i in range(count)]
+
+    tracemalloc.start()
+    collection._save_gathering(file_paths)
+    package = Package(collector)
+    for sub_collection in collection.sub_collections:
+        package.add_collection(sub_collection)
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    size = measure(count)
+    print(f"sub-collections: {count}")
+    print(f"total: {size / 1048576:.2f} MiB")
+    print(f"per sub-collection: {size / count:.0f} B")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Cold start: time of `import insights_analytics_collector` in a new interpreter
+
+Usage: python -m benchmarks.import_time [repeat]
+"""
+
+import statistics
+import subprocess
+import sys
+
+CODE = """
+import sys, time
+start = time.perf_counter()
+import insights_analytics_collector  # noqa
+elapsed = time.perf_counter() - start
+heavy = [name for name in ("django", "requests") if name in sys.modules]
+print(elapsed, len(sys.modules), ",".join(heavy))
+"""
+
+
+def measure(repeat):
+    results = []
+    for _ in range(repeat):
+        output = subprocess.check_output([sys.executable, "-c", CODE], text=True)
+        elapsed, modules, heavy = (output.strip().split(" ") + [""])[:3]
+        results.append((float(elapsed), int(modules), heavy))
+    return results
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    results = measure(repeat)
+    print(f"median: {statistics.median(r[0] for r in results) * 1000:.1f} ms")
+    print(f"loaded modules: {results[0][1]}")
+    print(f"heavy dependencies imported: {results[0][2] or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
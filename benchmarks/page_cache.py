@@ -0,0 +1,137 @@
+"""Page cache footprint of a large CSV gathering (staged CSVs, tarballs, upload)
+with and without Collector.PAGE_CACHE_FRIENDLY_IO.
+Growth of 'Cached' in /proc/meminfo is sampled during the gathering (Linux only).
+Staging directory must be on a disk filesystem (tmpfs ignores posix_fadvise): set TMPDIR.
+
+Usage: python -m benchmarks.page_cache [GiB]
+"""
+
+import sys
+import threading
+import time
+
+from django.conf import settings
+
+settings.configure(USE_TZ=True)
+
+from insights_analytics_collector import CsvFileSplitter, register  # noqa: E402
+from tests.classes.analytics_collector import AnalyticsCollector  # noqa: E402
+from tests.classes.package import Package  # noqa: E402
+
+MAX_FILE_SIZE = 100 * 1048576
+HEADER = "id,created,host_name,stdout\n"
+SIZE = 2 * 1073741824
+PAGE_CACHE_FRIENDLY = False
+
+
+@register("config", "1.0", config=True)
+def config(**kwargs):
+    return {}
+
+
+@register("big_table", "1.0", format="csv", description="Benchmark CSV")
+def big_table(full_path, **kwargs):
+    file = CsvFileSplitter(
+        filespec=f"{full_path}/big_table",
+        max_file_size=MAX_FILE_SIZE,
+        page_cache_friendly=PAGE_CACHE_FRIENDLY,
+    )
+    file.write(HEADER)
+    chunks = [
+        "".join(
+            f"{c * 10000 + i},2024-01-01 00:{i % 60:02}:00+00,host-{i % 97},ok {c} {i}\n"
+            for i in range(10000)
+        )
+        for c in range(10)
+    ]
+    written = 0
+    while written < SIZE:
+        chunk = chunks[(written // len(chunks[0])) % len(chunks)]
+        file.write(chunk)
+        written += len(chunk)
+    return file.file_list()
+
+
+class Response:
+    status_code = 200
+
+
+class Session:
+    def post(self, url, files, **kwargs):
+        """Reads the tarball like upload does"""
+        while files["file"][1].read(65536):
+            pass
+        return Response()
+
+
+class BenchmarkPackage(Package):
+    MAX_DATA_SIZE = 2 * MAX_FILE_SIZE
+
+    def is_shipping_configured(self):
+        return True
+
+    def _http_session(self):
+        return Session()
+
+    def _get_http_request_headers(self):
+        return {"Content-Type": "application/json"}
+
+
+class BenchmarkCollector(AnalyticsCollector):
+    @staticmethod
+    def _package_class():
+        return BenchmarkPackage
+
+    def _is_shipping_configured(self):
+        return True
+
+
+def cached_kib():
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("Cached:"):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(page_cache_friendly):
+    global PAGE_CACHE_FRIENDLY
+    PAGE_CACHE_FRIENDLY = page_cache_friendly
+    collector = BenchmarkCollector(
+        collector_module=sys.modules[__name__],
+        collection_type=BenchmarkCollector.MANUAL_COLLECTION,
+    )
+    collector.PAGE_CACHE_FRIENDLY_IO = page_cache_friendly
+
+    baseline = cached_kib()
+    peak = [baseline]
+    finished = threading.Event()
+
+    def sample():
+        while not finished.wait(0.1):
+            peak[0] = max(peak[0], cached_kib())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    collector.gather(subset=["config", "big_table"])
+    duration = time.perf_counter() - start
+    finished.set()
+    sampler.join()
+    return duration, (peak[0] - baseline) / 1024
+
+
+def main():
+    global SIZE
+    SIZE = int(float(sys.argv[1]) * 1073741824) if len(sys.argv) > 1 else SIZE
+    print(f"CSV data: {SIZE / 1073741824:.1f} GiB")
+    for page_cache_friendly in (False, True):
+        duration, peak = measure(page_cache_friendly)
+        print(
+            f"PAGE_CACHE_FRIENDLY_IO={page_cache_friendly}: {duration:.1f}s, "
+            f"page cache peak growth {peak:.0f} MiB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Encoding of synthetic tables: CSV (CsvRowsWriter) vs. Parquet (ParquetRowsWriter)
+Compares encode time and size of gzipped tarball (as shipped). Requires pyarrow.
+
+Usage: python -m benchmarks.parquet_vs_csv [rows]
+"""
+
+import os
+import sys
+import tarfile
+import tempfile
+import time
+
+from benchmarks.rows_writer import HEADER, MAX_FILE_SIZE, rows
+from insights_analytics_collector import CsvRowsWriter, ParquetRowsWriter
+
+
+def narrow_rows(count):
+    """Low cardinality columns (i.e. host metrics)"""
+    for i in range(count):
+        yield (i, i // 1000, f"org-{i % 20}", ["ok", "failed", "skipped"][i % 3], i % 7)
+
+
+NARROW_HEADER = ["id", "job_id", "organization", "status", "changed"]
+
+TABLES = {
+    "events": (HEADER, rows),
+    "narrow": (NARROW_HEADER, narrow_rows),
+}
+
+
+def measure(writer_class, header, table_rows, count):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        files = writer_class(directory, "table", MAX_FILE_SIZE).write(
+            header, table_rows(count)
+        )
+        duration = time.perf_counter() - start
+
+        raw_size = sum(os.path.getsize(file) for file in files)
+        tarball = os.path.join(directory, "table.tar.gz")
+        with tarfile.open(tarball, "w:gz") as f:
+            for file in files:
+                f.add(file, arcname=os.path.basename(file))
+        return duration, raw_size, os.path.getsize(tarball)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    print(f"rows: {count}")
+    for table, (header, table_rows) in TABLES.items():
+        for writer_class in (CsvRowsWriter, ParquetRowsWriter):
+            duration, raw_size, gz_size = measure(
+                writer_class, header, table_rows, count
+            )
+            print(
+                f"{table} {writer_class.__name__}: {duration:.2f}s, "
+                f"{raw_size / 1048576:.1f}MB, tar.gz {gz_size / 1048576:.1f}MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Writing rows to CSV files: CsvFileSplitter (line by line) vs. CsvRowsWriter (batches)
+
+Usage: python -m benchmarks.rows_writer [rows]
+"""
+
+import csv
+import sys
+import tempfile
+import time
+
+from insights_analytics_collector import CsvFileSplitter, CsvRowsWriter
+
+HEADER = ["id", "created", "job_id", "event", "host_name", "stdout"]
+MAX_FILE_SIZE = 100 * 1048576
+
+
+def rows(count):
+    for i in range(count):
+        yield (
+            i,
+            "2024-01-01 00:00:00.000000+00:00",
+            i // 100,
+            "runner_on_ok",
+            f"host-{i % 50}.example.com",
+            f'ok: [host-{i % 50}] => {{"changed": false, "msg": "line {i}"}}',
+        )
+
+
+def csv_file_splitter(directory, count):
+    """The usual collector function with CsvFileSplitter"""
+    file = CsvFileSplitter(filespec=f"{directory}/table", max_file_size=MAX_FILE_SIZE)
+    writer = csv.writer(file, lineterminator="\n")
+    writer.writerow(HEADER)
+    for row in rows(count):
+        writer.writerow(row)
+    return file.file_list()
+
+
+def csv_rows_writer(directory, count):
+    return CsvRowsWriter(directory, "table", MAX_FILE_SIZE).write(HEADER, rows(count))
+
+
+def measure(fnc, count):
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        fnc(directory, count)
+        return time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500000
+    print(f"rows: {count}")
+    for fnc in (csv_file_splitter, csv_rows_writer):
+        print(f"{fnc.__name__}: {measure(fnc, count):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
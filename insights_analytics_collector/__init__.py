@@ -1,16 +1,32 @@
+from .adaptive_slicing import AdaptiveSlicing
 from .collection_csv import CollectionCSV
 from .collection_json import CollectionJSON
+from .collection_parquet import CollectionParquet
+from .collection_rows import CollectionRows
 from .collector import Collector
-from .csv_file_splitter import CsvFileSplitter
+from .connection_pool import ConnectionPool
+from .csv_file_splitter import CsvFileSplitter, CsvRowsWriter
 from .decorators import register, slicing
+from .keyset_slicing import KeysetSlicing
 from .package import Package
+from .parquet_writer import ParquetRowsWriter
+from .staging import StagedFile, Staging
 
 __all__ = [
     "Collector",
     "Package",
     "CsvFileSplitter",
+    "CsvRowsWriter",
+    "ParquetRowsWriter",
     "CollectionCSV",
     "CollectionJSON",
+    "CollectionRows",
+    "CollectionParquet",
+    "AdaptiveSlicing",
+    "KeysetSlicing",
+    "ConnectionPool",
+    "Staging",
+    "StagedFile",
     "register",
     "slicing",
 ]
@@ -0,0 +1,129 @@
+import datetime
+
+from .clock import now, timedelta
+from .package import Package
+
+
+class AdaptiveSlicing:
+    """Slicing function (usable as @register(fnc_slicing=...)) which sizes
+    time slices by history of previous gatherings of the same key.
+
+    History is kept by Collector per key (see Collector._load_collection_history()):
+    {
+        'bytes_per_second': <float> - collected bytes per second of slice interval
+        'duration_per_second': <float> - gathering time per second of slice interval
+        'samples': <int> - count of recorded slices
+    }
+    Values are exponential moving averages, so quiet tables get longer slices
+    and busy tables get shorter ones over time.
+
+    :param target_bytes: expected data size of one slice (defaults to Package.MAX_DATA_SIZE)
+    :param target_duration: (timedelta) expected gathering time of one slice (optional)
+    :param min_interval: (timedelta) the shortest slice
+    :param max_interval: (timedelta) the longest slice
+    :param default_interval: (timedelta) slice length if there is no history for the key
+    :param full_sync_since: callable(key) returning start of full sync
+                            (defaults to FULL_SYNC_HORIZON before until)
+    """
+
+    # Weight of the newest slice in moving averages
+    SMOOTHING = 0.3
+    # Full sync without full_sync_since (the longest gathered period, like in Collector)
+    FULL_SYNC_HORIZON = timedelta(weeks=4)
+
+    def __init__(
+        self,
+        target_bytes=Package.MAX_DATA_SIZE,
+        target_duration=None,
+        min_interval=timedelta(hours=1),
+        max_interval=timedelta(days=7),
+        default_interval=timedelta(days=1),
+        full_sync_since=None,
+    ):
+        self.target_bytes = target_bytes
+        self.target_duration = target_duration
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.default_interval = default_interval
+        self.full_sync_since = full_sync_since
+
+    def __call__(
+        self,
+        key,
+        last_gather,
+        since=None,
+        until=None,
+        full_sync_enabled=False,
+        slicing_history=None,
+        **kwargs,
+    ):
+        until = until or now()
+        if full_sync_enabled:
+            since = (
+                self.full_sync_since(key)
+                if self.full_sync_since
+                else until - self.FULL_SYNC_HORIZON
+            )
+        since = since or last_gather
+
+        interval = self.interval(slicing_history)
+        start = since
+        while start < until:
+            end = min(start + interval, until)
+            yield (start, end)
+            start = end
+
+    def interval(self, slicing_history):
+        """Computes length of slices from key's history
+        :param slicing_history: dict or None
+        :return: timedelta
+        """
+        if not slicing_history or not slicing_history.get("samples"):
+            return self.default_interval
+
+        seconds = []
+        bytes_per_second = slicing_history.get("bytes_per_second")
+        if self.target_bytes and bytes_per_second:
+            seconds.append(self.target_bytes / bytes_per_second)
+
+        duration_per_second = slicing_history.get("duration_per_second")
+        if self.target_duration and duration_per_second:
+            seconds.append(self.target_duration.total_seconds() / duration_per_second)
+
+        # No data and no time spent => as long slice as possible
+        interval = timedelta(seconds=min(seconds)) if seconds else self.max_interval
+        return max(self.min_interval, min(interval, self.max_interval))
+
+    @classmethod
+    def record(cls, collection_history, key, since, until, data_size, duration):
+        """Adds gathered slice to the history
+
+        :param collection_history: dict - all keys
+        :param key: collection's key
+        :param since: (datetime) start of slice
+        :param until: (datetime) end of slice
+        :param data_size: (int) bytes collected by slice
+        :param duration: (float) seconds spent by gathering
+        """
+        # i.e. KeysetSlicing's slices are not time based
+        if not isinstance(since, datetime.datetime) or not isinstance(
+            until, datetime.datetime
+        ):
+            return
+        window = (until - since).total_seconds()
+        if window <= 0:
+            return
+
+        entry = collection_history.get(key) or {}
+        samples = entry.get("samples", 0)
+        rates = {
+            "bytes_per_second": data_size / window,
+            "duration_per_second": duration / window,
+        }
+        for name, rate in rates.items():
+            if samples:
+                rate = cls.SMOOTHING * rate + (1 - cls.SMOOTHING) * entry[name]
+            entry[name] = rate
+        entry["samples"] = samples + 1
+
+        collection_history[key] = entry
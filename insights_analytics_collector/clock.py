@@ -0,0 +1,22 @@
+import datetime
+import sys
+from datetime import timedelta
+
+__all__ = ["now", "timedelta"]
+
+
+def now():
+    """Current time. Uses Django's timezone.now() if Django is loaded and configured
+    (respects settings.USE_TZ), otherwise timezone-aware UTC time.
+    Django is not imported by this module.
+    """
+    if _is_django_configured():
+        from django.utils import timezone
+
+        return timezone.now()
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+def _is_django_configured():
+    django_conf = sys.modules.get("django.conf")
+    return django_conf is not None and django_conf.settings.configured
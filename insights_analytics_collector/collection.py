@@ -1,43 +1,157 @@
+import contextlib
+import copy
+import os
+import threading
+import time
 from abc import abstractmethod
 
-from django.utils.timezone import now, timedelta
+from .clock import now, timedelta
+
+
+class CollectionMetadata:
+    """Immutable attributes of function decorated by @register.
+    Shared by all collections (slices, sub-collections) of the function
+    """
+
+    __slots__ = (
+        "key",
+        "version",
+        "description",
+        "data_type",
+        "is_config",
+        "fnc_slicing",
+        "shipping_group",
+        "full_sync_interval_days",
+        "depends_on",
+        "cache_ttl",
+        "priority",
+        "estimate",
+        "probe",
+        "timeout",
+        "retries",
+        "retry_on",
+        "replica_safe",
+    )
+
+    def __init__(self, fnc_collecting):
+        self.key = fnc_collecting.__insights_analytics_key__
+        self.version = fnc_collecting.__insights_analytics_version__
+        self.description = fnc_collecting.__insights_analytics_description__ or ""
+        self.data_type = fnc_collecting.__insights_analytics_type__
+        self.is_config = fnc_collecting.__insights_analytics_config__
+        self.fnc_slicing = fnc_collecting.__insights_analytics_fnc_slicing__
+        self.shipping_group = fnc_collecting.__insights_analytics_shipping_group__
+        self.full_sync_interval_days = (
+            fnc_collecting.__insights_analytics_full_sync_interval_days__
+        )
+        self.depends_on = tuple(fnc_collecting.__insights_analytics_depends_on__)
+        cache_ttl = fnc_collecting.__insights_analytics_cache_ttl__
+        if cache_ttl is not None and not isinstance(cache_ttl, timedelta):
+            cache_ttl = timedelta(seconds=cache_ttl)
+        self.cache_ttl = cache_ttl
+        self.priority = fnc_collecting.__insights_analytics_priority__
+        self.estimate = fnc_collecting.__insights_analytics_estimate__
+        self.probe = fnc_collecting.__insights_analytics_probe__
+        timeout = fnc_collecting.__insights_analytics_timeout__
+        if isinstance(timeout, timedelta):
+            timeout = timeout.total_seconds()
+        self.timeout = timeout
+        self.retries = fnc_collecting.__insights_analytics_retries__
+        self.retry_on = fnc_collecting.__insights_analytics_retry_on__
+        self.replica_safe = fnc_collecting.__insights_analytics_replica_safe__
+
+    @classmethod
+    def for_function(cls, fnc_collecting):
+        """Metadata are cached in decorated function (bound method's function)"""
+        fnc = getattr(fnc_collecting, "__func__", fnc_collecting)
+        metadata = getattr(fnc, "__insights_analytics_metadata__", None)
+        if metadata is None:
+            metadata = cls(fnc)
+            fnc.__insights_analytics_metadata__ = metadata
+        return metadata
 
 
 class Collection:
     """Wrapper for gathering function from Collector.collector_module
     Functions decorated with @register are wrapped by kind of this object.
+
+    There can be tens of thousands of collections (slices, sub-collections),
+    so attributes are slotted and attributes of decorated function are shared
+    (see CollectionMetadata)
     """
 
     COLLECTION_TYPE_CONFIG = "config"
     COLLECTION_TYPE_JSON = "json"
     COLLECTION_TYPE_CSV = "csv"
 
+    __slots__ = (
+        "collector",
+        "fnc_collecting",
+        "fnc_slicing",
+        "metadata",
+        "filename",
+        "since",
+        "until",
+        "full_sync_enabled",
+        "gathering_started_at",
+        "gathering_finished_at",
+        "gathering_successful",
+        "gathering_skipped",
+        "gathering_timed_out",
+        "gathering_attempts",
+        "last_gathered_entry",
+    )
+
     def __init__(self, collector, fnc_collecting):
         self.collector = collector
-        self.logger = collector.logger
         self.fnc_collecting = fnc_collecting
-        self.fnc_slicing = fnc_collecting.__insights_analytics_fnc_slicing__
-        self.is_config = fnc_collecting.__insights_analytics_config__
+        self.metadata = CollectionMetadata.for_function(fnc_collecting)
+        self.fnc_slicing = self.metadata.fnc_slicing
 
-        self.description = fnc_collecting.__insights_analytics_description__ or ""
-        self.key = fnc_collecting.__insights_analytics_key__
-        self.shipping_group = fnc_collecting.__insights_analytics_shipping_group__
-        self.version = fnc_collecting.__insights_analytics_version__
-
-        self.data_type = fnc_collecting.__insights_analytics_type__
         self.filename = f"{self.key}.{self.data_type}"
         # either since/until or full sync(if enabled)
-        self.since = None  # set by Collector._create_collections()
-        self.until = None  # set by Collector._create_collections()
+        self.since = None  # set by for_slice()
+        self.until = None  # set by for_slice()
         self.full_sync_enabled = self._is_full_sync_enabled(
-            fnc_collecting.__insights_analytics_full_sync_interval_days__
+            self.metadata.full_sync_interval_days
         )
 
         self.gathering_started_at = None
         self.gathering_finished_at = None
         self.gathering_successful = None
+        self.gathering_skipped = False
+        self.gathering_timed_out = False
+        self.gathering_attempts = 0
         self.last_gathered_entry = self.collector.last_gathered_entry_for(self.key)
 
+    @property
+    def data_type(self):
+        return self.metadata.data_type
+
+    @property
+    def description(self):
+        return self.metadata.description
+
+    @property
+    def is_config(self):
+        return self.metadata.is_config
+
+    @property
+    def key(self):
+        return self.metadata.key
+
+    @property
+    def logger(self):
+        return self.collector.logger
+
+    @property
+    def shipping_group(self):
+        return self.metadata.shipping_group
+
+    @property
+    def version(self):
+        return self.metadata.version
+
     @abstractmethod
     def add_to_tar(self, tar):
         pass
@@ -53,29 +167,89 @@ class Collection:
     def gather(self, max_data_size):
         self.gathering_started_at = now()
 
+        if self._is_probed_empty():
+            self.gathering_skipped = True
+            self.gathering_successful = True
+            self._set_gathering_finished()
+            return
+
         try:
-            # More collections with the same key (and different since/until)
-            # have the same file names => overwriting! [error]
-            result = self.fnc_collecting(
-                since=self.since,
-                until=self.until,
-                max_data_size=max_data_size,
-                full_path=self.collector.gather_dir,
-                collection_type=self.collector.collection_type,
-            )
-            self._save_gathering(result)
+            while True:
+                self.gathering_attempts += 1
+                try:
+                    self._gather_attempt(max_data_size)
+                    self.gathering_successful = True
+                except Exception as e:
+                    if self._should_retry(e):
+                        backoff = self._retry_backoff()
+                        self.logger.warning(
+                            f"Could not generate metric {self.filename} (attempt {self.gathering_attempts}): {e}, "
+                            f"retrying in {backoff}s"
+                        )
+                        time.sleep(backoff)
+                        continue
 
-            self.gathering_successful = True
-        except Exception as e:
-            self.logger.exception(f"Could not generate metric {self.filename}: {e}")
-            self.gathering_successful = False
+                    if self.gathering_timed_out:
+                        self.logger.error(
+                            f"Could not generate metric {self.filename}: time limit {self.timeout()}s exceeded ({e})"
+                        )
+                    else:
+                        self.logger.exception(
+                            f"Could not generate metric {self.filename}: {e}"
+                        )
+                    self.gathering_successful = False
+                break
         finally:
             self._set_gathering_finished()
 
+    def status(self):
+        """Status of gathering for data_collection_status.csv"""
+        if self.gathering_skipped:
+            return "skipped"
+        if self.gathering_timed_out:
+            return "timeout"
+        return "ok" if self.gathering_successful else "failed"
+
+    def db_pool(self):
+        """Collector's ConnectionPool (or replica's for replica-safe collector), None if not used"""
+        if self.collector.connection_pool is None:
+            return None
+        return self.collector.connection_pool.for_collection(self.metadata.replica_safe)
+
+    def gathered_data_size(self):
+        """Size of all gathered data (including sub-collections)"""
+        return self.data_size()
+
+    def is_coalesced(self):
+        """Slices are added to shared packages instead of being shipped immediately
+        (Collector's coalescing mode)
+        """
+        return self.fnc_slicing is not None and self.collector.coalesce_slices
+
     @abstractmethod
     def is_empty(self):
         pass
 
+    def iter_slices(self, slices=None):
+        """Yields collection for each slice, collections are created lazily
+        (the slicing function is evaluated during iteration).
+        This collection serves as a template and isn't gathered itself.
+
+        :param slices: result of slices(), if it's already called
+        """
+        for since, until in self.slices() if slices is None else slices:
+            yield self.for_slice(since, until)
+
+    def for_slice(self, since, until):
+        """Copy of this collection for one slice.
+        Values computed in __init__ (full sync, last gathered entry) are shared
+        """
+        collection = copy.copy(self)
+        collection.since = since
+        collection.until = until
+        collection._reset_gathering()
+        return collection
+
     def slices(self):
         since = self.collector.gather_since
         until = self.collector.gather_until
@@ -86,11 +260,23 @@ class Collection:
         #
         # Or it can force full table sync if interval is given
         if self.fnc_slicing:
+            slicing_history = self.collector.collection_history.get(self.key)
             if self.full_sync_enabled:
-                slices = self.fnc_slicing(self.key, last_gather, full_sync_enabled=True)
+                slices = self.fnc_slicing(
+                    self.key,
+                    last_gather,
+                    full_sync_enabled=True,
+                    last_gathered_entry=self.last_gathered_entry,
+                    slicing_history=slicing_history,
+                )
             else:
                 slices = self.fnc_slicing(
-                    self.key, last_gather, since=since, until=until
+                    self.key,
+                    last_gather,
+                    since=since,
+                    until=until,
+                    last_gathered_entry=self.last_gathered_entry,
+                    slicing_history=slicing_history,
                 )
         else:
             slices = [(self._gather_since(), self._gather_until())]
@@ -102,14 +288,32 @@ class Collection:
         Collection with fnc_slicing has to be shipped immediately.
         It may gather to the same file(s) as previous slice.
         Keeping more files is not wanted because of their potential size
+
+        In coalescing mode slices get unique file names in the package
+        and Collector ships the package when it's full
         """
-        return self.fnc_slicing is not None
+        return self.fnc_slicing is not None and not self.is_coalesced()
 
     @abstractmethod
     def target(self):
         """Data attribute specific for collection"""
         pass
 
+    def reload_last_gathered_entry(self):
+        """Reads key's timestamps from Collector again (distributed mode)"""
+        self.last_gathered_entry = self.collector.last_gathered_entry_for(self.key)
+        self.full_sync_enabled = self._is_full_sync_enabled(
+            self.metadata.full_sync_interval_days
+        )
+
+    def timeout(self):
+        """Time limit of collector function in seconds (None = unlimited)
+        @register(timeout=...) or Collector.COLLECTOR_TIMEOUT
+        """
+        if self.metadata.timeout is not None:
+            return self.metadata.timeout
+        return self.collector.COLLECTOR_TIMEOUT
+
     def update_last_gathered_entries(self, updates_dict):
         if self.key in updates_dict["locked"]:
             return
@@ -158,6 +362,117 @@ class Collection:
         """End of gathering based on settings excluding slices"""
         return self.collector.gather_until
 
+    def _gather_attempt(self, max_data_size):
+        """Calls collector function once. Files created by a failed attempt are deleted"""
+        with self._partial_files_cleanup():
+            with self._time_limit():
+                # More collections with the same key (and different since/until)
+                # have the same file names => overwriting! [error]
+                result = self.fnc_collecting(
+                    since=self.since,
+                    until=self.until,
+                    max_data_size=max_data_size,
+                    full_path=self.collector.gather_dir,
+                    collection_type=self.collector.collection_type,
+                    run_cache=self.collector.run_cache,
+                    db_pool=self.db_pool(),
+                )
+                # Result can be lazy (i.e. rows), it's consumed under time limit
+                if not self.gathering_timed_out:
+                    self._save_gathering(result)
+            if self.gathering_timed_out:
+                raise TimeoutError("collector function returned after cancellation")
+
+    def _should_retry(self, exception):
+        """Cancelled (timed out) collections aren't retried"""
+        return (
+            not self.gathering_timed_out
+            and self.gathering_attempts <= self.metadata.retries
+            and isinstance(exception, self.metadata.retry_on)
+        )
+
+    def _retry_backoff(self):
+        """Exponential backoff (seconds) before next attempt"""
+        return min(
+            self.collector.RETRY_BACKOFF * 2 ** (self.gathering_attempts - 1),
+            self.collector.RETRY_MAX_BACKOFF,
+        )
+
+    def _is_probed_empty(self):
+        """Calls @register(probe=...), if set. Gathering continues if probe fails"""
+        if not self.metadata.probe:
+            return False
+
+        try:
+            return not self.metadata.probe(
+                key=self.key,
+                since=self.since,
+                until=self.until,
+                collection_type=self.collector.collection_type,
+                run_cache=self.collector.run_cache,
+                db_pool=self.db_pool(),
+            )
+        except Exception as e:
+            self.logger.exception(f"Could not probe metric {self.filename}: {e}")
+            return False
+
+    def _cancel(self, connection):
+        """Called by watchdog thread when time limit is exceeded
+        :param connection: DB connection of the gathering thread
+        """
+        self.gathering_timed_out = True
+        try:
+            self.collector._cancel_gathering(self, connection)
+        except Exception as e:
+            self.logger.exception(f"Could not cancel metric {self.filename}: {e}")
+
+    @contextlib.contextmanager
+    def _partial_files_cleanup(self):
+        """Deletes files created in gather_dir if the block fails.
+        Used only with retries or time limit (files of failed gathering are deleted
+        with the whole gather_dir otherwise)
+        """
+        gather_dir = self.collector.gather_dir
+        if not gather_dir or not (self.metadata.retries or self.timeout()):
+            yield
+            return
+
+        files_before = set(os.listdir(gather_dir))
+        try:
+            yield
+        except Exception:
+            for file_name in set(os.listdir(gather_dir)) - files_before:
+                with contextlib.suppress(OSError):
+                    os.remove(os.path.join(gather_dir, file_name))
+            raise
+
+    @contextlib.contextmanager
+    def _time_limit(self):
+        """Watchdog thread cancels the collector function after timeout()"""
+        timeout = self.timeout()
+        if not timeout:
+            yield
+            return
+
+        # Connection is taken in the gathering thread (Django's connection is thread-local)
+        watchdog = threading.Timer(
+            timeout, self._cancel, args=(self.collector._cancellable_connection(),)
+        )
+        watchdog.daemon = True
+        watchdog.start()
+        try:
+            yield
+        finally:
+            watchdog.cancel()
+
+    def _reset_gathering(self):
+        self.gathering_started_at = None
+        self.gathering_finished_at = None
+        self.gathering_successful = None
+        self.gathering_skipped = False
+        self.gathering_timed_out = False
+        self.gathering_attempts = 0
+
     @abstractmethod
     def _save_gathering(self, data):
         pass
@@ -1,19 +1,23 @@
 import copy
 import os
 
-from django.utils.timezone import now
-
+from . import page_cache
+from .clock import now
 from .collection import Collection
+from .staging import StagedFile
 
 
 class CollectionCSV(Collection):
     """Collection for CSV-outputting collecting functions (decorated by @register)
     Collecting functions can return 0+ paths to tmpfiles
     - result of gather() is stored in self.data_filepath
+      (path or StagedFile for files written by the framework, see Staging)
     - In case of multiple files, object clones itself to sub-collections,
       one for each file
     """
 
+    __slots__ = ("sub_collections", "data_filepath")
+
     def __init__(self, collector, fnc_collecting):
         super().__init__(collector, fnc_collecting)
         # Large db tables handled by fnc_collecting can be split to multiple files,
@@ -26,11 +30,20 @@ class CollectionCSV(Collection):
         self.logger.debug(
             f"CollectionCSV._add_to_tar: | {self.key}.csv | Size: {self.data_size()}"
         )
-        tar.add(self.target(), arcname=f"./{self.filename}")
+        if isinstance(self.target(), StagedFile):
+            self.target().add_to_tar(
+                tar, f"./{self.filename}", self.collector.gather_until.timestamp()
+            )
+        elif self.collector.PAGE_CACHE_FRIENDLY_IO:
+            page_cache.add_to_tar(tar, self.target(), f"./{self.filename}")
+        else:
+            tar.add(self.target(), arcname=f"./{self.filename}")
 
     def cleanup(self):
         """Removes CSV files from /tmp"""
-        if self.data_filepath and os.path.exists(self.data_filepath):
+        if isinstance(self.data_filepath, StagedFile):
+            self.data_filepath.discard()
+        elif self.data_filepath and os.path.exists(self.data_filepath):
             os.remove(self.data_filepath)
 
         for collection in self.sub_collections:
@@ -40,6 +53,8 @@ class CollectionCSV(Collection):
         """Gets size of tmp csv file. Sub-collections NOT computed."""
         if self.data_filepath is None:
             return 0
+        if isinstance(self.data_filepath, StagedFile):
+            return self.data_filepath.size
 
         data_size = 0
         try:
@@ -50,6 +65,12 @@ class CollectionCSV(Collection):
 
         return data_size
 
+    def gathered_data_size(self):
+        """Size of CSV file or sum of sub-collections' files"""
+        if len(self.sub_collections):
+            return sum(collection.data_size() for collection in self.sub_collections)
+        return self.data_size()
+
     def is_empty(self):
         """
         Leaf checks if data are collected.
@@ -78,6 +99,11 @@ class CollectionCSV(Collection):
     #
     # Private methods ---------------------------
     #
+    def _reset_gathering(self):
+        super()._reset_gathering()
+        self.sub_collections = []
+        self.data_filepath = None
+
     def _save_gathering(self, data):
         """
         Saves data (paths to CSV files).
@@ -86,13 +112,14 @@ class CollectionCSV(Collection):
         if isinstance(data, list) and len(data) > 1:
             for fpath in data:
                 sub_collection = copy.copy(self)
-                sub_collection.sub_collections = []
+                # sub-collection is a leaf, shared empty tuple saves memory
+                sub_collection.sub_collections = ()
                 sub_collection.data_filepath = fpath
                 sub_collection.gathering_successful = True
                 self.sub_collections.append(sub_collection)
         elif isinstance(data, list) and len(data) == 1:
             self.data_filepath = data[0]
-        elif isinstance(data, str):
+        elif isinstance(data, (str, StagedFile)):
             self.data_filepath = data
 
     def _set_gathering_finished(self):
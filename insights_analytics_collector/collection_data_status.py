@@ -1,4 +1,5 @@
 import csv
+import io
 import os
 
 from .collection_csv import CollectionCSV
@@ -6,6 +7,8 @@ from .decorators import register
 
 
 class CollectionDataStatus(CollectionCSV):
+    __slots__ = ("package",)
+
     def __init__(self, collector, package):
         super().__init__(collector, self.data_collection_status)
 
@@ -13,41 +16,53 @@ class CollectionDataStatus(CollectionCSV):
 
     @register(
         "data_collection_status",
-        "1.0",
+        "1.1",
         format="csv",
         description="Data collection status",
     )
     def data_collection_status(self, full_path, **kwargs):
+        buffer = io.StringIO()
+        fieldnames = [
+            "collection_start_timestamp",
+            "since",
+            "until",
+            "file_name",
+            "status",
+            "elapsed",
+            "attempts",
+        ]
+        writer = csv.DictWriter(buffer, delimiter=",", fieldnames=fieldnames)
+        writer.writeheader()
+
+        for collection in self.package.collections:
+            status = collection.status()
+            elapsed = 0
+            if collection.gathering_started_at and collection.gathering_finished_at:
+                elapsed = (
+                    collection.gathering_finished_at - collection.gathering_started_at
+                ).seconds
+
+            writer.writerow(
+                {
+                    "collection_start_timestamp": collection.gathering_started_at,
+                    "since": collection.since,
+                    "until": collection.until,
+                    "file_name": collection.filename,
+                    "status": status,
+                    "elapsed": elapsed,
+                    "attempts": collection.gathering_attempts,
+                }
+            )
+        data = buffer.getvalue().encode("utf-8")
+
+        # Small file, kept in memory by staging
+        if self.collector.staging is not None:
+            staged_file = self.collector.staging.create(self.key)
+            staged_file.write(data)
+            staged_file.close()
+            return [staged_file]
+
         file_path = os.path.join(full_path, self.filename)
-        with open(file_path, "w", newline="") as csvfile:
-            fieldnames = [
-                "collection_start_timestamp",
-                "since",
-                "until",
-                "file_name",
-                "status",
-                "elapsed",
-            ]
-            writer = csv.DictWriter(csvfile, delimiter=",", fieldnames=fieldnames)
-            writer.writeheader()
-
-            for collection in self.package.collections:
-                status = "ok" if collection.gathering_successful else "failed"
-                elapsed = 0
-                if collection.gathering_started_at and collection.gathering_finished_at:
-                    elapsed = (
-                        collection.gathering_finished_at
-                        - collection.gathering_started_at
-                    ).seconds
-
-                writer.writerow(
-                    {
-                        "collection_start_timestamp": collection.gathering_started_at,
-                        "since": collection.since,
-                        "until": collection.until,
-                        "file_name": collection.filename,
-                        "status": status,
-                        "elapsed": elapsed,
-                    }
-                )
+        with open(file_path, "wb") as csvfile:
+            csvfile.write(data)
         return [file_path]
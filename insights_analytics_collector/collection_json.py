@@ -2,6 +2,7 @@ import io
 import json
 import tarfile
 
+from .clock import now
 from .collection import Collection
 
 
@@ -9,11 +10,64 @@ class CollectionJSON(Collection):
     """Collection for JSON-outputting collecting functions (decorated by @register)
     Collecting functions returns dict() convertable to JSON
     - result of gather() is stored in self.data
+    - with @register(cache_ttl=...) the result is persisted by Collector
+      and reused while it's fresh (see Collector._load_cached_result())
     """
 
+    __slots__ = ("data", "from_cache")
+
     def __init__(self, collector, func):
         super().__init__(collector, func)
         self.data = None  # gathered data
+        self.from_cache = False
+
+    def gather(self, max_data_size):
+        if self._gather_from_cache():
+            return
+
+        super().gather(max_data_size)
+
+        if (
+            self.metadata.cache_ttl
+            and self.gathering_successful
+            and self.collector.is_shipping_enabled()
+        ):
+            self.collector._save_cached_result(
+                self.key,
+                {
+                    "version": self.version,
+                    "gathered_at": self.gathering_finished_at,
+                    "data": self.data,
+                },
+            )
+
+    def status(self):
+        return "cached" if self.from_cache else super().status()
+
+    def _gather_from_cache(self):
+        """Uses persisted result if it's not older than cache_ttl"""
+        if not self.metadata.cache_ttl:
+            return False
+
+        cached = self.collector._load_cached_result(self.key)
+        if (
+            not cached
+            or cached.get("version") != self.version
+            or cached["gathered_at"] < now() - self.metadata.cache_ttl
+        ):
+            return False
+
+        self.gathering_started_at = now()
+        self.data = cached["data"]
+        self.from_cache = True
+        self.gathering_successful = True
+        self._set_gathering_finished()
+        return True
+
+    def _reset_gathering(self):
+        super()._reset_gathering()
+        self.data = None
+        self.from_cache = False
 
     def _save_gathering(self, data):
         self.data = json.dumps(data)
@@ -3,6 +3,8 @@ from .decorators import register
 
 
 class CollectionManifest(CollectionJSON):
+    __slots__ = ()
+
     def __init__(self, collector):
         super().__init__(collector, self.collecting)
 
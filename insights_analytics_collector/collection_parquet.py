@@ -0,0 +1,21 @@
+from .collection_csv import CollectionCSV
+from .parquet_writer import ParquetRowsWriter
+
+
+class CollectionParquet(CollectionCSV):
+    """Collection for @register(format='parquet') functions.
+    Collecting function returns tuple (header, rows) like with format='rows',
+    the framework writes Parquet files split by max_data_size (see ParquetRowsWriter).
+    Files are handled like CSV files (sub-collections, shipping of slices)
+    """
+
+    __slots__ = ()
+
+    def _save_gathering(self, data):
+        header, rows = data
+        writer = ParquetRowsWriter(
+            self.collector.gather_dir,
+            self.key,
+            self.collector._package_class().max_data_size(),
+        )
+        super()._save_gathering(writer.write(header, rows))
@@ -0,0 +1,33 @@
+from .collection import Collection
+from .collection_csv import CollectionCSV
+from .csv_file_splitter import CsvRowsWriter
+
+
+class CollectionRows(CollectionCSV):
+    """Collection for @register(format='rows') functions.
+    Collecting function returns tuple (header, rows), the framework writes CSV files
+    split by max_data_size (see CsvRowsWriter).
+    Collection is CSV then (file name, packaging, sub-collections).
+    Small files are kept in memory by Collector's staging (see Staging)
+
+    @register('jobs', '1.0', format='rows')
+    def jobs(since, until, **kwargs):
+        cursor.execute('SELECT id, name FROM jobs WHERE ...')
+        return ['id', 'name'], iter(lambda: cursor.fetchmany(10000), [])
+    """
+
+    __slots__ = ()
+
+    @property
+    def data_type(self):
+        return Collection.COLLECTION_TYPE_CSV
+
+    def _save_gathering(self, data):
+        header, rows = data
+        writer = CsvRowsWriter(
+            self.collector.gather_dir,
+            self.key,
+            self.collector._package_class().max_data_size(),
+            staging=self.collector.staging,
+        )
+        super()._save_gathering(writer.write(header, rows))
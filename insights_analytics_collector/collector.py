@@ -1,21 +1,32 @@
 import contextlib
+import datetime
 import hashlib
-import inspect
 import logging
 import os
 import pathlib
 import shutil
 import tempfile
+import time
 from abc import abstractmethod
 
-from django.utils.timezone import now, timedelta
-
+from .adaptive_slicing import AdaptiveSlicing
+from .clock import now, timedelta
 from .collection import Collection
 from .collection_csv import CollectionCSV
 from .collection_data_status import CollectionDataStatus
 from .collection_json import CollectionJSON
 from .collection_manifest import CollectionManifest
+from .collection_parquet import CollectionParquet
+from .collection_rows import CollectionRows
+from .connection_pool import cancel_query
+from .gather_queue import GatherQueue
 from .package import Package
+from .planner import Planner
+from .progress import Progress
+from .registry import registry
+from .run_cache import RunCache
+from .staging import Staging
+from .throttle import Throttle
 
 
 class Collector:
@@ -31,9 +42,17 @@ class Collector:
       - manual/scheduled - data are gathered and shipped, local timestamps about gathering are updated
       - dry-run - data are gathered, but not shipped, tarballs from /tmp not deleted (testing mode)
     - collector_module: module with functions with decorator `@register` - they define what data are collected
+      - can be also a list of modules
+      - modules registered as entry points in group PLUGINS_ENTRY_POINT_GROUP are added (if set)
       - collector functions are wrapped by kind of Collection object
       - Collections are grouped by Package, and Packages are creating tarballs and shipping them.
     - logger: logging.logger
+    - coalesce_slices: (bool) slices of collections with fnc_slicing are not shipped one by one,
+      they're added to shared packages (with unique file names) and shipped when the package is full
+      or when staged data exceed MAX_STAGED_DATA_SIZE
+    - distributed: (bool) more nodes can gather at the same time. Instead of one global lock
+      each key is claimed by advisory lock (see _claim_collection()), timestamps are merged
+      with persisted ones
 
     Collector is an abstract class, example of implementation is in tests/classes
 
@@ -44,16 +63,69 @@ class Collector:
     DRY_RUN = "dry-run"
     SCHEDULED_COLLECTION = "scheduled"
 
+    # Entry point group of plugin collector modules (i.e. "insights_analytics_collector.collectors")
+    PLUGINS_ENTRY_POINT_GROUP = None
+
+    # Size of values shared by collector functions in one gathering (see RunCache)
+    RUN_CACHE_MAX_SIZE = 256 * 1048576
+
+    # DB latency (seconds) of probe query, which pauses gathering (None = disabled, see Throttle)
+    THROTTLE_LATENCY_THRESHOLD = None
+    THROTTLE_MAX_PAUSE = 60.0
+
+    # Time limit of each collector function in seconds (None = unlimited, see @register(timeout=...))
+    COLLECTOR_TIMEOUT = None
+
+    # Backoff (seconds) before the first retry of failed collector function, doubled by each retry
+    # (see @register(retries=...))
+    RETRY_BACKOFF = 1.0
+    RETRY_MAX_BACKOFF = 60.0
+
+    # Polling of gathering lock held by other process (seconds), see gather(if_running=...)
+    GATHER_LOCK_POLL_INTERVAL = 5.0
+
+    # Disk budget for unshipped packages in coalescing mode (None = Package.MAX_DATA_SIZE)
+    MAX_STAGED_DATA_SIZE = None
+
+    # Files written by the framework (format='rows', data_collection_status.csv) up to
+    # STAGING_FILE_SIZE bytes are kept in memory instead of gather_dir (see Staging).
+    # STAGING_MEMORY_SIZE limits all of them, 0 = always on disk
+    STAGING_FILE_SIZE = 1048576
+    STAGING_MEMORY_SIZE = 64 * 1048576
+
+    # Staged CSV files and tarballs are read/written with large buffers and dropped
+    # from page cache after they're consumed (see page_cache module)
+    PAGE_CACHE_FRIENDLY_IO = False
+
+    # Minimal interval (seconds) between progress reports (see progress_callback)
+    PROGRESS_INTERVAL = 10.0
+
     def __init__(
-        self, collection_type=DRY_RUN, collector_module=None, logger=None, licensed=True
+        self,
+        collection_type=DRY_RUN,
+        collector_module=None,
+        logger=None,
+        licensed=True,
+        coalesce_slices=False,
+        distributed=False,
+        progress_callback=None,
     ):
         self.licensed = licensed
+        self.coalesce_slices = coalesce_slices
+        self.distributed = distributed
+        self.progress_callback = progress_callback
         self.collector_module = collector_module
         self.collection_type = collection_type
         self.collections = {}
         self.packages = {}
 
         self.last_gathered_entries = None
+        self.collection_history = None
+        self.run_cache = None
+        self.run_metrics = {}
+        self.throttle = None
+        self.connection_pool = None
+        self.progress = None
         self.logger = logger or logging.getLogger(
             "insights-analytics-collector.collector"
         )
@@ -65,8 +137,14 @@ class Collector:
 
         self.tmp_dir = None
         self.gather_dir = None
+        self.staging = None
         self.gather_since = None
         self.gather_until = None
+        self.gather_deadline = None
+        self.gathering_durations = {}
+        self.gathering_data_sizes = {}
+        self.unpackaged_collections = []
+        self.claimed_locks = None
         self.last_gather = None
 
     #
@@ -75,16 +153,16 @@ class Collector:
     @classmethod
     def registered_collectors(cls, module):
         """
-        Returns all functions in 'module' defined with "@register" decorator
+        Returns all functions in 'module' (or list of modules) defined with "@register" decorator
         """
+        modules = module if isinstance(module, (list, tuple)) else [module]
         return {
             func.__insights_analytics_key__: {
                 "name": func.__insights_analytics_key__,
                 "version": func.__insights_analytics_version__,
                 "description": func.__insights_analytics_description__ or "",
             }
-            for name, func in inspect.getmembers(module)
-            if inspect.isfunction(func) and hasattr(func, "__insights_analytics_key__")
+            for func in registry.index(modules).functions
         }
 
     #
@@ -109,42 +187,171 @@ class Collector:
         """
         pass
 
-    def gather(self, dest=None, subset=None, since=None, until=None):
+    def gather(
+        self,
+        dest=None,
+        subset=None,
+        since=None,
+        until=None,
+        deadline=None,
+        if_running=GatherQueue.SKIP,
+        wait_timeout=None,
+    ):
         """Entry point for gathering
 
         :param dest: (default: /tmp/awx-analytics-*) - directory for temp files
         :param subset: (list) collector_module's function names if only subset is required (typically tests)
         :param since: (datetime) - low threshold of data changes (max. and default - 4 weeks ago)
         :param until: (datetime) - high threshold of data changes (defaults to now)
+        :param deadline: (datetime or timedelta) - no collection (slice) is started if it's not expected
+                         to finish before deadline. Gathered data are shipped, deferred keys keep their timestamps.
+        :param if_running: if other gathering is in progress (see GatherQueue):
+                           - "skip" - returns None
+                           - "join" - waits for the running gathering and returns its tarballs
+                           - "queue" - waits for one follow-up gathering merged from all queued calls
+                           Gathering in other process (holding the lock) is awaited, then "queue" gathers
+                           and "join" returns None (its tarballs are in the other process)
+        :param wait_timeout: (seconds) for "join" and "queue", None waits forever
         :return: None or list of paths to tarballs (.tar.gz)
         """
         if not self.is_enabled():
             return None
 
-        with self._pg_advisory_lock("gather_analytics_lock", wait=False) as acquired:
-            if not acquired:
+        if isinstance(deadline, datetime.timedelta):
+            deadline = now() + deadline
+
+        queue = GatherQueue.for_key(self._gather_queue_key())
+        request, run = queue.submit(if_running, since, until, subset, deadline)
+        if not run:
+            if request is None:
                 self.logger.log(
                     self.log_level, "Not gathering analytics, another task holds lock"
                 )
                 return None
 
-            self._gather_initialize(dest, subset, since, until)
+            self.logger.log(
+                self.log_level, "Analytics gathering is in progress, waiting for it"
+            )
+            tar_paths = request.wait(wait_timeout)
+            if not request.done.is_set():
+                self.logger.log(
+                    self.log_level, "Waiting for analytics gathering timed out"
+                )
+            return tar_paths
+
+        self._gather_queued(
+            queue,
+            request,
+            dest,
+            wait_timeout if if_running != GatherQueue.SKIP else 0,
+            join=if_running == GatherQueue.JOIN,
+        )
+        return request.result
+
+    def iter_gather(
+        self, dest=None, subset=None, since=None, until=None, deadline=None
+    ):
+        """Streaming gathering, yields each package as soon as it's processed
+        (tarball made and shipped), so the caller can consume and delete it.
+        Timestamps are persisted and temp files deleted like in gather()
+        when the generator is exhausted. Closing it early stops gathering,
+        timestamps aren't persisted then.
+        If other gathering is in progress, nothing is gathered (like gather(if_running="skip")).
+
+        :param dest, subset, since, until, deadline: see gather()
+        :return: generator of dicts, see Package.info()
+        """
+        if not self.is_enabled():
+            return
+
+        if isinstance(deadline, datetime.timedelta):
+            deadline = now() + deadline
 
-            if not self._gather_config():
+        queue = GatherQueue.for_key(self._gather_queue_key())
+        request, run = queue.submit(GatherQueue.SKIP, since, until, subset, deadline)
+        if not run:
+            self.logger.log(
+                self.log_level, "Not gathering analytics, another task holds lock"
+            )
+            return
+
+        result, run_next = None, False
+        try:
+            result = yield from self._iter_gather_request(dest, request)
+            run_next = True
+        finally:
+            follow_up = queue.finish(request, result, run_next)
+        # Calls queued meanwhile are gathered without streaming
+        self._gather_queued(queue, follow_up)
+
+    def _gather_queued(self, queue, request, dest=None, lock_timeout=0, join=False):
+        """Gathers the request and follow-ups of calls queued meanwhile"""
+        while request is not None:
+            result, run_next = None, False
+            try:
+                result = self._gather_request(dest, request, lock_timeout, join)
+                run_next = True
+            finally:
+                # Follow-up of queued calls is gathered by this caller too
+                request = queue.finish(request, result, run_next)
+                dest, join = None, False
+
+    def _gather_request(self, dest, request, lock_timeout=0, join=False):
+        """One gathering (under the lock)"""
+        gathering = self._iter_gather_request(dest, request, lock_timeout, join)
+        try:
+            while True:
+                next(gathering)
+        except StopIteration as e:
+            return e.value
+
+    def _iter_gather_request(self, dest, request, lock_timeout=0, join=False):
+        """One gathering (under the lock), yields processed packages (Package.info())
+        :param lock_timeout, join: see _gather_lock()
+        :return: tarball paths (generator's return value)
+        """
+        with self._gather_lock(lock_timeout, join) as acquired:
+            if not acquired:
+                self.logger.log(
+                    self.log_level, "Not gathering analytics, another task holds lock"
+                )
                 return None
 
-            self._gather_json_collections()
+            try:
+                self._gather_initialize(
+                    dest, request.subset, request.since, request.until, request.deadline
+                )
+
+                if not self._gather_config():
+                    return None
+
+                self._gather_json_collections()
 
-            self._gather_csv_collections()
+                yield from self._iter_gather_csv_collections()
 
-            self._process_packages()
+                self._process_packages()
+                yield from self._pop_processed_packages()
 
-            self._gather_finalize()
+                self.progress.finish()
 
-            self._gather_cleanup()
+                self._gather_finalize()
+            finally:
+                # Also without config, when it fails or streaming is stopped by the caller
+                self._gather_cleanup()
 
             return self.all_tar_paths()
 
+    def plan(self, since=None, until=None, subset=None):
+        """Predicts gathering without collecting data (only slicing functions are called).
+        Estimates are from @register(estimate=...) or collection history.
+
+        :param since: (datetime) - like in gather()
+        :param until: (datetime) - like in gather()
+        :param subset: (list) - like in gather()
+        :return: dict, see Planner.plan()
+        """
+        return Planner(self).plan(since, until, subset)
+
     def is_dry_run(self):
         return self.collection_type == self.DRY_RUN
 
@@ -179,7 +386,9 @@ class Collector:
 
     def delete_tarballs(self):
         for path in self.all_tar_paths():
-            os.remove(path)
+            # Tarballs from iter_gather() can be deleted by the caller
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
 
     #
     # Private methods ---------------------------
@@ -242,21 +451,33 @@ class Collector:
         self.gather_until = until
         self.last_gather = last_gather
 
-    def _find_available_package(self, group, key, requested_size=None):
+    def _find_available_package(
+        self, group, key, requested_size=None, allow_key_reuse=False
+    ):
         """Checks if there is a Package available for collection.
         Package can't contain collection with the same key and has to have enough free space
 
         :param group: finds or creates package for group strategy if not None
         :param requested_size: returns existing package, if there is enough free size
+        :param allow_key_reuse: package can contain the same key (coalesced slices)
 
         :return: Package
         """
         available_package = None
 
-        for package in self.packages.get(group) or []:
+        packages = self.packages.get(group) or []
+        first_index = 0
+        if allow_key_reuse:
+            # Slices of the key stay in order of packages, an earlier package
+            # can't get a newer slice (see _update_last_gathered_entries())
+            for index, package in enumerate(packages):
+                if package.is_key_used(key):
+                    first_index = index
+
+        for package in packages[first_index:]:
             if (
                 package.has_free_space(requested_size)
-                and not package.is_key_used(key)
+                and (allow_key_reuse or not package.is_key_used(key))
                 and not package.processed
             ):
                 available_package = package
@@ -269,19 +490,114 @@ class Collector:
 
         return available_package
 
-    def _gather_initialize(self, tmp_root_dir, collectors_subset, since, until):
+    def _gather_initialize(
+        self, tmp_root_dir, collectors_subset, since, until, deadline=None
+    ):
         self.logger.debug(f"Last analytics run was: {self._last_gathering()}")
 
         self._init_tmp_dir(tmp_root_dir)
 
+        self.staging = self._create_staging()
+
+        self.claimed_locks = contextlib.ExitStack()
+
+        self.connection_pool = self._create_connection_pool()
+
+        self._init_collections(collectors_subset, since, until, deadline)
+
+        self.progress = self._create_progress()
+
+    def _init_collections(self, collectors_subset, since, until, deadline=None):
+        """Loads persisted data and creates collections (for gathering or planning)"""
+        if isinstance(deadline, datetime.timedelta):
+            deadline = now() + deadline
+        self.gather_deadline = deadline
+        self.gathering_durations = {}
+        self.gathering_data_sizes = {}
+        self.unpackaged_collections = []
+
         self.last_gathered_entries = self._load_last_gathered_entries()
 
+        self.collection_history = self._load_collection_history() or {}
+
         self._calculate_collection_interval(since, until)
 
         self._reset_collections_and_packages()
 
+        self.run_cache = RunCache(self.RUN_CACHE_MAX_SIZE)
+
+        self.run_metrics = {}
+
+        self.throttle = self._create_throttle()
+
         self._create_collections(collectors_subset)
 
+    @contextlib.contextmanager
+    def _gather_lock(self, timeout=0, join=False):
+        """Only one node gathers at a time.
+        In distributed mode keys are locked separately (see _claim_collection())
+
+        :param timeout: (seconds) lock held by other process is polled
+                        (see GATHER_LOCK_POLL_INTERVAL), 0 = no waiting, None = waiting forever
+        :param join: lock held by other process is awaited, but not acquired then
+                     (gathering of the other process isn't repeated)
+        """
+        if self.distributed:
+            yield True
+            return
+
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        polled = False
+        while True:
+            with self._pg_advisory_lock(
+                "gather_analytics_lock", wait=False
+            ) as acquired:
+                if acquired and not (join and polled):
+                    yield True
+                    return
+            if acquired or (expires_at is not None and time.monotonic() >= expires_at):
+                yield False
+                return
+            polled = True
+            time.sleep(self.GATHER_LOCK_POLL_INTERVAL)
+
+    def _gather_queue_key(self):
+        """gather() calls of the same Collector class, collection type and collector modules
+        in one process are coordinated (follow-up is run by other caller's instance)
+        """
+        modules = ",".join(module.__name__ for module in self._collector_modules())
+        return f"{type(self).__module__}.{type(self).__qualname__}:{self.collection_type}:{modules}"
+
+    def _claim_collection(self, collection):
+        """Distributed mode: key is gathered only by the node holding its advisory lock.
+        Lock is held until timestamps are saved (released by _gather_cleanup()).
+        Key's timestamps are reloaded, other node could gather it in the meantime.
+
+        :param collection: Collection (template of slices)
+        :return: bool - False if key is locked by other node
+        """
+        if not self.distributed:
+            return True
+
+        acquired = self.claimed_locks.enter_context(
+            self._pg_advisory_lock(
+                f"gather_analytics_lock:{collection.key}", wait=False
+            )
+        )
+        if not acquired:
+            self.run_metrics.setdefault("claimed_by_other_node", []).append(
+                collection.key
+            )
+            self.logger.debug(f"Collection {collection.key} is gathered by other node")
+            return False
+
+        persisted_entries = self._load_last_gathered_entries() or {}
+        for key in (collection.key, f"{collection.key}_full"):
+            if key in persisted_entries:
+                self.last_gathered_entries[key] = persisted_entries[key]
+        collection.reload_last_gathered_entry()
+        return True
+
     def _gather_config(self):
         """Config is special collection, it's added to each Package
         TODO: add "always" flag to @register decorator
@@ -295,39 +611,243 @@ class Collector:
 
     def _gather_json_collections(self):
         """JSON collections are simpler, they're just gathered and added to the Package"""
-        for collection in self.collections[Collection.COLLECTION_TYPE_JSON]:
-            collection.gather(self._package_class().max_data_size())
+        for template in self.collections[Collection.COLLECTION_TYPE_JSON]:
+            if not self._claim_collection(template):
+                self.progress.key_completed()
+                continue
 
-            self._add_collection_to_package(collection)
+            for collection in self._iter_slices(template):
+                if not self._fits_deadline(collection):
+                    break
+
+                self._wait_for_db()
+
+                collection.gather(self._package_class().max_data_size())
+
+                self._record_gathering_statistics(collection)
+
+                self._add_collection_to_package(collection)
+
+                # Next slices of cancelled key are skipped
+                if collection.gathering_timed_out:
+                    break
+
+            self.progress.key_completed()
 
     def _gather_csv_collections(self):
         """CSV collections can contain sub-collections (big db tables).
         In that case they are shipped immediately, because:
          1) the temp file needs to be deleted to ensure enough disk space
          2) Collections with slicing function can produce duplicate filename
+        In coalescing mode slices are shipped when their package is full instead.
         """
-        for collection in self.collections[Collection.COLLECTION_TYPE_CSV]:
-            collection.gather(self._package_class().max_data_size())
+        for _ in self._iter_gather_csv_collections():
+            pass
+
+    def _iter_gather_csv_collections(self):
+        """Gathers CSV collections, yields packages processed meanwhile (Package.info())"""
+        for template in self.collections[Collection.COLLECTION_TYPE_CSV]:
+            if not self._claim_collection(template):
+                self.progress.key_completed()
+                continue
+
+            # Slices are created one by one, just before gathering
+            for collection in self._iter_slices(template):
+                # Next slices of deferred key are deferred too
+                if not self._fits_deadline(collection):
+                    break
+
+                self._wait_for_db()
+
+                self._gather_csv_collection(collection)
+
+                yield from self._pop_processed_packages()
+
+                # Next slices of cancelled key are skipped
+                if collection.gathering_timed_out:
+                    break
+
+            self.progress.key_completed()
+
+    def _iter_slices(self, template):
+        """Template's slices (see Collection.iter_slices()), their count is reported as progress"""
+        slices = template.slices()
+        self.progress.key_started(
+            len(slices) if isinstance(slices, (list, tuple)) else None
+        )
+        return template.iter_slices(slices)
+
+    def _gather_csv_collection(self, collection):
+        collection.gather(self._package_class().max_data_size())
+
+        if collection.is_coalesced():
+            self._move_staged_files(collection)
+
+        self._record_gathering_statistics(collection)
+
+        self._record_slicing_history(collection)
+
+        # Failed slice stays in the package, so it locks the key
+        # for newer slices shipped in the same or later packages.
+        # Cancelled collection is packaged for its status in data_collection_status.csv
+        if not collection.gathering_successful and (
+            collection.is_coalesced() or collection.gathering_timed_out
+        ):
+            self._add_collection_to_package(collection)
+            return
+
+        # Failed slice (locks the key) and slice without data (or skipped by probe)
+        # aren't packaged, but they're applied to the key's timestamp in order
+        # (see _update_last_gathered_entries())
+        if not collection.gathering_successful or collection.is_empty():
+            self.unpackaged_collections.append(collection)
+            return
+
+        # If collection has sub_collections (it means it collected more files)
+        # ship them in their own package
+        if len(collection.sub_collections):
+            for sub_collection in collection.sub_collections:
+                self._add_collection_to_package(sub_collection)
+        else:
+            self._add_collection_to_package(collection)
 
-            if collection.is_empty() or not collection.gathering_successful:
+    def _move_staged_files(self, collection):
+        """Slices of a key write to the same paths, coalesced slice's files
+        are moved to unique paths before the next slice overwrites them
+        """
+        for leaf in collection.sub_collections or [collection]:
+            path = leaf.data_filepath
+            if not isinstance(path, (str, os.PathLike)) or not os.path.exists(path):
                 continue
 
-            # If collection has sub_collections (it means it collected more files)
-            # ship them in their own package
-            if len(collection.sub_collections):
-                for sub_collection in collection.sub_collections:
-                    self._add_collection_to_package(sub_collection)
-            else:
-                self._add_collection_to_package(collection)
+            directory, name = os.path.split(path)
+            root, extension = os.path.splitext(name)
+            fd, unique_path = tempfile.mkstemp(
+                prefix=f"{root}_", suffix=extension, dir=directory
+            )
+            os.close(fd)
+            os.replace(path, unique_path)
+            leaf.data_filepath = unique_path
 
     def _add_collection_to_package(self, collection):
-        """Adds collection to package and ships it if collection has slicing"""
+        """Adds collection to package and ships it if collection has slicing
+        (or ships full packages in coalescing mode)
+        """
         package = self._find_available_package(
-            collection.shipping_group, collection.key, collection.data_size()
+            collection.shipping_group,
+            collection.key,
+            collection.data_size(),
+            allow_key_reuse=collection.is_coalesced(),
         )
         package.add_collection(collection)
         if collection.ship_immediately():
             self._process_package(package)
+        elif collection.is_coalesced():
+            self._process_coalesced_packages(package)
+
+    def _expected_duration(self, collection):
+        """Expected gathering time of collection (seconds), based on
+        previous slices of the same key or collection history. 0 if unknown.
+        """
+        durations = self.gathering_durations.get(collection.key)
+        if durations:
+            return sum(durations) / len(durations)
+
+        history = self.collection_history.get(collection.key) or {}
+        if not collection.fnc_slicing:
+            return history.get("duration", 0.0)
+        if history.get("duration_per_second") and isinstance(
+            collection.since, datetime.datetime
+        ):
+            window = (collection.until - collection.since).total_seconds()
+            return history["duration_per_second"] * window
+        return 0.0
+
+    def _fits_deadline(self, collection):
+        """Checks if collection is expected to be gathered before deadline.
+        Key is deferred to the next gathering otherwise.
+        """
+        if self.gather_deadline is None:
+            return True
+
+        expected_end = now() + datetime.timedelta(
+            seconds=self._expected_duration(collection)
+        )
+        if expected_end <= self.gather_deadline:
+            return True
+
+        deferred = self.run_metrics.setdefault("deferred", [])
+        if collection.key not in deferred:
+            deferred.append(collection.key)
+            self.logger.log(
+                self.log_level,
+                f"Collection {collection.key} deferred, it doesn't fit the deadline {self.gather_deadline}",
+            )
+        return False
+
+    def _record_gathering_statistics(self, collection):
+        """Durations and data sizes of key's collections (slices) in this gathering.
+        Completed slice is reported as progress (before its files are packaged and deleted)
+        """
+        data_size = 0
+        if collection.gathering_started_at and collection.gathering_finished_at:
+            self.gathering_durations.setdefault(collection.key, []).append(
+                (
+                    collection.gathering_finished_at - collection.gathering_started_at
+                ).total_seconds()
+            )
+        if collection.gathering_successful:
+            data_size = collection.gathered_data_size()
+            self.gathering_data_sizes[collection.key] = (
+                self.gathering_data_sizes.get(collection.key, 0) + data_size
+            )
+        if self.progress is not None:
+            self.progress.slice_completed(data_size)
+
+    def _record_slicing_history(self, collection):
+        """Statistics of sliced collections for AdaptiveSlicing"""
+        if not collection.fnc_slicing or not collection.gathering_successful:
+            return
+
+        AdaptiveSlicing.record(
+            self.collection_history,
+            collection.key,
+            collection.since,
+            collection.until,
+            collection.gathered_data_size(),
+            (
+                collection.gathering_finished_at - collection.gathering_started_at
+            ).total_seconds(),
+        )
+
+    def _max_staged_data_size(self):
+        return self.MAX_STAGED_DATA_SIZE or self._package_class().max_data_size()
+
+    def _process_coalesced_packages(self, current_package):
+        """Ships unprocessed packages when their data exceed the disk budget.
+        Older packages are shipped first, current package (still receiving slices)
+        is shipped only if it exceeds the budget itself.
+
+        :param current_package: Package - the last package a slice was added to
+        """
+        unprocessed = [
+            package
+            for packages in self.packages.values()
+            for package in packages
+            if not package.processed
+        ]
+        staged_data_size = sum(package.total_data_size for package in unprocessed)
+
+        for package in unprocessed:
+            if staged_data_size <= self._max_staged_data_size():
+                break
+            if package is current_package:
+                continue
+            self._process_package(package)
+            staged_data_size -= package.total_data_size
+
+        if staged_data_size > self._max_staged_data_size():
+            self._process_package(current_package)
 
     @contextlib.contextmanager
     def _pg_advisory_lock(self, key, wait=False):
@@ -368,27 +888,163 @@ class Collector:
         :param package: Package
         """
         if not package.processed:
-            package.make_tgz()
-            if self.is_shipping_enabled():
-                package.ship()
+            if package.make_tgz():
+                self.progress.package_tarred()
+            if self.is_shipping_enabled() and package.ship():
+                self.progress.package_shipped()
             package.delete_collected_files()
             package.processed = True
+            self.processed_packages.append(package)
+
+    def _pop_processed_packages(self):
+        """Yields info of packages processed since the last call (see iter_gather())"""
+        packages, self.processed_packages = self.processed_packages, []
+        for package in packages:
+            yield package.info()
 
     def _gather_finalize(self):
         """Persisting timestamps (manual/schedule mode only)"""
+        if self.run_metrics.get("throttled_count"):
+            self.logger.log(
+                self.log_level,
+                f"Gathering was paused {self.run_metrics['throttled_count']}x "
+                f"for {self.run_metrics['throttled_time']:.1f}s because of DB latency",
+            )
+
         if self.is_shipping_enabled():
-            self._update_last_gathered_entries()
+            with self._persisted_data_lock():
+                self._update_last_gathered_entries()
+
+                self._update_collection_history()
+
+                self._save_collection_history(self.collection_history)
 
             self._save_last_gather()
 
+    def _persisted_data_lock(self):
+        """Distributed mode: nodes merge their timestamps and history one by one"""
+        if not self.distributed:
+            return contextlib.nullcontext()
+        return self._pg_advisory_lock("gather_analytics_lock:persisted_data", wait=True)
+
     def _gather_cleanup(self):
-        """Deleting temp files"""
+        """Deleting temp files, staged data and cached values, releasing claimed keys and DB connections"""
+        if self.connection_pool is not None:
+            self.run_metrics.update(self.connection_pool.metrics())
+            self.connection_pool.close()
+        if self.staging is not None:
+            self.staging.close()
+        if self.claimed_locks is not None:
+            self.claimed_locks.close()
+        if self.run_cache is not None:
+            self.run_cache.clear()
         shutil.rmtree(
             self.tmp_dir, ignore_errors=True
         )  # clean up individual artifact files
         if not self.is_dry_run():
             self.delete_tarballs()
 
+    def _cancellable_connection(self):
+        """DB-API connection of db_connection() in the gathering thread,
+        passed to _cancel_gathering() in watchdog thread.
+        Override to return other handle (i.e. backend pid for pg_cancel_backend())
+        """
+        try:
+            connection = self.db_connection()
+            # Django's connection wrapper is thread-local and connects lazily
+            if callable(getattr(connection, "ensure_connection", None)):
+                connection.ensure_connection()
+            return getattr(connection, "connection", None) or connection
+        except Exception as e:
+            self.logger.warning(f"No db connection to cancel gathering: {e}")
+            return None
+
+    def _cancel_gathering(self, collection, connection):
+        """Cancels collector function which exceeded its time limit (see Collection.timeout()).
+        Called from watchdog thread, collector function is expected to fail then.
+        Default implementation cancels running queries of connections borrowed
+        from connection_pool and of the connection (psycopg's cancel(), sqlite3's interrupt()).
+        Override for other cancellation (i.e. pg_cancel_backend() from other connection)
+
+        :param collection: Collection being gathered
+        :param connection: result of _cancellable_connection() in the gathering thread
+        """
+        if self.connection_pool is not None:
+            if not self.connection_pool.cancel():
+                self.logger.warning(
+                    f"Gathering of {collection.key} can't be cancelled, pooled connection has no cancel()"
+                )
+            cancel_query(connection)
+        elif not cancel_query(connection):
+            self.logger.warning(
+                f"Gathering of {collection.key} can't be cancelled, db connection has no cancel()"
+            )
+
+    def _create_progress(self):
+        """Progress of gathering reported to progress_callback.
+        Without callback it's logged (at log_level), if the level is enabled
+        """
+        callback = self.progress_callback
+        if callback is None and self.logger.isEnabledFor(self.log_level):
+            callback = self._log_progress
+        return Progress(
+            len(self.collections[Collection.COLLECTION_TYPE_JSON])
+            + len(self.collections[Collection.COLLECTION_TYPE_CSV]),
+            callback,
+            self.PROGRESS_INTERVAL,
+        )
+
+    def _log_progress(self, progress):
+        eta = "unknown" if progress["eta"] is None else f"{progress['eta']:.0f}s"
+        self.logger.log(
+            self.log_level,
+            f"Analytics gathering progress: {progress['collections_completed']}/{progress['collections_planned']} collections, "
+            f"{progress['slices_completed']} slices, {progress['bytes_staged']} bytes staged, "
+            f"{progress['packages_tarred']} packages tarred, {progress['packages_shipped']} shipped, ETA {eta}",
+        )
+
+    def _create_staging(self):
+        """Staging of files written by the framework, None = files in gather_dir"""
+        if not self.STAGING_MEMORY_SIZE:
+            return None
+        return Staging(
+            self.gather_dir, self.STAGING_FILE_SIZE, self.STAGING_MEMORY_SIZE
+        )
+
+    def _create_connection_pool(self):
+        """Optional. Pool of DB connections for collector functions ('db_pool' kwarg),
+        created for each gathering and closed by _gather_cleanup().
+        i.e. ConnectionPool(lambda: psycopg.connect(...), max_size=4,
+                            replica=ConnectionPool(lambda: psycopg.connect(<replica>)))
+        :return: ConnectionPool or None
+        """
+        return None
+
+    def _create_throttle(self):
+        if self.THROTTLE_LATENCY_THRESHOLD is None:
+            return None
+        return Throttle(
+            self.db_connection,
+            self.THROTTLE_LATENCY_THRESHOLD,
+            max_pause=self.THROTTLE_MAX_PAUSE,
+        )
+
+    def _wait_for_db(self):
+        """Pauses before next collection if DB latency is high (see Throttle).
+        Gathering continues without pause if the probe query fails
+        """
+        if self.throttle is None:
+            return
+
+        try:
+            pause = self.throttle.wait()
+        except Exception as e:
+            self.logger.exception(f"Could not probe DB latency: {e}")
+            return
+        if pause:
+            self.logger.debug(f"DB latency is high, gathering paused for {pause}s")
+        self.run_metrics.update(self.throttle.metrics())
+
     def _init_tmp_dir(self, tmp_root_dir=None):
         self.tmp_dir = pathlib.Path(
             tmp_root_dir or tempfile.mkdtemp(prefix="awx_analytics-")
@@ -427,6 +1083,60 @@ class Collector:
         """
         pass
 
+    def _load_cached_result(self, key):
+        """Loads persisted result of collector with @register(cache_ttl=...)
+        Complement to the _save_cached_result()
+        Optional, results are not cached by default
+        :param key: collector's key
+        :return dict or None - see _save_cached_result()
+        """
+        return None
+
+    def _load_collection_history(self):
+        """Loads persisted statistics of collections by key
+        - 'duration': gathering time of all key's slices (ordering, deadline)
+        - 'data_size': data size of all key's slices (planning)
+        - statistics of slices (see AdaptiveSlicing)
+        Complement to the _save_collection_history()
+        Optional, history is not used by default
+        :return dict
+        """
+        return {}
+
+    def _update_collection_history(self):
+        """Adds total gathering time and data size of each key (all slices) to the history.
+        Moving average (like AdaptiveSlicing) is used, deferred keys are skipped
+        """
+        if self.distributed:
+            # History of keys gathered by other nodes is kept
+            persisted_history = self._load_collection_history() or {}
+            persisted_history.update(
+                {
+                    key: entry
+                    for key, entry in self.collection_history.items()
+                    if key in self.gathering_durations
+                }
+            )
+            self.collection_history = persisted_history
+
+        deferred = self.run_metrics.get("deferred", [])
+        for key, durations in self.gathering_durations.items():
+            if key in deferred:
+                continue
+
+            entry = self.collection_history.setdefault(key, {})
+            values = {
+                "duration": sum(durations),
+                "data_size": self.gathering_data_sizes.get(key, 0),
+            }
+            for name, value in values.items():
+                if name in entry:
+                    value = (
+                        AdaptiveSlicing.SMOOTHING * value
+                        + (1 - AdaptiveSlicing.SMOOTHING) * entry[name]
+                    )
+                entry[name] = value
+
     def _update_last_gathered_entries(self):
         last_gathered_updates = {"keys": {}, "locked": set()}
 
@@ -434,13 +1144,24 @@ class Collector:
             for package in packages:
                 package.update_last_gathered_entries(last_gathered_updates)
 
+        # Empty slices can't move timestamp of key locked by failed slice/package.
+        # Unpackaged slices are in order, failed slice locks the key for the next ones
+        for collection in self.unpackaged_collections:
+            collection.update_last_gathered_entries(last_gathered_updates)
+
         # Locked key means that gathering wasn't successful at least once.
         # Full sync timestamp can't be updated (if present)
         for unsuccessful_key in last_gathered_updates["locked"]:
-            last_gathered_updates.pop(f"{unsuccessful_key}_full", None)
+            last_gathered_updates["keys"].pop(f"{unsuccessful_key}_full", None)
 
-        self.last_gathered_entries.update(last_gathered_updates["keys"])
+        if not self.distributed:
+            self.last_gathered_entries.update(last_gathered_updates["keys"])
+            self._save_last_gathered_entries(self.last_gathered_entries)
+            return
 
+        # Other nodes save timestamps of their keys, only claimed keys are updated
+        self.last_gathered_entries = self._load_last_gathered_entries() or {}
+        self.last_gathered_entries.update(last_gathered_updates["keys"])
         self._save_last_gathered_entries(self.last_gathered_entries)
 
     @abstractmethod
@@ -451,6 +1172,25 @@ class Collector:
         """
         pass
 
+    def _save_cached_result(self, key, cached_result):
+        """Saves result of collector with @register(cache_ttl=...) to persistent storage
+        Complement to the _load_cached_result()
+        :param key: collector's key
+        :param cached_result: dict {
+            'version': collector's version,
+            'gathered_at': datetime,
+            'data': serialized JSON (str)
+        }
+        """
+        pass
+
+    def _save_collection_history(self, collection_history):
+        """Saves dictionary with statistics of collections to persistent storage
+        Complement to the _load_collection_history()
+        :param collection_history: dict (JSON serializable)
+        """
+        pass
+
     @abstractmethod
     def _save_last_gather(self):
         """Persists timestamp of last successful gathering
@@ -469,26 +1209,102 @@ class Collector:
             'csv': []
             'config': <Collection>
         }
+        JSON and CSV collections are templates, collection for each slice is created
+        lazily during gathering (see Collection.iter_slices())
         """
-        for name, fnc in inspect.getmembers(self.collector_module):
-            if (
-                inspect.isfunction(fnc)  # noqa
-                and hasattr(fnc, "__insights_analytics_key__")  # noqa
-                and hasattr(fnc, "__insights_analytics_type__")  # noqa
-                and (not subset or name in subset)  # noqa
+        for fnc in self._registry_index().subset(subset):
+            # Create collection by type
+            collection = self._create_collection(fnc)
+
+            if collection.is_config:
+                # It's supposed there is only one registered config
+                self.collections[Collection.COLLECTION_TYPE_CONFIG] = collection
+            elif isinstance(collection, CollectionCSV):
+                # Collections with files (CSV, Parquet)
+                self.collections[Collection.COLLECTION_TYPE_CSV].append(collection)
+            else:
+                self.collections[collection.data_type].append(collection)
+
+        for data_type in (
+            Collection.COLLECTION_TYPE_JSON,
+            Collection.COLLECTION_TYPE_CSV,
+        ):
+            self.collections[data_type] = self._order_by_dependencies(
+                self._order_collections(self.collections[data_type])
+            )
+
+    def _order_collections(self, collections):
+        """Collections with higher priority (@register(priority=...)) first.
+        With deadline, keys with the oldest timestamps (i.e. deferred by previous gathering)
+        are preferred within the same priority.
+        Then the longest expected keys go first (by collection history),
+        so a long table doesn't stretch the end of gathering.
+        Slices of a key are created later, so their order isn't affected.
+        """
+
+        def sort_key(collection):
+            history = self.collection_history.get(collection.key) or {}
+            expected_duration = -history.get("duration", 0.0)
+            last_entry = collection.last_gathered_entry
+            if self.gather_deadline is None or not isinstance(
+                last_entry, datetime.datetime
             ):
-                # Create collection by type
-                collection = self._create_collection(fnc)
+                return (-collection.metadata.priority, 0, 0, expected_duration)
+            return (
+                -collection.metadata.priority,
+                1,
+                last_entry.timestamp(),
+                expected_duration,
+            )
 
-                if collection.is_config:
-                    # It's supposed there is only one registered config
-                    self.collections[Collection.COLLECTION_TYPE_CONFIG] = collection
-                else:
-                    for since, until in collection.slices():
-                        collection.since = since
-                        collection.until = until
-                        self.collections[collection.data_type].append(collection)
-                        collection = self._create_collection(fnc)
+        return sorted(collections, key=sort_key)
+
+    def _order_by_dependencies(self, collections):
+        """Collections are moved after collections they depend on (@register(depends_on=...)).
+        Order is kept otherwise.
+        """
+        if not any(collection.metadata.depends_on for collection in collections):
+            return collections
+
+        keys = {collection.key for collection in collections}
+        ordered, ordered_keys, pending = [], set(), list(collections)
+        while pending:
+            ready = [
+                collection
+                for collection in pending
+                if all(
+                    key in ordered_keys or key not in keys or key == collection.key
+                    for key in collection.metadata.depends_on
+                )
+            ]
+            if not ready:
+                self.logger.warning(
+                    f"Cyclic dependencies of collectors: {[c.key for c in pending]}"
+                )
+                ready = pending
+            for collection in ready:
+                pending.remove(collection)
+                ordered.append(collection)
+            # Key is done when all its collections are ordered
+            ordered_keys = keys - {collection.key for collection in pending}
+        return ordered
+
+    def _collector_modules(self):
+        """Collector module(s) and plugin modules"""
+        if self.collector_module is None:
+            modules = []
+        elif isinstance(self.collector_module, (list, tuple)):
+            modules = list(self.collector_module)
+        else:
+            modules = [self.collector_module]
+
+        if self.PLUGINS_ENTRY_POINT_GROUP:
+            modules += registry.plugin_modules(self.PLUGINS_ENTRY_POINT_GROUP)
+        return modules
+
+    def _registry_index(self):
+        """Registered functions from collector modules (see Registry)"""
+        return registry.index(self._collector_modules())
 
     def _create_collection(self, fnc_collecting):
         data_type = fnc_collecting.__insights_analytics_type__
@@ -497,6 +1313,10 @@ class Collector:
             collection = self._collection_json_class()(self, fnc_collecting)
         elif data_type == "csv":
             collection = self._collection_csv_class()(self, fnc_collecting)
+        elif data_type == "rows":
+            collection = self._collection_rows_class()(self, fnc_collecting)
+        elif data_type == "parquet":
+            collection = self._collection_parquet_class()(self, fnc_collecting)
 
         if collection is None:
             raise RuntimeError(f"Collection of type {data_type} not implemented")
@@ -522,6 +1342,16 @@ class Collector:
         """Can be redefined by your CollectionCSV implementation"""
         return CollectionCSV
 
+    @staticmethod
+    def _collection_rows_class():
+        """Can be redefined by your CollectionRows implementation"""
+        return CollectionRows
+
+    @staticmethod
+    def _collection_parquet_class():
+        """Can be redefined by your CollectionParquet implementation"""
+        return CollectionParquet
+
     @staticmethod
     def collection_data_status_class():
         return CollectionDataStatus
@@ -537,3 +1367,4 @@ class Collector:
             Collection.COLLECTION_TYPE_CONFIG: None,
         }
         self.packages = {}
+        self.processed_packages = []
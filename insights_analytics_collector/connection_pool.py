@@ -0,0 +1,191 @@
+import contextlib
+import threading
+import time
+
+
+def cancel_query(connection):
+    """Cancels running query of DB-API connection (psycopg's cancel(), sqlite3's interrupt())
+    :return: bool - False if the connection can't be cancelled
+    """
+    for method in ("cancel", "interrupt"):
+        if callable(getattr(connection, method, None)):
+            getattr(connection, method)()
+            return True
+    return False
+
+
+class ConnectionPool:
+    """Bounded pool of DB-API connections shared by collector functions.
+    Collector functions get it in kwargs as 'db_pool' (see Collector._create_connection_pool()).
+
+    Idle connection is checked by health check query before it's reused,
+    broken connections are closed and replaced by new ones.
+    Transaction is rolled back when the connection is returned to the pool.
+    Queries of borrowed connections are cancelled by cancel() (time limit of collector function).
+
+    @register('hosts_count', '1.0', format='json', replica_safe=True)
+    def hosts_count(db_pool, **kwargs):
+        with db_pool.connection() as connection:
+            ...
+
+    :param connect: callable creating new DB-API connection
+    :param max_size: maximum count of open connections
+    :param health_check_query: SQL query, None = no health checks
+    :param acquire_timeout: (seconds) waiting for free connection, TimeoutError is raised then
+    :param replica: ConnectionPool of read replica, used by collectors with @register(replica_safe=True)
+    """
+
+    def __init__(
+        self,
+        connect,
+        max_size=4,
+        health_check_query="SELECT 1",
+        acquire_timeout=30.0,
+        replica=None,
+    ):
+        self.connect = connect
+        self.max_size = max_size
+        self.health_check_query = health_check_query
+        self.acquire_timeout = acquire_timeout
+        self.replica = replica
+
+        self.size = 0  # count of open connections (idle and in use)
+        self.created_count = 0
+        self.discarded_count = 0
+        self.closed = False
+        self._idle = []
+        self._in_use = set()
+        self._condition = threading.Condition()
+
+    def for_collection(self, replica_safe=False):
+        """Pool for collector function, replica if collector is replica-safe"""
+        if replica_safe and self.replica is not None:
+            return self.replica
+        return self
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Borrows connection from the pool"""
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def acquire(self):
+        expires_at = time.monotonic() + self.acquire_timeout
+        while True:
+            with self._condition:
+                if self.closed:
+                    raise RuntimeError("Connection pool is closed")
+
+                connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    if self.size >= self.max_size:
+                        remaining = expires_at - time.monotonic()
+                        if remaining <= 0:
+                            raise TimeoutError(
+                                f"No free DB connection in {self.acquire_timeout}s"
+                            )
+                        self._condition.wait(remaining)
+                        continue
+                    # Slot is reserved, connection is created outside of the lock
+                    self.size += 1
+
+            if connection is None:
+                connection = self._create()
+            elif not self._is_healthy(connection):
+                self._discard(connection)
+                continue
+
+            with self._condition:
+                self._in_use.add(connection)
+            return connection
+
+    def release(self, connection):
+        with self._condition:
+            self._in_use.discard(connection)
+
+        try:
+            connection.rollback()
+        except Exception:
+            self._discard(connection)
+            return
+
+        with self._condition:
+            if not self.closed:
+                self._idle.append(connection)
+                self._condition.notify()
+                return
+        self._discard(connection)
+
+    def close(self):
+        """Closes idle connections, connections in use are closed when they're released"""
+        with self._condition:
+            self.closed = True
+            idle, self._idle = self._idle, []
+            self._condition.notify_all()
+
+        for connection in idle:
+            self._discard(connection)
+        if self.replica is not None:
+            self.replica.close()
+
+    def cancel(self):
+        """Cancels running queries of borrowed connections (also of replica's).
+        Called from other thread (see Collector._cancel_gathering())
+        :return: bool - False if there is a borrowed connection which can't be cancelled
+        """
+        with self._condition:
+            in_use = list(self._in_use)
+
+        cancelled = all([cancel_query(connection) for connection in in_use])
+        if self.replica is not None:
+            cancelled = self.replica.cancel() and cancelled
+        return cancelled
+
+    def metrics(self):
+        return {
+            "created_count": self.created_count,
+            "discarded_count": self.discarded_count,
+        }
+
+    #
+    # Private methods ---------------------------
+    #
+    def _create(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._condition:
+                self.size -= 1
+                self._condition.notify()
+            raise
+
+        with self._condition:
+            self.created_count += 1
+        return connection
+
+    def _discard(self, connection):
+        with contextlib.suppress(Exception):
+            connection.close()
+
+        with self._condition:
+            self.size -= 1
+            self.discarded_count += 1
+            self._condition.notify()
+
+    def _is_healthy(self, connection):
+        if not self.health_check_query:
+            return True
+
+        try:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(self.health_check_query)
+                cursor.fetchall()
+            finally:
+                cursor.close()
+            return True
+        except Exception:
+            return False
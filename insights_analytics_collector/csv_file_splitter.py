@@ -1,6 +1,9 @@
+import csv
 import io
 import os
+import tempfile
 
+from . import page_cache
 from .package import Package
 
 
@@ -9,12 +12,21 @@ class CsvFileSplitter(io.StringIO):
     Expects data written in CSV format (first line is header)
     Could be called from function decorated by @register (see Collector).
     :param max_file_size: determined by decorated function's attribute "max_data_size"
+    :param page_cache_friendly: files are written with large buffer and dropped from page cache
+                                when they're finished (see Collector.PAGE_CACHE_FRIENDLY_IO)
     """
 
     def __init__(
-        self, filespec=None, max_file_size=Package.MAX_DATA_SIZE, *args, **kwargs
+        self,
+        filespec=None,
+        max_file_size=Package.MAX_DATA_SIZE,
+        *args,
+        page_cache_friendly=False,
+        **kwargs,
     ):
         self.max_file_size = max_file_size
+        self.page_cache_friendly = page_cache_friendly
+        self.buffering = page_cache.BUFFER_SIZE if page_cache_friendly else -1
         self.filespec = filespec
         self.files = []
         self.currentfile = None
@@ -25,17 +37,17 @@ class CsvFileSplitter(io.StringIO):
     def cycle_file(self):
         """Closes current file, opens new one and writes CSV header"""
         if self.currentfile:
-            self.currentfile.close()
+            self._close_file()
         self.counter = 0
         fname = "{}_split{}".format(self.filespec, len(self.files))
-        self.currentfile = open(fname, "w", encoding="utf-8")
+        self.currentfile = open(fname, "w", encoding="utf-8", buffering=self.buffering)
         self.files.append(fname)
         if self.header:
             self.counter += self.currentfile.write("{}\n".format(self.header))
 
     def file_list(self):
         """Returns list of written files"""
-        self.currentfile.close()
+        self._close_file()
         # Check for an empty dump
         if len(self.header) + 1 == self.counter:
             os.remove(self.files[-1])
@@ -55,3 +67,115 @@ class CsvFileSplitter(io.StringIO):
         self.counter += self.currentfile.write(s)
         if self.counter >= self.max_file_size:
             self.cycle_file()
+
+    def _close_file(self):
+        if self.page_cache_friendly and not self.currentfile.closed:
+            page_cache.drop_written(self.currentfile)
+        self.currentfile.close()
+
+
+class CsvRowsWriter:
+    """Writes rows (tuples) to CSV files (utf-8), used for @register(format='rows').
+    Each file has at most max_file_size bytes including the header
+    (only a single row longer than that gets its own bigger file).
+
+    Rows are encoded in batches, batch crossing the file size limit is bisected.
+    :param directory: directory for files
+    :param name: prefix of file names (files have unique names, slices don't overwrite each other)
+    :param max_file_size: maximum size of file in bytes
+    :param staging: Staging, files are StagedFile objects then (instead of paths)
+    """
+
+    BATCH_SIZE = 1000
+
+    def __init__(
+        self, directory, name, max_file_size=Package.MAX_DATA_SIZE, staging=None
+    ):
+        self.directory = directory
+        self.name = name
+        self.max_file_size = max_file_size
+        self.staging = staging
+        self.files = []
+        self.header = b""
+        self.currentfile = None
+        self.counter = 0
+
+    def write(self, header, rows):
+        """
+        :param header: list of column names
+        :param rows: iterable of tuples or of batches (lists of tuples, i.e. from cursor.fetchmany())
+        :return: list of written files or StagedFiles (empty if there are no rows)
+        """
+        self.header = self._encode([header])
+        batch = []
+        try:
+            for item in rows:
+                if isinstance(item, list):
+                    self._write_batch(batch)
+                    batch = []
+                    self._write_batch(item)
+                    continue
+
+                batch.append(item)
+                if len(batch) >= self.BATCH_SIZE:
+                    self._write_batch(batch)
+                    batch = []
+            self._write_batch(batch)
+        except Exception:
+            # Staged files aren't deleted with gather_dir
+            if self.staging is not None:
+                for staged_file in self.files:
+                    staged_file.discard()
+            raise
+        finally:
+            self._close_file()
+        return self.files
+
+    #
+    # Private methods ---------------------------
+    #
+    @staticmethod
+    def _encode(rows):
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(rows)
+        return buffer.getvalue().encode("utf-8")
+
+    def _write_batch(self, batch):
+        if not batch:
+            return
+
+        data = self._encode(batch)
+        size = self.counter if self.currentfile else len(self.header)
+        if size + len(data) <= self.max_file_size:
+            self._write(data)
+        elif len(batch) > 1:
+            half = len(batch) // 2
+            self._write_batch(batch[:half])
+            self._write_batch(batch[half:])
+        else:
+            # Row doesn't fit to the current file
+            if self.currentfile and self.counter > len(self.header):
+                self._close_file()
+            self._write(data)
+
+    def _write(self, data):
+        if self.currentfile is None:
+            if self.staging is not None:
+                self.currentfile = self.staging.create(self.name)
+                self.files.append(self.currentfile)
+            else:
+                self.currentfile = tempfile.NamedTemporaryFile(
+                    dir=self.directory,
+                    prefix=f"{self.name}_",
+                    suffix=".csv",
+                    delete=False,
+                )
+                self.files.append(self.currentfile.name)
+            self.counter = self.currentfile.write(self.header)
+        self.counter += self.currentfile.write(data)
+
+    def _close_file(self):
+        if self.currentfile:
+            self.currentfile.close()
+        self.currentfile = None
+        self.counter = 0
@@ -1,3 +1,6 @@
+from .registry import registry
+
+
 def register(
     key,
     version,
@@ -7,6 +10,15 @@ def register(
     fnc_slicing=None,
     shipping_group="default",
     full_sync_interval_days=None,
+    depends_on=None,
+    cache_ttl=None,
+    priority=0,
+    estimate=None,
+    probe=None,
+    timeout=None,
+    retries=0,
+    retry_on=(Exception,),
+    replica_safe=False,
 ):
     """
     A decorator used to register a function as a metric collector.
@@ -14,8 +26,32 @@ def register(
     Decorated functions should do the following based on format:
     - json: return JSON-serializable objects.
     - csv: write CSV data to a filename named 'key'
+    - rows: return tuple (header, rows) - list of column names and iterable of tuples
+            (or of lists of tuples). CSV files are written by the framework (see CollectionRows)
+    - parquet: like 'rows', Parquet files are written by the framework (see CollectionParquet).
+               Requires pyarrow (optional dependency)
 
     :param output_type - 'data' or 'file_paths'
+    :param depends_on - keys of collectors which have to be gathered first
+                        (i.e. they fill the 'run_cache' used by this one)
+    :param cache_ttl - (timedelta or seconds) JSON only. Result is persisted
+                       and reused by next gatherings until it's older than cache_ttl
+    :param priority - (int) collectors with higher priority are gathered first
+                      (matters if gathering has a deadline)
+    :param estimate - callable(key, since, until, collection_type) returning dict
+                      with optional 'bytes', 'duration' (seconds) and 'files' (CSV files count).
+                      Used by Collector.plan() instead of collection history
+    :param probe - callable(key, since, until, collection_type, run_cache, db_pool) returning bool.
+                   Cheap check (i.e. EXISTS query) called before the collector function,
+                   slices without data are skipped (and counted as successful)
+    :param timeout - (timedelta or seconds) time limit of the function (default Collector.COLLECTOR_TIMEOUT).
+                     Function is cancelled by Collector._cancel_gathering(), its partial files are deleted
+    :param retries - (int) count of repeated calls of failed function (with exponential backoff,
+                     see Collector.RETRY_BACKOFF). Partial files are deleted between attempts
+    :param retry_on - (tuple of exception classes) failures which are retried
+                      (i.e. deadlocks, serialization failures, connection resets)
+    :param replica_safe - (bool) function can read from DB replica,
+                          its 'db_pool' kwarg is replica's pool (see ConnectionPool)
 
     @register('projects_by_scm_type', 1)
     def projects_by_scm_type():
@@ -26,12 +62,22 @@ def register(
         f.__insights_analytics_key__ = key
         f.__insights_analytics_version__ = version
         f.__insights_analytics_description__ = description
-        f.__insights_analytics_type__ = format  # CSV/JSON
+        f.__insights_analytics_type__ = format  # CSV/JSON/rows/parquet
         f.__insights_analytics_config__ = config  # config
         f.__insights_analytics_fnc_slicing__ = fnc_slicing
         f.__insights_analytics_shipping_group__ = shipping_group
         f.__insights_analytics_full_sync_interval_days__ = full_sync_interval_days
+        f.__insights_analytics_depends_on__ = depends_on or []
+        f.__insights_analytics_cache_ttl__ = cache_ttl
+        f.__insights_analytics_priority__ = priority
+        f.__insights_analytics_estimate__ = estimate
+        f.__insights_analytics_probe__ = probe
+        f.__insights_analytics_timeout__ = timeout
+        f.__insights_analytics_retries__ = retries
+        f.__insights_analytics_retry_on__ = retry_on
+        f.__insights_analytics_replica_safe__ = replica_safe
 
+        registry.add(f)
         return f
 
     return decorate
@@ -0,0 +1,110 @@
+import threading
+
+
+class GatherRequest:
+    """Parameters of one gather() run, shared by all callers waiting for it.
+    Merged request gathers union of subsets and the widest since/until:
+    - since: the earliest given (None = default since, if no caller set it)
+    - until: None (= now) if any caller didn't set it, the latest otherwise
+    """
+
+    def __init__(self, since=None, until=None, subset=None, deadline=None):
+        self.since = since
+        self.until = until
+        self.subset = list(subset) if subset else None
+        self.deadline = deadline
+        self.callers = 1
+        self.result = None
+        self.done = threading.Event()
+
+    def merge(self, since=None, until=None, subset=None, deadline=None):
+        if since is not None:
+            self.since = since if self.since is None else min(self.since, since)
+        self.until = None if None in (self.until, until) else max(self.until, until)
+        if self.subset is None or not subset:
+            self.subset = None
+        else:
+            self.subset += [name for name in subset if name not in self.subset]
+        # No deadline wins
+        self.deadline = (
+            None if None in (self.deadline, deadline) else max(self.deadline, deadline)
+        )
+        self.callers += 1
+
+    def wait(self, timeout=None):
+        """Waits for the run, returns its tarball paths (None on timeout)"""
+        if not self.done.wait(timeout):
+            return None
+        return self.result
+
+
+class GatherQueue:
+    """Coordinates gather() calls in one process with the same lock key.
+    One run is in progress at a time. Callers arriving meanwhile can
+    - skip (default, no data gathered)
+    - join the running request and get its tarball paths
+    - queue a follow-up run. There is only one follow-up request, later callers are merged into it.
+      The follow-up is run by the thread which finished the previous run. If the run fails,
+      callers of the follow-up get None.
+    """
+
+    SKIP = "skip"
+    JOIN = "join"
+    QUEUE = "queue"
+
+    _queues = {}
+    _queues_lock = threading.Lock()
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = None  # GatherRequest
+        self.pending = None  # GatherRequest, the follow-up
+
+    @classmethod
+    def for_key(cls, key):
+        with cls._queues_lock:
+            if key not in cls._queues:
+                cls._queues[key] = cls()
+            return cls._queues[key]
+
+    def submit(
+        self, if_running=SKIP, since=None, until=None, subset=None, deadline=None
+    ):
+        """
+        :param if_running: SKIP, JOIN or QUEUE
+        :return: tuple (GatherRequest or None, bool - caller has to run the request)
+        """
+        with self.lock:
+            if self.running is None:
+                self.running = GatherRequest(since, until, subset, deadline)
+                return self.running, True
+
+            if if_running == self.JOIN:
+                self.running.callers += 1
+                return self.running, False
+
+            if if_running == self.QUEUE:
+                if self.pending is None:
+                    self.pending = GatherRequest(since, until, subset, deadline)
+                else:
+                    self.pending.merge(since, until, subset, deadline)
+                return self.pending, False
+
+            return None, False
+
+    def finish(self, request, result, run_next=True):
+        """Marks the request done
+        :param run_next: if False (the run failed), the follow-up isn't run,
+                         its callers get None
+        :return: follow-up GatherRequest to be run by the caller or None
+        """
+        with self.lock:
+            request.result = result
+            request.done.set()
+
+            if not run_next and self.pending is not None:
+                self.pending.done.set()
+                self.pending = None
+
+            self.running, self.pending = self.pending, None
+            return self.running
@@ -0,0 +1,100 @@
+class KeysetSlicing:
+    """Slicing function (usable as @register(fnc_slicing=...)) which splits
+    append-only table by ranges of its primary key instead of time.
+
+    Yields (since, until) tuples of ids with meaning `since < pk <= until`,
+    so each slice is an index range scan (see query()).
+    Collection's `until` is the highest id of the slice, so the timestamp persisted
+    for the key (Collector.last_gathered_entries) is the highest id shipped.
+    Next gathering continues from this id.
+
+    :param table: name of db table
+    :param db_connection: callable returning DB-API connection (i.e. Collector.db_connection)
+    :param pk: name of primary key column (integer)
+    :param batch_size: size of slice - range of ids or count of rows (if balanced)
+    :param balanced: slices have the same count of rows instead of range of ids
+                     (boundaries are found by probing the primary key index)
+    """
+
+    def __init__(
+        self, table, db_connection, pk="id", batch_size=100000, balanced=False
+    ):
+        self.table = table
+        self.db_connection = db_connection
+        self.pk = pk
+        self.batch_size = batch_size
+        self.balanced = balanced
+
+    def __call__(
+        self,
+        key,
+        last_gather,
+        full_sync_enabled=False,
+        last_gathered_entry=None,
+        **kwargs,
+    ):
+        # Timestamp from time-based slicing can't be used
+        if full_sync_enabled or not isinstance(last_gathered_entry, int):
+            last_gathered_entry = None
+
+        min_id, max_id = self.id_range(last_gathered_entry)
+        if max_id is None:
+            return
+
+        start = min_id - 1 if last_gathered_entry is None else last_gathered_entry
+        while start < max_id:
+            end = self._next_boundary(start, max_id)
+            yield (start, end)
+            start = end
+
+    def exists(self, since, until, **kwargs):
+        """Checks if slice contains any row, usable as @register(probe=...)"""
+        row = self._fetchone(
+            f"SELECT 1 FROM {self.table} WHERE {self.where(since, until)} LIMIT 1"
+        )
+        return row is not None
+
+    def id_range(self, since=None):
+        """Probes min and max id of rows newer than 'since'
+        :return: tuple (min_id, max_id), (None, None) for no rows
+        """
+        sql = f"SELECT MIN({self.pk}), MAX({self.pk}) FROM {self.table}"
+        if since is not None:
+            sql += f" WHERE {self.pk} > {int(since)}"
+        return self._fetchone(sql)
+
+    def query(self, columns, since, until):
+        """SQL query for collector function, selecting one slice
+
+        :param columns: (str) i.e. "id, created, name"
+        :param since: slice's since (exclusive)
+        :param until: slice's until (inclusive)
+        """
+        return f"SELECT {columns} FROM {self.table} WHERE {self.where(since, until)} ORDER BY {self.pk}"
+
+    def where(self, since, until):
+        """SQL condition for one slice"""
+        return f"{self.pk} > {int(since)} AND {self.pk} <= {int(until)}"
+
+    #
+    # Private methods ---------------------------
+    #
+    def _fetchone(self, sql):
+        cursor = self.db_connection().cursor()
+        try:
+            cursor.execute(sql)
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def _next_boundary(self, start, max_id):
+        if not self.balanced:
+            return min(start + self.batch_size, max_id)
+
+        row = self._fetchone(
+            f"SELECT {self.pk} FROM {self.table} WHERE {self.pk} > {int(start)}"
+            f" ORDER BY {self.pk} LIMIT 1 OFFSET {int(self.batch_size) - 1}"
+        )
+        if row is None or row[0] > max_id:
+            return max_id
+        return row[0]
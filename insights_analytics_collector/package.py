@@ -1,11 +1,12 @@
 import base64
+import contextlib
 import json
 import os
 import pathlib
 import tarfile
 from abc import abstractmethod
 
-import requests
+from . import page_cache
 
 
 class Package:
@@ -42,12 +43,12 @@ class Package:
     def __init__(self, collector):
         self.collector = collector
         self.collections = []
-        self.collection_keys = []
-        self.data_collection_status = self.collector.collection_data_status_class()(
-            self.collector, self
-        )
+        # count of collections by key
+        self.collection_keys = {}
+        # status and manifest are created by make_tgz()
+        self._data_collection_status = None
         self.logger = collector.logger
-        self.manifest = collector.collection_manifest_class()(collector)
+        self._manifest = None
         self.processed = False
         self.shipping_successful = None
         self.tar_path = None
@@ -57,11 +58,56 @@ class Package:
     def max_data_size(cls):
         return cls.MAX_DATA_SIZE
 
+    @property
+    def data_collection_status(self):
+        if self._data_collection_status is None:
+            self._data_collection_status = (
+                self.collector.collection_data_status_class()(self.collector, self)
+            )
+        return self._data_collection_status
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            self._manifest = self.collector.collection_manifest_class()(self.collector)
+        return self._manifest
+
     def add_collection(self, collection):
+        if self.is_key_used(collection.key):
+            # Coalesced slices with the same key can't overwrite each other
+            collection.filename = self._unique_filename(collection)
         self.collections.append(collection)
-        self.collection_keys.append(collection.key)
+        self.collection_keys[collection.key] = (
+            self.collection_keys.get(collection.key, 0) + 1
+        )
         self.total_data_size = self.total_data_size + collection.data_size()
 
+    def info(self):
+        """Summary of processed package (see Collector.iter_gather())"""
+        keys = {}
+        for collection in self.collections:
+            if collection is self._manifest:
+                continue
+            interval = keys.setdefault(
+                collection.key, {"since": collection.since, "until": collection.until}
+            )
+            if collection.since is not None and interval["since"] is not None:
+                interval["since"] = min(interval["since"], collection.since)
+            if collection.until is not None and interval["until"] is not None:
+                interval["until"] = max(interval["until"], collection.until)
+
+        tar_size = None
+        if self.tar_path and os.path.exists(self.tar_path):
+            tar_size = os.path.getsize(self.tar_path)
+
+        return {
+            "tar_path": self.tar_path,
+            "keys": keys,
+            "data_size": self.total_data_size,
+            "tar_size": tar_size,
+            "shipping_successful": self.shipping_successful,
+        }
+
     def is_key_used(self, key):
         return key in self.collection_keys
 
@@ -140,7 +186,7 @@ class Package:
             index = len(list(path.glob(f"{tarname_base}-*.*")))
             tarname = f"{tarname_base}-{index}.tar.gz"
 
-            with tarfile.open(target.joinpath(tarname), "w:gz") as f:
+            with self._open_tgz(target.joinpath(tarname)) as f:
                 for collection in self.collections:
                     self._collection_to_tar(f, collection)
 
@@ -166,7 +212,7 @@ class Package:
 
         self.logger.debug(f"shipping analytics file: {self.tar_path}")
 
-        with open(self.tar_path, "rb") as f:
+        with self._open_tar_path() as f:
             files = {
                 "file": (
                     os.path.basename(self.tar_path),
@@ -174,7 +220,7 @@ class Package:
                     self._payload_content_type(),
                 )
             }
-            s = requests.Session()
+            s = self._http_session()
             if self.shipping_auth_mode() == self.SHIPPING_AUTH_CERTIFICATES:
                 # as a single file (containing the private key and the certificate) or
                 # as a tuple of both files paths (cert_file, keyfile)
@@ -195,9 +241,12 @@ class Package:
         return self.SHIPPING_AUTH_USERPASS
 
     def update_last_gathered_entries(self, updates_dict):
-        if self.shipping_successful:
-            for collection in self.collections:
+        for collection in self.collections:
+            if self.shipping_successful:
                 collection.update_last_gathered_entries(updates_dict)
+            else:
+                # Slices of the same key in later packages can't be persisted
+                updates_dict["locked"].add(collection.key)
 
     #
     # Private methods ---------------------------
@@ -214,6 +263,12 @@ class Package:
             )
             return None
 
+    def _http_session(self):
+        # requests are imported only for shipping (cold start of dry-run/gathering)
+        import requests
+
+        return requests.Session()
+
     def _send_data(self, url, files, session):
         if self.shipping_auth_mode() == self.SHIPPING_AUTH_USERPASS:
             response = session.post(
@@ -308,6 +363,7 @@ class Package:
             self.data_collection_status.gather(None)
             self.data_collection_status.add_to_tar(tar)
             self.manifest.add_collection(self.data_collection_status)
+            self.data_collection_status.cleanup()
         except Exception as e:
             self.logger.exception(
                 f"Could not generate {self.data_collection_status.filename}: {e}"
@@ -321,6 +377,30 @@ class Package:
         except Exception as e:
             self.logger.exception(f"Could not generate {self.manifest.filename}: {e}")
 
+    def _unique_filename(self, collection):
+        """i.e. 'jobs.csv' => 'jobs_slice2.csv' for 3rd collection with key 'jobs'"""
+        index = self.collection_keys[collection.key]
+        return f"{collection.key}_slice{index}.{collection.data_type}"
+
+    @contextlib.contextmanager
+    def _open_tgz(self, path):
+        """New tarball, written with large buffer in page-cache-friendly I/O mode"""
+        if not self.collector.PAGE_CACHE_FRIENDLY_IO:
+            with tarfile.open(path, "w:gz") as tar:
+                yield tar
+            return
+
+        with open(path, "wb", buffering=page_cache.BUFFER_SIZE) as file:
+            with tarfile.open(path, "w:gz", fileobj=file) as tar:
+                yield tar
+
+    def _open_tar_path(self):
+        """Tarball for shipping, dropped from page cache after upload
+        in page-cache-friendly I/O mode"""
+        if self.collector.PAGE_CACHE_FRIENDLY_IO:
+            return page_cache.open_sequential(self.tar_path)
+        return open(self.tar_path, "rb")
+
     def _payload_content_type(self):
         return self.PAYLOAD_CONTENT_TYPE
 
@@ -0,0 +1,50 @@
+"""Page-cache-friendly I/O of staged CSV files and tarballs (Collector.PAGE_CACHE_FRIENDLY_IO).
+Large exports don't evict pages used by co-located services (database, controller):
+files are read and written with large sequential buffers, kernel is advised
+to read ahead (POSIX_FADV_SEQUENTIAL) and to drop pages of consumed files (POSIX_FADV_DONTNEED).
+Finished staged CSV files are written back to disk first (dirty pages can't be dropped).
+posix_fadvise() is a no-op where it's not available (macOS, Windows) and on tmpfs.
+"""
+
+import contextlib
+import os
+
+BUFFER_SIZE = 1048576
+
+
+def advise(file, advice):
+    """posix_fadvise() for the whole file, errors are ignored (advice only)
+    :param file: file object
+    :param advice: name of the advice, i.e. "POSIX_FADV_DONTNEED"
+    """
+    if not hasattr(os, "posix_fadvise"):
+        return
+    with contextlib.suppress(OSError, ValueError):
+        os.posix_fadvise(file.fileno(), 0, 0, getattr(os, advice))
+
+
+def drop_written(file):
+    """Writes file's dirty pages to disk and drops them from page cache
+    (only clean pages can be dropped). File stays open
+    """
+    file.flush()
+    with contextlib.suppress(OSError, ValueError):
+        os.fdatasync(file.fileno())
+    advise(file, "POSIX_FADV_DONTNEED")
+
+
+@contextlib.contextmanager
+def open_sequential(path):
+    """Opens file for sequential reading, its pages are dropped from page cache when it's closed"""
+    with open(path, "rb", buffering=BUFFER_SIZE) as file:
+        advise(file, "POSIX_FADV_SEQUENTIAL")
+        try:
+            yield file
+        finally:
+            advise(file, "POSIX_FADV_DONTNEED")
+
+
+def add_to_tar(tar, path, arcname):
+    """tar.add() reading the file sequentially with large buffer"""
+    with open_sequential(path) as file:
+        tar.addfile(tar.gettarinfo(arcname=arcname, fileobj=file), fileobj=file)
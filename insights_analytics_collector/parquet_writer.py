@@ -0,0 +1,127 @@
+import tempfile
+
+from .package import Package
+
+
+class ParquetRowsWriter:
+    """Writes rows (tuples) to Parquet files, used for @register(format='parquet').
+    Requires optional dependency pyarrow (pip install insights-analytics-collector[parquet]).
+
+    Rows are written in row groups (streaming, only one row group is in memory),
+    columns are dictionary encoded. Column types are declared by the header
+    or inferred from the first row group. Column without values so far (null type)
+    gets the type of later values in a new file (schema of a file can't change).
+    New file is started also when the next row group is not expected to fit into max_file_size.
+
+    :param directory: directory for files
+    :param name: prefix of file names (files have unique names)
+    :param max_file_size: target size of file in bytes
+    """
+
+    ROW_GROUP_SIZE = 65536
+    COMPRESSION = "snappy"
+
+    def __init__(self, directory, name, max_file_size=Package.MAX_DATA_SIZE):
+        self.directory = directory
+        self.name = name
+        self.max_file_size = max_file_size
+        self.files = []
+        self.schema = None
+        self.sink = None
+        self.writer = None
+        self.row_group_bytes = 0  # size of the last written row group
+
+    def write(self, header, rows):
+        """
+        :param header: list of column names or of (name, type) pairs (type is pyarrow type
+                       or its name, i.e. "string", None = inferred), or pyarrow.Schema
+        :param rows: iterable of tuples or of batches (lists of tuples)
+        :return: list of written files (empty if there are no rows)
+        """
+        batch = []
+        try:
+            for item in rows:
+                if isinstance(item, list):
+                    batch += item
+                else:
+                    batch.append(item)
+                if len(batch) >= self.ROW_GROUP_SIZE:
+                    self._write_row_group(header, batch)
+                    batch = []
+            if batch:
+                self._write_row_group(header, batch)
+        finally:
+            self._close_file()
+        return self.files
+
+    #
+    # Private methods ---------------------------
+    #
+    def _write_row_group(self, header, batch):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        fields = self._fields(header)
+        arrays = []
+        for index, column in enumerate(zip(*batch)):
+            column_type = fields[index][1]
+            if column_type is None and self.schema is not None:
+                column_type = self.schema.field(index).type
+                if pa.types.is_null(column_type):
+                    column_type = None  # inferred again
+            arrays.append(pa.array(column, type=column_type))
+        table = pa.Table.from_arrays(arrays, names=[name for name, _ in fields])
+
+        if self.schema is not None and not table.schema.equals(self.schema):
+            # Widened null column
+            self._close_file()
+        self.schema = table.schema
+
+        if (
+            self.writer is not None
+            and self.sink.tell() + self.row_group_bytes > self.max_file_size
+        ):
+            self._close_file()
+
+        if self.writer is None:
+            with tempfile.NamedTemporaryFile(
+                dir=self.directory,
+                prefix=f"{self.name}_",
+                suffix=".parquet",
+                delete=False,
+            ) as f:
+                self.files.append(f.name)
+            self.sink = pa.OSFile(self.files[-1], "wb")
+            self.writer = pq.ParquetWriter(
+                self.sink,
+                self.schema,
+                use_dictionary=True,
+                compression=self.COMPRESSION,
+            )
+
+        position = self.sink.tell()
+        self.writer.write_table(table, row_group_size=len(batch))
+        self.row_group_bytes = self.sink.tell() - position
+
+    @staticmethod
+    def _fields(header):
+        """List of (name, pyarrow type or None)"""
+        import pyarrow as pa
+
+        if isinstance(header, pa.Schema):
+            return [(field.name, field.type) for field in header]
+        return [
+            (
+                (item, None)
+                if isinstance(item, str)
+                else (item[0], None if item[1] is None else pa.field(*item).type)
+            )
+            for item in header
+        ]
+
+    def _close_file(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.sink.close()
+        self.writer = None
+        self.sink = None
@@ -0,0 +1,192 @@
+import copy
+import datetime
+import math
+
+from .collection import Collection
+
+
+class Planner:
+    """Predicts collections (slices), packages, data size and gathering time
+    without gathering data. Only slicing functions are called.
+
+    Estimates of each collection (slice) are from:
+    1) @register(estimate=...) callable:
+       estimate(key=, since=, until=, collection_type=) returning dict with optional
+       'bytes', 'duration' (seconds) and 'files' (count of CSV files)
+    2) Collector's collection history (see Collector._load_collection_history())
+    Unknown values are None (counted as 0).
+
+    Packages are assigned like in Collector._add_collection_to_package()
+    Planning works on a copy of the collector, run state of the collector
+    (i.e. of gathering in progress) isn't changed.
+    """
+
+    def __init__(self, collector):
+        self.collector = copy.copy(collector)
+        self.max_data_size = collector._package_class().max_data_size()
+
+    def plan(self, since=None, until=None, subset=None):
+        """
+        :return: dict {
+            'since', 'until': interval of gathering,
+            'collections': [{'key', 'data_type', 'shipping_group', 'since', 'until',
+                             'bytes', 'duration', 'files', 'source'}],
+            'packages': [{'shipping_group', 'keys', 'bytes'}],
+            'bytes': total estimated bytes,
+            'duration': total estimated seconds,
+            'unknown': count of collections without estimate
+        }
+        """
+        collector = self.collector
+        collector._init_collections(subset, since, until)
+
+        units = []
+        for data_type in (
+            Collection.COLLECTION_TYPE_JSON,
+            Collection.COLLECTION_TYPE_CSV,
+        ):
+            for template in collector.collections[data_type]:
+                for collection in template.iter_slices():
+                    units.append(self._estimate(collection))
+
+        return {
+            "since": collector.gather_since,
+            "until": collector.gather_until,
+            "collections": [unit for unit, _collection in units],
+            "packages": self._assign_packages(units),
+            "bytes": sum(unit["bytes"] or 0 for unit, _collection in units),
+            "duration": sum(unit["duration"] or 0 for unit, _collection in units),
+            "unknown": sum(1 for unit, _collection in units if unit["source"] is None),
+        }
+
+    #
+    # Private methods ---------------------------
+    #
+    def _estimate(self, collection):
+        unit = {
+            "key": collection.key,
+            "data_type": collection.data_type,
+            "shipping_group": collection.shipping_group,
+            "since": collection.since,
+            "until": collection.until,
+            "bytes": None,
+            "duration": None,
+            "files": None,
+            "source": None,
+        }
+
+        fnc_estimate = collection.metadata.estimate
+        if fnc_estimate:
+            estimate = (
+                fnc_estimate(
+                    key=collection.key,
+                    since=collection.since,
+                    until=collection.until,
+                    collection_type=self.collector.collection_type,
+                )
+                or {}
+            )
+            unit.update(
+                {name: estimate.get(name) for name in ("bytes", "duration", "files")}
+            )
+            unit["source"] = "estimate"
+        else:
+            history = self.collector.collection_history.get(collection.key)
+            if history:
+                unit["bytes"] = self._history_bytes(collection, history)
+                unit["duration"] = self.collector._expected_duration(collection)
+                unit["source"] = "history"
+
+        if (
+            unit["files"] is None
+            and collection.data_type != Collection.COLLECTION_TYPE_JSON
+        ):
+            unit["files"] = max(1, math.ceil((unit["bytes"] or 0) / self.max_data_size))
+        return unit, collection
+
+    @staticmethod
+    def _history_bytes(collection, history):
+        if not collection.fnc_slicing:
+            return history.get("data_size")
+        if history.get("bytes_per_second") is not None and isinstance(
+            collection.since, datetime.datetime
+        ):
+            window = (collection.until - collection.since).total_seconds()
+            return history["bytes_per_second"] * window
+        return None
+
+    def _assign_packages(self, units):
+        """Simulates Collector._find_available_package() and shipping of packages"""
+        packages = {}
+
+        for unit, collection in units:
+            if (
+                unit["bytes"] == 0
+                and collection.data_type != Collection.COLLECTION_TYPE_JSON
+            ):
+                continue  # empty CSVs aren't packaged
+
+            files = unit["files"] or 1
+            file_size = (unit["bytes"] or 0) / files
+            for _ in range(files):
+                package = self._find_package(packages, collection, file_size)
+                package["keys"].append(collection.key)
+                package["bytes"] += file_size
+
+                if collection.ship_immediately():
+                    package["processed"] = True
+                elif collection.is_coalesced():
+                    self._process_coalesced(packages, package)
+
+        return [
+            {
+                "shipping_group": group,
+                "keys": package["keys"],
+                "bytes": package["bytes"],
+            }
+            for group, group_packages in packages.items()
+            for package in group_packages
+        ]
+
+    def _find_package(self, packages, collection, size):
+        group_packages = packages.setdefault(collection.shipping_group, [])
+        first_index = 0
+        if collection.is_coalesced():
+            # See Collector._find_available_package()
+            for index, package in enumerate(group_packages):
+                if collection.key in package["keys"]:
+                    first_index = index
+
+        for package in group_packages[first_index:]:
+            if (
+                package["bytes"] + size <= self.max_data_size
+                and (collection.is_coalesced() or collection.key not in package["keys"])
+                and not package["processed"]
+            ):
+                return package
+
+        package = {"keys": [], "bytes": 0, "processed": False}
+        group_packages.append(package)
+        return package
+
+    def _process_coalesced(self, packages, current_package):
+        """See Collector._process_coalesced_packages()"""
+        max_staged_data_size = self.collector._max_staged_data_size()
+        staged = [
+            package
+            for group_packages in packages.values()
+            for package in group_packages
+            if not package["processed"]
+        ]
+        staged_data_size = sum(package["bytes"] for package in staged)
+
+        for package in staged:
+            if staged_data_size <= max_staged_data_size:
+                break
+            if package is current_package:
+                continue
+            package["processed"] = True
+            staged_data_size -= package["bytes"]
+
+        if staged_data_size > max_staged_data_size:
+            current_package["processed"] = True
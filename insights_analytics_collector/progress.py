@@ -0,0 +1,111 @@
+import time
+
+
+class Progress:
+    """Progress of one gathering, reported to a callback (see Collector(progress_callback=...)).
+    Reports are throttled by min_interval, the final one is always reported.
+    ETA is based on throughput so far: elapsed time per completed part of collections
+    (slices of the current key count if their count is known).
+
+    :param collections_planned: count of collections (keys) to gather
+    :param callback: callable(dict), see snapshot(). None = no reports
+    :param min_interval: (seconds) between reports
+    """
+
+    def __init__(self, collections_planned, callback=None, min_interval=0.0):
+        self.collections_planned = collections_planned
+        self.callback = callback
+        self.min_interval = min_interval
+
+        self.started_at = time.monotonic()
+        self.reported_at = None
+        self.collections_completed = 0
+        self.slices_planned = 0  # known counts of started keys
+        self.slices_completed = 0
+        self.bytes_staged = 0
+        self.packages_tarred = 0
+        self.packages_shipped = 0
+        self.finished = False
+
+        self._key_slices_planned = None
+        self._key_slices_completed = 0
+
+    def key_started(self, slices_count=None):
+        """:param slices_count: count of key's slices, None if unknown (generator)"""
+        self._key_slices_planned = slices_count
+        self._key_slices_completed = 0
+        if slices_count:
+            self.slices_planned += slices_count
+
+    def slice_completed(self, data_size=0):
+        self._key_slices_completed += 1
+        self.slices_completed += 1
+        self.bytes_staged += data_size
+        self._report()
+
+    def key_completed(self):
+        self._key_slices_planned = None
+        self._key_slices_completed = 0
+        self.collections_completed += 1
+        self._report()
+
+    def package_tarred(self):
+        self.packages_tarred += 1
+        self._report()
+
+    def package_shipped(self):
+        self.packages_shipped += 1
+        self._report()
+
+    def finish(self):
+        self.finished = True
+        self._report(force=True)
+
+    def completed_fraction(self):
+        if self.finished:
+            return 1.0
+        if not self.collections_planned:
+            return 0.0
+
+        completed = self.collections_completed
+        if self._key_slices_planned:
+            completed += min(self._key_slices_completed / self._key_slices_planned, 1)
+        return completed / self.collections_planned
+
+    def eta(self):
+        """Expected remaining seconds, None until something is completed"""
+        fraction = self.completed_fraction()
+        if not fraction:
+            return None
+        return self.elapsed() * (1 - fraction) / fraction
+
+    def elapsed(self):
+        return time.monotonic() - self.started_at
+
+    def snapshot(self):
+        return {
+            "collections_planned": self.collections_planned,
+            "collections_completed": self.collections_completed,
+            "slices_planned": self.slices_planned,
+            "slices_completed": self.slices_completed,
+            "bytes_staged": self.bytes_staged,
+            "packages_tarred": self.packages_tarred,
+            "packages_shipped": self.packages_shipped,
+            "elapsed": self.elapsed(),
+            "eta": self.eta(),
+            "finished": self.finished,
+        }
+
+    def _report(self, force=False):
+        if self.callback is None:
+            return
+
+        _now = time.monotonic()
+        if (
+            not force
+            and self.reported_at is not None
+            and _now - self.reported_at < self.min_interval
+        ):
+            return
+        self.reported_at = _now
+        self.callback(self.snapshot())
@@ -0,0 +1,124 @@
+import inspect
+
+
+class RegistryIndex:
+    """Functions decorated by @register from one or more collector modules,
+    indexed by name in the module, key, format, shipping group and config flag.
+    Functions are ordered by module and name (like inspect.getmembers())
+    """
+
+    def __init__(self, members):
+        """:param members: list of tuples (name, function)"""
+        self.functions = []
+        self.by_name = {}
+        self.by_key = {}
+        self.by_format = {}
+        self.by_shipping_group = {}
+        self.config = []
+
+        indexed = set()
+        for name, fnc in members:
+            self.by_name.setdefault(name, []).append(fnc)
+            if fnc in indexed:
+                continue
+            indexed.add(fnc)
+
+            self.functions.append(fnc)
+            self.by_key.setdefault(fnc.__insights_analytics_key__, []).append(fnc)
+            self.by_format.setdefault(fnc.__insights_analytics_type__, []).append(fnc)
+            self.by_shipping_group.setdefault(
+                fnc.__insights_analytics_shipping_group__, []
+            ).append(fnc)
+            if fnc.__insights_analytics_config__:
+                self.config.append(fnc)
+
+    def subset(self, names=None):
+        """Functions by list of function names, all functions if names are empty"""
+        if not names:
+            return self.functions
+
+        selected = set()
+        for name in names:
+            selected.update(self.by_name.get(name, []))
+        return [fnc for fnc in self.functions if fnc in selected]
+
+
+class Registry:
+    """Cache of RegistryIndex of collector modules.
+
+    Index of a collector module is built from the module's namespace once
+    (like inspect.getmembers()), so re-exported functions and functions wrapped
+    by other decorators are found too; decorated function alone can't tell
+    which modules expose it. The index is cached until the module
+    is (re)imported, i.e. until @register is called in the module.
+
+    Plugins are modules referenced by entry points, they're loaded
+    on the first request for the entry point group.
+    """
+
+    def __init__(self):
+        self._members = {}  # {module name: (module, list of (name, function))}
+        self._indexes = {}  # {tuple of module names: RegistryIndex}
+        self._plugins = {}  # {entry point group: list of modules}
+
+    def add(self, fnc):
+        """Called by @register, module is being imported => its indexes are rebuilt"""
+        module_name = fnc.__module__
+        self._members.pop(module_name, None)
+        self._indexes = {
+            names: index
+            for names, index in self._indexes.items()
+            if module_name not in names
+        }
+
+    def index(self, modules):
+        """
+        :param modules: list of modules
+        :return: RegistryIndex
+        """
+        names = tuple(module.__name__ for module in modules)
+        index = self._indexes.get(names)
+        if index is None or any(
+            self._members.get(module.__name__, (None,))[0] is not module
+            for module in modules
+        ):
+            members = []
+            for module in modules:
+                members += self._module_members(module)
+            index = RegistryIndex(members)
+            self._indexes[names] = index
+        return index
+
+    def plugin_modules(self, group):
+        """Loads modules registered as entry points in 'group' (once)"""
+        if group not in self._plugins:
+            from importlib.metadata import entry_points
+
+            group_entry_points = entry_points()
+            if hasattr(group_entry_points, "select"):
+                group_entry_points = group_entry_points.select(group=group)
+            else:  # python < 3.10
+                group_entry_points = group_entry_points.get(group, [])
+
+            self._plugins[group] = [
+                entry_point.load() for entry_point in group_entry_points
+            ]
+        return self._plugins[group]
+
+    def _module_members(self, module):
+        """Functions decorated by @register in module's namespace, sorted by name"""
+        cached = self._members.get(module.__name__)
+        if cached is None or cached[0] is not module:
+            members = sorted(
+                (name, fnc)
+                for name, fnc in vars(module).items()
+                if inspect.isfunction(fnc)
+                and hasattr(fnc, "__insights_analytics_key__")
+                and hasattr(fnc, "__insights_analytics_type__")
+            )
+            cached = (module, members)
+            self._members[module.__name__] = cached
+        return cached[1]
+
+
+registry = Registry()
@@ -0,0 +1,106 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+class RunCache:
+    """Cache shared by collector functions during one gathering.
+    Collector functions get it in kwargs as 'run_cache'.
+
+    Values are identified by name and since/until, so slices don't share them.
+    The least recently used values are evicted if size of all values exceeds max_size.
+    Cache is cleared by Collector._gather_cleanup()
+
+    @register('hosts_by_org', '1.0', format='json')
+    def hosts_by_org(since, until, run_cache, **kwargs):
+        hosts = run_cache.get_or_compute('hosts', load_hosts, since, until)
+        ...
+
+    :param max_size: maximum size of cached values in bytes (estimated)
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self._entries = OrderedDict()  # {(name, since, until): (value, size)}
+        self._lock = threading.Lock()
+        self._compute_locks = {}  # {(name, since, until): threading.Lock}
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._compute_locks.clear()
+            self.size = 0
+
+    def get(self, name, since=None, until=None, default=None):
+        key = (name, since, until)
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key][0]
+
+    def get_or_compute(self, name, fnc, since=None, until=None, size=None):
+        """Returns cached value or calls fnc() and caches its result.
+        Parallel calls with the same name/since/until compute the value only once.
+
+        :param name: name of cached value
+        :param fnc: callable without params, computes the value
+        :param since: (datetime) start of data interval
+        :param until: (datetime) end of data interval
+        :param size: size of value in bytes (estimated by default)
+        """
+        key = (name, since, until)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            compute_lock = self._compute_locks.setdefault(key, threading.Lock())
+
+        with compute_lock:
+            with self._lock:
+                if key in self._entries:
+                    return self._entries[key][0]
+
+            value = fnc()
+            self.set(name, value, since, until, size)
+            return value
+
+    def set(self, name, value, since=None, until=None, size=None):
+        key = (name, since, until)
+        size = self._sizeof(value) if size is None else size
+        if size > self.max_size:
+            return
+
+        with self._lock:
+            if key in self._entries:
+                self.size -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            self._evict()
+
+    #
+    # Private methods ---------------------------
+    #
+    def _evict(self):
+        """Removes least recently used values"""
+        while self.size > self.max_size:
+            key, (_value, size) = self._entries.popitem(last=False)
+            self._compute_locks.pop(key, None)
+            self.size -= size
+
+    @classmethod
+    def _sizeof(cls, value, depth=2):
+        """Estimated size of value, containers are counted to the given depth"""
+        size = sys.getsizeof(value)
+        if depth <= 0:
+            return size
+
+        if isinstance(value, dict):
+            size += sum(
+                cls._sizeof(k, depth - 1) + cls._sizeof(v, depth - 1)
+                for k, v in value.items()
+            )
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            size += sum(cls._sizeof(item, depth - 1) for item in value)
+        return size
@@ -0,0 +1,108 @@
+import tarfile
+import tempfile
+import threading
+
+
+class StagedFile:
+    """File written by the framework (format='rows', data_collection_status.csv),
+    kept in memory until it exceeds max_memory_size, then spilled to a temporary
+    file in the staging directory (see Staging).
+
+    Collections (CollectionCSV) keep it instead of a path to file,
+    add_to_tar() streams it directly from the buffer.
+    """
+
+    def __init__(self, staging, name, max_memory_size):
+        self.staging = staging
+        self.name = name
+        self.max_memory_size = max_memory_size
+        self.reserved_memory_size = max_memory_size
+        self.size = 0
+        self.file = tempfile.SpooledTemporaryFile(
+            max_size=max_memory_size, dir=staging.directory, prefix=f"{name}_"
+        )
+
+    def write(self, data):
+        """Writes bytes"""
+        written = self.file.write(data)
+        self.size += written
+        return written
+
+    def close(self):
+        """Writing finished, data are kept until discard()"""
+        if self.file.closed:
+            return
+        self.file.flush()
+        self.staging._reserve(self, self.size if self.in_memory() else 0)
+
+    def in_memory(self):
+        return 0 < self.max_memory_size and self.size <= self.max_memory_size
+
+    def add_to_tar(self, tar, arcname, mtime):
+        info = tarfile.TarInfo(arcname)
+        info.size = self.size
+        info.mtime = mtime
+        self.file.seek(0)
+        tar.addfile(info, fileobj=self.file)
+
+    def discard(self):
+        """Frees the buffer (or deletes spilled file)"""
+        self.file.close()
+        self.staging._remove(self)
+
+
+class Staging:
+    """Staging backend of Collector.gather_dir for files written by the framework.
+    Small files are kept in memory (no small-file I/O on slow pod volumes),
+    files bigger than max_file_size and all files over max_memory_size in total
+    are spilled to disk (the directory).
+    Files written by collector functions (format='csv') are always on disk.
+
+    :param directory: Collector.gather_dir
+    :param max_file_size: bytes, bigger files are spilled to disk
+    :param max_memory_size: bytes, limit of all files kept in memory
+    """
+
+    def __init__(self, directory, max_file_size, max_memory_size):
+        self.directory = directory
+        self.max_file_size = max_file_size
+        self.max_memory_size = max_memory_size
+        self.reserved_memory_size = 0
+        self.staged_files = set()  # not discarded yet
+        self._lock = threading.Lock()
+
+    def create(self, name):
+        """New StagedFile. Memory is reserved for max_file_size until the file is closed,
+        file is spilled to disk right away if there isn't enough
+        """
+        with self._lock:
+            if self.reserved_memory_size + self.max_file_size <= self.max_memory_size:
+                self.reserved_memory_size += self.max_file_size
+                max_file_size = self.max_file_size
+            else:
+                max_file_size = 0
+        staged_file = StagedFile(self, name, max_file_size)
+        if not max_file_size:
+            staged_file.file.rollover()
+        with self._lock:
+            self.staged_files.add(staged_file)
+        return staged_file
+
+    def close(self):
+        """Discards files which weren't discarded by their collections (i.e. failed gathering)"""
+        with self._lock:
+            staged_files, self.staged_files = self.staged_files, set()
+        for staged_file in staged_files:
+            staged_file.discard()
+
+    def _reserve(self, staged_file, size):
+        """Changes memory reserved for the file (actual size when it's closed)"""
+        with self._lock:
+            self.reserved_memory_size += size - staged_file.reserved_memory_size
+            staged_file.reserved_memory_size = size
+
+    def _remove(self, staged_file):
+        """Discarded file"""
+        self._reserve(staged_file, 0)
+        with self._lock:
+            self.staged_files.discard(staged_file)
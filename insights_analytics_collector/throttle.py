@@ -0,0 +1,76 @@
+import time
+
+
+class Throttle:
+    """Protects the database shared with live traffic during gathering.
+    Before each collection (slice) a cheap probe query measures DB latency.
+    If it's over the threshold, gathering pauses (the pause doubles while
+    the DB stays slow, up to max_pause). When latency goes back under the threshold,
+    the pause is halved again until it's shorter than min_pause.
+
+    :param db_connection: callable returning DB-API connection (Collector.db_connection)
+    :param latency_threshold: (float) seconds
+    :param min_pause: (float) seconds, the first pause
+    :param max_pause: (float) seconds, the longest pause
+    :param probe_query: SQL query measuring the latency
+    """
+
+    def __init__(
+        self,
+        db_connection,
+        latency_threshold,
+        min_pause=1.0,
+        max_pause=60.0,
+        probe_query="SELECT 1",
+    ):
+        self.db_connection = db_connection
+        self.latency_threshold = latency_threshold
+        self.min_pause = min_pause
+        self.max_pause = max_pause
+        self.probe_query = probe_query
+
+        self.pause = 0.0
+        self.throttled_count = 0
+        self.throttled_time = 0.0
+
+    def probe(self):
+        """Latency of the probe query in seconds, None without DB connection"""
+        connection = self.db_connection()
+        if connection is None:
+            return None
+
+        start = time.monotonic()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(self.probe_query)
+            cursor.fetchall()
+        finally:
+            cursor.close()
+        return time.monotonic() - start
+
+    def wait(self):
+        """Pauses gathering if the DB is slow
+        :return: (float) seconds of pause
+        """
+        latency = self.probe()
+        if latency is None:
+            return 0.0
+
+        if latency > self.latency_threshold:
+            self.pause = min(max(self.pause * 2, self.min_pause), self.max_pause)
+        elif self.pause / 2 >= self.min_pause:
+            self.pause = self.pause / 2
+        else:
+            self.pause = 0.0
+
+        if self.pause:
+            time.sleep(self.pause)
+            self.throttled_count += 1
+            self.throttled_time += self.pause
+        return self.pause
+
+    def metrics(self):
+        return {
+            "throttled_count": self.throttled_count,
+            "throttled_time": self.throttled_time,
+        }
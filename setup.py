@@ -30,6 +30,7 @@ setup(
     zip_safe=False,
     packages=find_packages(),
     include_package_data=False,
-    install_requires=["django", "requests"],
-    tests_require=["pytest", "pytest-mock", "pytz"],
+    install_requires=["requests"],
+    extras_require={"django": ["django"], "parquet": ["pyarrow"]},
+    tests_require=["django", "pytest", "pytest-mock", "pytz"],
 )
@@ -0,0 +1,18 @@
+from insights_analytics_collector import register
+from tests.functional.helpers import events_db
+
+
+@register("config", "1.0", description="CONFIG", config=True)
+def config(since, **kwargs):
+    return {"version": "1.0"}
+
+
+@register("parquet_events", "1.0", format="parquet", description="Events")
+def parquet_events(**kwargs):
+    cursor = events_db().execute("SELECT id, name FROM events ORDER BY id")
+    return [column[0] for column in cursor.description], cursor
+
+
+@register("parquet_empty", "1.0", format="parquet", description="No rows")
+def parquet_empty(**kwargs):
+    return ["id", "name"], []
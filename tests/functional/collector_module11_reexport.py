@@ -0,0 +1,23 @@
+import functools
+
+from insights_analytics_collector import register
+from tests.functional.collector_module import config, json_collection_1  # noqa: F401
+
+WRAPPED_CALLS = []
+
+
+def counted(f):
+    """Decorator stacked above @register"""
+
+    @functools.wraps(f)
+    def wrapper(**kwargs):
+        WRAPPED_CALLS.append(f.__name__)
+        return f(**kwargs)
+
+    return wrapper
+
+
+@counted
+@register("json_wrapped", "1.0", description="JSON wrapped by other decorator")
+def json_wrapped(**kwargs):
+    return {"wrapped": True}
@@ -0,0 +1,44 @@
+import os
+import sqlite3
+import threading
+
+from insights_analytics_collector import register
+
+HUNG_QUERY = """
+    WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers)
+    SELECT COUNT(*) FROM numbers
+"""
+
+
+class ThreadLocalConnection(threading.local):
+    """Like Django's connection: each thread connects lazily to its own database"""
+
+    connection = None
+
+    def ensure_connection(self):
+        if self.connection is None:
+            self.connection = sqlite3.connect(":memory:", check_same_thread=False)
+
+
+db = ThreadLocalConnection()
+
+
+@register("config", "1.0", description="CONFIG", config=True)
+def config(since, **kwargs):
+    return {"version": "1.0"}
+
+
+@register("csv_hung_query", "1.0", format="csv", timeout=0.2)
+def csv_hung_query(full_path, **kwargs):
+    file_path = os.path.join(full_path, "csv_hung_query.csv")
+    with open(file_path, "w") as f:
+        f.write("partial,data\n")
+        db.ensure_connection()
+        # Never ends, interrupted by Collector._cancel_gathering()
+        db.connection.execute(HUNG_QUERY).fetchall()
+    return [file_path]
+
+
+@register("json_ok", "1.0", format="json")
+def json_ok(**kwargs):
+    return {"ok": True}
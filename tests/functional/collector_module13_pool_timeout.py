@@ -0,0 +1,24 @@
+from insights_analytics_collector import register
+
+HUNG_QUERY = """
+    WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers)
+    SELECT COUNT(*) FROM numbers
+"""
+
+
+@register("config", "1.0", description="CONFIG", config=True)
+def config(since, **kwargs):
+    return {"version": "1.0"}
+
+
+@register("json_hung_query", "1.0", format="json", timeout=0.3)
+def json_hung_query(db_pool, **kwargs):
+    with db_pool.connection() as connection:
+        # Never ends, interrupted by Collector._cancel_gathering()
+        return {"count": connection.execute(HUNG_QUERY).fetchone()[0]}
+
+
+@register("json_replica_ok", "1.0", format="json", replica_safe=True)
+def json_replica_ok(db_pool, **kwargs):
+    with db_pool.connection() as connection:
+        return {"db": connection.execute("SELECT name FROM db").fetchone()[0]}
@@ -1,11 +1,20 @@
-from insights_analytics_collector import register
+from django.utils.timezone import timedelta
+from insights_analytics_collector import AdaptiveSlicing, KeysetSlicing, register
 from tests.functional.helpers import (
     TIMESTAMP_CSV_LINE_LENGTH,
+    events_db,
     full_sync_slicing,
     one_day_slicing,
+    query_csv,
     timestamp_csv,
 )
 
+events_slicing = KeysetSlicing("events", events_db, batch_size=20)
+events_probed_slicing = KeysetSlicing("events", events_db, batch_size=10)
+events_balanced_slicing = KeysetSlicing(
+    "events", events_db, batch_size=20, balanced=True
+)
+
 
 @register("config", "1.0", description="CONFIG", config=True)
 def config(since, **kwargs):
@@ -36,6 +45,12 @@ def csv_one_day_slicing_1(since, full_path, until, **kwargs):
     format="csv",
     description="CSVs splitted by size and date",
     fnc_slicing=one_day_slicing,
+    priority=1,
+    estimate=lambda **kwargs: {
+        "bytes": 4 * TIMESTAMP_CSV_LINE_LENGTH,
+        "duration": 0.5,
+        "files": 2,
+    },
 )
 def csv_one_day_slicing_2(since, full_path, until, **kwargs):
     return timestamp_csv(
@@ -65,3 +80,112 @@ def csv_full_sync_slicing_1(since, full_path, until, **kwargs):
         since=since,
         until=until,
     )
+
+
+@register(
+    "csv_adaptive_slicing_1",
+    "1.0",
+    format="csv",
+    description="CSVs splitted by history of previous gatherings",
+    fnc_slicing=AdaptiveSlicing(
+        target_bytes=800, min_interval=timedelta(days=1), max_interval=timedelta(days=5)
+    ),
+)
+def csv_adaptive_slicing_1(since, full_path, until, **kwargs):
+    return timestamp_csv(
+        full_path,
+        "csv_adaptive_slicing_1",
+        1,
+        2 * TIMESTAMP_CSV_LINE_LENGTH,
+        since=since,
+        until=until,
+    )
+
+
+@register(
+    "csv_keyset_slicing_1",
+    "1.0",
+    format="csv",
+    description="CSVs splitted by range of ids",
+    fnc_slicing=events_slicing,
+)
+def csv_keyset_slicing_1(since, full_path, until, **kwargs):
+    return query_csv(
+        full_path,
+        "csv_keyset_slicing_1",
+        events_db(),
+        events_slicing.query("id, name", since, until),
+        1000,
+    )
+
+
+@register(
+    "csv_keyset_slicing_2",
+    "1.0",
+    format="csv",
+    description="CSVs splitted by count of rows",
+    fnc_slicing=events_balanced_slicing,
+)
+def csv_keyset_slicing_2(since, full_path, until, **kwargs):
+    return query_csv(
+        full_path,
+        "csv_keyset_slicing_2",
+        events_db(),
+        events_balanced_slicing.query("id, name", since, until),
+        1000,
+    )
+
+
+PROBED_SLICES = []
+
+
+@register(
+    "csv_keyset_slicing_3",
+    "1.0",
+    format="csv",
+    description="CSVs splitted by range of ids, empty ranges skipped",
+    fnc_slicing=events_probed_slicing,
+    probe=events_probed_slicing.exists,
+)
+def csv_keyset_slicing_3(since, full_path, until, **kwargs):
+    PROBED_SLICES.append((since, until))
+    return query_csv(
+        full_path,
+        "csv_keyset_slicing_3",
+        events_db(),
+        events_probed_slicing.query("id, name", since, until),
+        1000,
+    )
+
+
+@register(
+    "csv_quiet_slicing_1",
+    "1.0",
+    format="csv",
+    description="CSVs splitted by date, there are no data",
+    fnc_slicing=one_day_slicing,
+    probe=lambda **kwargs: False,
+)
+def csv_quiet_slicing_1(since, full_path, until, **kwargs):
+    raise RuntimeError("Slices without data are not gathered")
+
+
+PROBED_FAILING_SLICES = []
+
+
+def _probe_first_slice(since, **kwargs):
+    """Only the first slice has data"""
+    PROBED_FAILING_SLICES.append(since)
+    return len(PROBED_FAILING_SLICES) == 1
+
+
+@register(
+    "csv_failing_quiet_slicing_1",
+    "1.0",
+    format="csv",
+    description="CSVs splitted by date, the first slice fails, next ones have no data",
+    fnc_slicing=one_day_slicing,
+    probe=_probe_first_slice,
+)
+def csv_failing_quiet_slicing_1(since, full_path, until, **kwargs):
+    raise RuntimeError("Connection lost")
@@ -0,0 +1,20 @@
+from insights_analytics_collector import register
+
+
+@register("json4", "1.4", description="json4")
+def json4(**kwargs):
+    return {"json4": "True"}
+
+
+@register("json5", "1.5", description="json5", shipping_group="plugin")
+def json5(**kwargs):
+    return {"json5": "True"}
+
+
+JSON6_CALLS = []
+
+
+@register("json6", "1.6", description="json6", cache_ttl=3600)
+def json6(**kwargs):
+    JSON6_CALLS.append(1)
+    return {"json6": "True"}
@@ -0,0 +1,34 @@
+from insights_analytics_collector import register
+from tests.functional.helpers import simple_csv
+
+HOSTS_QUERIES = []
+
+
+def load_hosts(since, until):
+    HOSTS_QUERIES.append((since, until))
+    return [{"id": i, "org": i % 3} for i in range(10)]
+
+
+@register("config", "1.0", description="CONFIG", config=True)
+def config(since, **kwargs):
+    return {"version": "1.0"}
+
+
+@register("a_hosts_by_org", "1.0", description="Reads cache", depends_on=["hosts"])
+def a_hosts_by_org(since, until, run_cache, **kwargs):
+    hosts = run_cache.get("hosts", since, until)
+    return {"orgs": sorted({host["org"] for host in hosts})}
+
+
+@register("hosts", "1.0", description="Fills cache")
+def hosts(since, until, run_cache, **kwargs):
+    hosts = run_cache.get_or_compute(
+        "hosts", lambda: load_hosts(since, until), since, until
+    )
+    return {"count": len(hosts)}
+
+
+@register("hosts_table", "1.0", format="csv", description="Uses cache")
+def hosts_table(since, until, full_path, run_cache, **kwargs):
+    run_cache.get_or_compute("hosts", lambda: load_hosts(since, until), since, until)
+    return simple_csv(full_path, "hosts_table", 1, 100)
@@ -0,0 +1,64 @@
+import os
+import sqlite3
+import time
+
+from insights_analytics_collector import register
+
+hung_db = sqlite3.connect(":memory:", check_same_thread=False)
+
+HUNG_QUERY = """
+    WITH RECURSIVE numbers(n) AS (SELECT 1 UNION ALL SELECT n + 1 FROM numbers)
+    SELECT COUNT(*) FROM numbers
+"""
+
+
+@register("config", "1.0", description="CONFIG", config=True)
+def config(since, **kwargs):
+    return {"version": "1.0"}
+
+
+@register("csv_hung_query", "1.0", format="csv", timeout=0.2)
+def csv_hung_query(full_path, **kwargs):
+    file_path = os.path.join(full_path, "csv_hung_query.csv")
+    with open(file_path, "w") as f:
+        f.write("partial,data\n")
+        # Never ends, interrupted by Collector._cancel_gathering()
+        hung_db.execute(HUNG_QUERY).fetchall()
+    return [file_path]
+
+
+@register("json_slow", "1.0", format="json")
+def json_slow(**kwargs):
+    time.sleep(0.3)
+    return {"slow": True}
+
+
+@register("json_ok", "1.0", format="json")
+def json_ok(**kwargs):
+    return {"ok": True}
+
+
+FLAKY_CALLS = []
+
+
+@register(
+    "csv_flaky",
+    "1.0",
+    format="csv",
+    retries=2,
+    retry_on=(sqlite3.OperationalError,),
+)
+def csv_flaky(full_path, **kwargs):
+    """Fails on the first call, after writing the partial file"""
+    FLAKY_CALLS.append(len(os.listdir(full_path)))
+    file_path = os.path.join(full_path, f"csv_flaky_{len(FLAKY_CALLS)}.csv")
+    with open(file_path, "w") as f:
+        f.write("id\n1\n")
+    if len(FLAKY_CALLS) == 1:
+        raise sqlite3.OperationalError("database is locked")
+    return [file_path]
+
+
+@register("json_broken", "1.0", format="json", retries=2, retry_on=(KeyError,))
+def json_broken(**kwargs):
+    raise ValueError("not retried")
@@ -0,0 +1,18 @@
+from insights_analytics_collector import register
+
+
+@register("config", "1.0", description="CONFIG", config=True)
+def config(since, **kwargs):
+    return {"version": "1.0"}
+
+
+@register("json_primary", "1.0", format="json")
+def json_primary(db_pool, **kwargs):
+    with db_pool.connection() as connection:
+        return {"db": connection.execute("SELECT name FROM db").fetchone()[0]}
+
+
+@register("json_replica", "1.0", format="json", replica_safe=True)
+def json_replica(db_pool, **kwargs):
+    with db_pool.connection() as connection:
+        return {"db": connection.execute("SELECT name FROM db").fetchone()[0]}
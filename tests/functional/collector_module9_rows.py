@@ -0,0 +1,38 @@
+from insights_analytics_collector import KeysetSlicing, register
+from tests.functional.helpers import events_db
+
+events_slicing = KeysetSlicing("events", events_db, batch_size=30)
+
+
+@register("config", "1.0", description="CONFIG", config=True)
+def config(since, **kwargs):
+    return {"version": "1.0"}
+
+
+@register("rows_events", "1.0", format="rows", description="Rows of all events")
+def rows_events(**kwargs):
+    cursor = events_db().execute("SELECT id, name FROM events ORDER BY id")
+    return [column[0] for column in cursor.description], cursor
+
+
+@register("rows_batches", "1.0", format="rows", description="Batches of events")
+def rows_batches(**kwargs):
+    cursor = events_db().execute("SELECT id, name FROM events ORDER BY id")
+    return ["id", "name"], iter(lambda: cursor.fetchmany(7), [])
+
+
+@register("rows_empty", "1.0", format="rows", description="No rows")
+def rows_empty(**kwargs):
+    return ["id", "name"], []
+
+
+@register(
+    "rows_sliced",
+    "1.0",
+    format="rows",
+    description="Rows by range of ids",
+    fnc_slicing=events_slicing,
+)
+def rows_sliced(since, until, **kwargs):
+    cursor = events_db().execute(events_slicing.query("id, name", since, until))
+    return ["id", "name"], cursor
@@ -1,10 +1,36 @@
+import contextlib
 import os
+import sqlite3
 
 from django.utils.timezone import now, timedelta
 from insights_analytics_collector import CsvFileSplitter
 
 TIMESTAMP_CSV_LINE_LENGTH = 40
 
+_events_db = None
+
+
+class FakeAdvisoryLocks:
+    """Advisory locks shared by more collectors (nodes) in one process.
+    Replaces Collector._pg_advisory_lock() (see for_node())
+    """
+
+    def __init__(self):
+        self.owners = {}  # {lock key: node}
+
+    def for_node(self, node):
+        @contextlib.contextmanager
+        def lock(key, wait=False):
+            owner = self.owners.setdefault(key, node)
+            acquired = owner == node
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    self.owners.pop(key, None)
+
+        return lock
+
 
 def trivial_slicing(key, last_gather, since, until, **kwargs):
     return [(since, until)]
@@ -39,6 +65,33 @@ def full_sync_slicing(key, last_gather, full_sync_enabled=False, since=None, **k
         start = end
 
 
+def events_db():
+    """In-memory DB with table 'events' - ids 1..100 (gap 41..60)"""
+    global _events_db
+    if _events_db is None:
+        _events_db = sqlite3.connect(":memory:", check_same_thread=False)
+        _events_db.execute("CREATE TABLE events (id INTEGER PRIMARY KEY, name TEXT)")
+        _events_db.executemany(
+            "INSERT INTO events (id, name) VALUES (?, ?)",
+            [(i, f"event{i:04}") for i in range(1, 101) if not 40 < i <= 60],
+        )
+    return _events_db
+
+
+def query_csv(full_path, file_name, connection, query, max_data_size):
+    file_path = get_file_path(full_path, file_name)
+    file = CsvFileSplitter(filespec=file_path, max_file_size=max_data_size)
+
+    cursor = connection.cursor()
+    cursor.execute(query)
+    file.write(",".join(column[0] for column in cursor.description) + "\n")
+    for row in cursor.fetchall():
+        file.write(",".join(str(value) for value in row) + "\n")
+    cursor.close()
+
+    return file.file_list()
+
+
 def csv_generator(full_path, file_name, files_cnt, max_data_size, header, line):
     file_path = get_file_path(full_path, file_name)
     file = CsvFileSplitter(filespec=file_path, max_file_size=max_data_size)
@@ -0,0 +1,28 @@
+import datetime
+import subprocess
+import sys
+
+from django.utils import timezone
+from insights_analytics_collector import clock
+
+
+def test_now_with_django():
+    assert abs(clock.now() - timezone.now()) < datetime.timedelta(seconds=1)
+
+
+def test_now_without_django(mocker):
+    mocker.patch(
+        "insights_analytics_collector.clock._is_django_configured", return_value=False
+    )
+
+    assert clock.now().tzinfo == datetime.timezone.utc
+
+
+def test_heavy_dependencies_not_imported():
+    code = (
+        "import sys, insights_analytics_collector;"
+        "print(','.join(m for m in ('django', 'requests') if m in sys.modules))"
+    )
+    output = subprocess.check_output([sys.executable, "-c", code], text=True)
+
+    assert output.strip() == ""
@@ -0,0 +1,166 @@
+import json
+import sqlite3
+import tarfile
+import threading
+
+import pytest
+import tests.functional.collector_module8_db_pool
+import tests.functional.collector_module13_pool_timeout
+from insights_analytics_collector import ConnectionPool
+from tests.classes.analytics_collector import AnalyticsCollector
+
+
+def _connect(name="primary"):
+    def connect():
+        connection = sqlite3.connect(":memory:", check_same_thread=False)
+        connection.execute("CREATE TABLE db (name TEXT)")
+        connection.execute("INSERT INTO db VALUES (?)", (name,))
+        connection.commit()
+        return connection
+
+    return connect
+
+
+def test_connections_reused():
+    pool = ConnectionPool(_connect())
+    with pool.connection() as connection_1:
+        pass
+    with pool.connection() as connection_2:
+        pass
+
+    assert connection_1 is connection_2
+    assert pool.metrics() == {"created_count": 1, "discarded_count": 0}
+
+
+def test_pool_size_bounded():
+    pool = ConnectionPool(_connect(), max_size=1, acquire_timeout=0.05)
+    connection = pool.acquire()
+
+    with pytest.raises(TimeoutError):
+        pool.acquire()
+
+    # Released connection is handed to waiting thread
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    pool.acquire_timeout = 5
+    thread.start()
+    pool.release(connection)
+    thread.join(5)
+    assert acquired == [connection]
+    assert pool.size == 1
+
+
+def test_broken_connection_replaced():
+    """Idle connection failing the health check is discarded"""
+    pool = ConnectionPool(_connect())
+    with pool.connection() as connection:
+        pass
+    connection.close()
+
+    with pool.connection() as new_connection:
+        assert new_connection is not connection
+        assert new_connection.execute("SELECT name FROM db").fetchone() == ("primary",)
+    assert pool.metrics() == {"created_count": 2, "discarded_count": 1}
+
+
+def test_close():
+    pool = ConnectionPool(_connect(), replica=ConnectionPool(_connect("replica")))
+    with pool.connection() as connection:
+        pass
+    in_use = pool.replica.acquire()
+
+    pool.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute("SELECT 1")
+    with pytest.raises(RuntimeError):
+        pool.acquire()
+
+    pool.replica.release(in_use)
+    with pytest.raises(sqlite3.ProgrammingError):
+        in_use.execute("SELECT 1")
+    assert pool.size == 0 and pool.replica.size == 0
+
+
+def test_collectors_get_pool(mocker):
+    """Replica-safe collector reads from replica, pool is closed after gathering"""
+    collector = AnalyticsCollector(
+        collector_module=tests.functional.collector_module8_db_pool,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+    pool = ConnectionPool(_connect(), replica=ConnectionPool(_connect("replica")))
+    mocker.patch.object(collector, "_create_connection_pool", return_value=pool)
+
+    tgz_files = collector.gather()
+
+    with tarfile.open(tgz_files[0], "r:gz") as archive:
+        assert json.load(archive.extractfile("./json_primary.json")) == {
+            "db": "primary"
+        }
+        assert json.load(archive.extractfile("./json_replica.json")) == {
+            "db": "replica"
+        }
+
+    assert pool.closed and pool.replica.closed
+    assert collector.run_metrics["created_count"] == 1
+
+
+def test_cancel_borrowed_connections(mocker):
+    def connect():
+        return mocker.Mock(spec=["cursor", "rollback", "close", "cancel"])
+
+    pool = ConnectionPool(connect, replica=ConnectionPool(connect))
+    with pool.connection() as idle:
+        pass
+    with pool.connection() as connection, pool.replica.connection() as replica:
+        assert pool.cancel()
+    connection.cancel.assert_called_once()
+    replica.cancel.assert_called_once()
+    assert idle is connection
+
+    assert pool.cancel()
+    connection.cancel.assert_called_once()
+
+    pool = ConnectionPool(lambda: mocker.Mock(spec=["cursor", "rollback", "close"]))
+    with pool.connection():
+        assert not pool.cancel()
+
+
+def test_collector_timeout_in_pool(mocker):
+    """Time limit cancels query of pooled connection, gathering continues"""
+    collector = AnalyticsCollector(
+        collector_module=tests.functional.collector_module13_pool_timeout,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+    pool = ConnectionPool(_connect(), replica=ConnectionPool(_connect("replica")))
+    mocker.patch.object(collector, "_create_connection_pool", return_value=pool)
+
+    tgz_files = collector.gather()
+
+    assert len(tgz_files) == 1
+    collections = {c.key: c for c in collector.packages["default"][0].collections}
+    assert collections["json_hung_query"].status() == "timeout"
+    assert collections["json_replica_ok"].status() == "ok"
+    collector._gather_cleanup()
+
+
+@pytest.mark.parametrize("failure", ["no_config", "exception"])
+def test_pool_closed_when_gathering_stops(mocker, failure):
+    collector = AnalyticsCollector(
+        collector_module=tests.functional.collector_module8_db_pool,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+    pool = ConnectionPool(_connect(), replica=ConnectionPool(_connect("replica")))
+    mocker.patch.object(collector, "_create_connection_pool", return_value=pool)
+
+    if failure == "no_config":
+        assert collector.gather(subset=["json_primary", "json_replica"]) is None
+    else:
+        mocker.patch.object(
+            collector, "_process_packages", side_effect=RuntimeError("disk full")
+        )
+        with pytest.raises(RuntimeError):
+            collector.gather()
+
+    assert pool.closed and pool.replica.closed
+    assert not collector.tmp_dir.exists()
@@ -0,0 +1,115 @@
+import pytest
+import tests.functional.collector_module4_slicing
+from django.utils.timezone import now, timedelta
+from tests.classes.analytics_collector import AnalyticsCollector
+from tests.functional.helpers import FakeAdvisoryLocks
+
+
+def _csv_collections(collector):
+    return [
+        collection
+        for packages in collector.packages.values()
+        for package in packages
+        for collection in package.collections
+        if collection.key.startswith("csv_")
+    ]
+
+
+def _ship(package):
+    package.shipping_successful = True
+    return True
+
+
+@pytest.fixture
+def locks():
+    return FakeAdvisoryLocks()
+
+
+@pytest.fixture
+def collector(mocker, locks):
+    """Node 'b' of cluster, timestamps are stored in 'persisted_entries'"""
+    collector = AnalyticsCollector(
+        collector_module=tests.functional.collector_module4_slicing,
+        collection_type=AnalyticsCollector.MANUAL_COLLECTION,
+        distributed=True,
+    )
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch.object(collector, "_pg_advisory_lock", side_effect=locks.for_node("b"))
+    mocker.patch("tests.classes.package.Package.ship", autospec=True, side_effect=_ship)
+
+    collector.persisted_entries = {}
+    mocker.patch.object(
+        collector,
+        "_load_last_gathered_entries",
+        side_effect=lambda: dict(collector.persisted_entries),
+    )
+    mocker.patch.object(
+        collector,
+        "_save_last_gathered_entries",
+        side_effect=lambda entries: setattr(
+            collector, "persisted_entries", dict(entries)
+        ),
+    )
+    return collector
+
+
+def test_keys_claimed_by_other_node(collector, locks):
+    """Key locked by node 'a' is skipped, locks of node 'b' are released"""
+    locks.owners["gather_analytics_lock:csv_one_day_slicing_1"] = "a"
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=2)
+
+    collector.gather(
+        subset=["config", "csv_one_day_slicing_1", "csv_one_day_slicing_2"],
+        since=since,
+        until=until,
+    )
+
+    keys = {collection.key for collection in _csv_collections(collector)}
+    assert keys == {"csv_one_day_slicing_2"}
+    assert collector.run_metrics["claimed_by_other_node"] == ["csv_one_day_slicing_1"]
+    assert collector.persisted_entries["csv_one_day_slicing_2"] == until
+    assert "csv_one_day_slicing_1" not in collector.persisted_entries
+    assert locks.owners == {"gather_analytics_lock:csv_one_day_slicing_1": "a"}
+
+
+def test_claimed_keys_released_on_failure(mocker, collector, locks):
+    mocker.patch.object(
+        collector, "_process_packages", side_effect=RuntimeError("disk full")
+    )
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    with pytest.raises(RuntimeError):
+        collector.gather(
+            subset=["config", "csv_one_day_slicing_1"],
+            since=until - timedelta(days=1),
+            until=until,
+        )
+
+    assert locks.owners == {}
+    assert not collector.tmp_dir.exists()
+
+
+def test_timestamps_reloaded_and_merged(mocker, collector):
+    """
+    Node 'a' saved timestamps after node 'b' started the gathering.
+    Node 'b' continues from the timestamp of 'a' and keeps timestamps of other keys
+    """
+
+    def gather_json_collections():
+        collector.persisted_entries = {"csv_keyset_slicing_1": 80, "json_of_a": 1}
+        original_gather_json_collections()
+
+    original_gather_json_collections = collector._gather_json_collections
+    mocker.patch.object(
+        collector, "_gather_json_collections", side_effect=gather_json_collections
+    )
+
+    collector.gather(subset=["config", "csv_keyset_slicing_1"])
+
+    slices = [(c.since, c.until) for c in _csv_collections(collector)]
+    assert slices == [(80, 100)]
+    assert collector.persisted_entries["csv_keyset_slicing_1"] == 100
+    assert collector.persisted_entries["json_of_a"] == 1
@@ -0,0 +1,194 @@
+import threading
+import time
+
+import pytest
+import tests.functional.collector_module
+import tests.functional.collector_module2
+from insights_analytics_collector.gather_queue import GatherQueue, GatherRequest
+from tests.classes.analytics_collector import AnalyticsCollector
+
+
+@pytest.fixture(autouse=True)
+def queues(mocker):
+    mocker.patch.object(GatherQueue, "_queues", {})
+
+
+def _collector():
+    return AnalyticsCollector(
+        collector_module=tests.functional.collector_module,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+
+
+def _wait_for(condition, timeout=5):
+    expires_at = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < expires_at
+        time.sleep(0.01)
+
+
+def _gather_in_thread(results, name, **kwargs):
+    def target():
+        results[name] = _collector().gather(wait_timeout=5, **kwargs)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread
+
+
+def test_skip_join_and_queue(mocker):
+    """
+    While collector 'a' gathers:
+    - 'skip' returns None
+    - 'join' gets tarballs of 'a'
+    - 'queue' calls are merged into one follow-up run (run by thread of 'a')
+    """
+    gather_request = mocker.spy(AnalyticsCollector, "_gather_request")
+    running = threading.Event()
+    release = threading.Event()
+
+    collector_a = _collector()
+    original_gather_config = collector_a._gather_config
+
+    def gather_config():
+        running.set()
+        release.wait(5)
+        return original_gather_config()
+
+    mocker.patch.object(collector_a, "_gather_config", side_effect=gather_config)
+
+    results = {}
+    threads = [
+        threading.Thread(
+            target=lambda: results.update(
+                a=collector_a.gather(subset=["config", "json_collection_1"])
+            )
+        )
+    ]
+    threads[0].start()
+    running.wait(5)
+    queue = GatherQueue.for_key(collector_a._gather_queue_key())
+
+    assert _collector().gather() is None
+
+    threads.append(_gather_in_thread(results, "join", if_running="join"))
+    threads.append(
+        _gather_in_thread(
+            results,
+            "queue_1",
+            if_running="queue",
+            subset=["config", "json_collection_2"],
+        )
+    )
+    threads.append(
+        _gather_in_thread(
+            results,
+            "queue_2",
+            if_running="queue",
+            subset=["config", "json_collection_3"],
+        )
+    )
+    _wait_for(
+        lambda: queue.running.callers == 2
+        and queue.pending is not None
+        and queue.pending.callers == 2
+    )
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert gather_request.call_count == 2
+    follow_up = gather_request.call_args_list[1].args[2]
+    assert follow_up.subset == ["config", "json_collection_2", "json_collection_3"]
+
+    assert results["join"] == results["a"]
+    assert len(results["a"]) == 1
+    assert results["queue_1"] == results["queue_2"]
+    assert results["queue_1"] != results["a"]
+    assert queue.running is None and queue.pending is None
+
+    collector_a._gather_cleanup()
+
+
+def test_wait_timeout(mocker):
+    """Waiting caller gets None after timeout, the follow-up stays queued"""
+    queue = GatherQueue.for_key(_collector()._gather_queue_key())
+    queue.submit()
+
+    assert _collector().gather(if_running=GatherQueue.QUEUE, wait_timeout=0.01) is None
+    assert queue.pending.callers == 1
+
+
+def test_lock_of_other_process_is_polled(mocker):
+    """Lock held by other process is polled with 'queue', gathering continues then"""
+    collector = _collector()
+    mocker.patch.object(collector, "GATHER_LOCK_POLL_INTERVAL", 0.01)
+    lock = mocker.patch.object(collector, "_pg_advisory_lock")
+    lock.return_value.__enter__.side_effect = [False, False, True]
+
+    assert collector.gather(if_running=GatherQueue.QUEUE, wait_timeout=5)
+    assert lock.call_count == 3
+    collector._gather_cleanup()
+
+
+def test_lock_of_other_process_without_timeout(mocker):
+    """'queue' without wait_timeout waits for the lock, 'skip' doesn't"""
+    collector = _collector()
+    mocker.patch.object(collector, "GATHER_LOCK_POLL_INTERVAL", 0.01)
+    lock = mocker.patch.object(collector, "_pg_advisory_lock")
+    lock.return_value.__enter__.side_effect = [False] * 5 + [True, False]
+
+    assert collector.gather(if_running=GatherQueue.QUEUE, wait_timeout=None)
+    assert lock.call_count == 6
+    collector._gather_cleanup()
+
+    assert collector.gather(if_running=GatherQueue.SKIP) is None
+    assert lock.call_count == 7
+
+
+def test_join_awaits_other_process(mocker):
+    """'join' waits for gathering of other process, but doesn't repeat it"""
+    collector = _collector()
+    mocker.patch.object(collector, "GATHER_LOCK_POLL_INTERVAL", 0.01)
+    lock = mocker.patch.object(collector, "_pg_advisory_lock")
+    lock.return_value.__enter__.side_effect = [False, False, True]
+    gather_initialize = mocker.spy(collector, "_gather_initialize")
+
+    assert collector.gather(if_running=GatherQueue.JOIN, wait_timeout=5) is None
+    assert lock.call_count == 3
+    gather_initialize.assert_not_called()
+
+
+def test_queue_key_by_type_and_modules():
+    """Dry run isn't merged with shipping gathering, nor other collector modules"""
+    dry_run = _collector()
+    manual = _collector()
+    manual.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    other_module = _collector()
+    other_module.collector_module = tests.functional.collector_module2
+
+    keys = {c._gather_queue_key() for c in (dry_run, manual, other_module)}
+    assert len(keys) == 3
+    assert dry_run._gather_queue_key() == _collector()._gather_queue_key()
+
+
+def test_failed_run_wakes_queued_callers():
+    queue = GatherQueue()
+    running, _ = queue.submit()
+    pending, run = queue.submit(GatherQueue.QUEUE)
+    assert not run
+
+    assert queue.finish(running, None, run_next=False) is None
+    assert pending.wait(timeout=0) is None
+    assert pending.done.is_set()
+    assert queue.running is None and queue.pending is None
+
+
+def test_merged_request():
+    request = GatherRequest(since=5, until=10, subset=["a"])
+    request.merge(since=3, until=8, subset=["b", "a"])
+    assert (request.since, request.until, request.subset) == (3, 10, ["a", "b"])
+
+    request.merge(until=None, subset=None)
+    assert (request.since, request.until, request.subset) == (3, None, None)
+    assert request.callers == 3
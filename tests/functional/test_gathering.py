@@ -1,11 +1,22 @@
+import contextlib
+import io
 import json
 import logging
+import os
 import tarfile
 
+import insights_analytics_collector.collection
 import pytest
 import tests.functional.collector_module
 import tests.functional.collector_module2
 import tests.functional.collector_module3
+import tests.functional.collector_module5
+import tests.functional.collector_module7_timeout
+import tests.functional.collector_module11_reexport
+import tests.functional.collector_module12_thread_local
+from django.utils.timezone import now, timedelta
+from insights_analytics_collector import CsvFileSplitter
+from insights_analytics_collector.registry import registry
 from tests.classes.analytics_collector import AnalyticsCollector
 from tests.functional.helpers import assert_common_files, decode_csv_line
 
@@ -242,7 +253,7 @@ def test_manifest_and_status(collector):
 
         assert json.loads(files["./manifest.json"].read()) == {
             "config.json": "1.0",
-            "data_collection_status.csv": "1.0",
+            "data_collection_status.csv": "1.1",
             "json1.json": "1.1",
             "json2.json": "1.2",
             "json3.json": "1.3",
@@ -265,6 +276,7 @@ def _assert_data_collection_status(status_file):
         "file_name",
         "status",
         "elapsed",
+        "attempts",
     ]
     header = lines.pop(0)
     assert decode_csv_line(header) == fieldnames
@@ -273,6 +285,7 @@ def _assert_data_collection_status(status_file):
         assert len(row) == len(fieldnames)
         assert row[4] == "ok"  # status
         assert row[5] == "0"  # elapsed
+        assert row[6] == "1"  # attempts
         files.pop(files.index(row[3]))
 
     assert len(files) == 0
@@ -280,3 +293,361 @@ def _assert_data_collection_status(status_file):
 
 def _common_files_count():
     return 3
+
+
+def test_registered_collectors():
+    registered = AnalyticsCollector.registered_collectors(
+        [tests.functional.collector_module2, tests.functional.collector_module5]
+    )
+
+    assert list(registered.keys()) == [
+        "config",
+        "json1",
+        "json2",
+        "json3",
+        "json4",
+        "json5",
+        "json6",
+    ]
+    assert registered["json4"] == {
+        "name": "json4",
+        "version": "1.4",
+        "description": "json4",
+    }
+
+
+def test_multiple_collector_modules(collector):
+    collector.collector_module = [
+        tests.functional.collector_module2,
+        tests.functional.collector_module5,
+    ]
+    tgz_files = collector.gather(subset=["config", "json1", "json4", "json5"])
+
+    # json5 has its own shipping group
+    assert len(tgz_files) == 2
+
+    files = {}
+    for tgz_file in tgz_files:
+        with tarfile.open(tgz_file, "r:gz") as archive:
+            for member in archive.getmembers():
+                files[member.name] = archive.extractfile(member)
+
+    assert "./json1.json" in files.keys()
+    assert "./json2.json" not in files.keys()
+    assert "./json4.json" in files.keys()
+    assert "./json5.json" in files.keys()
+
+    collector._gather_cleanup()
+
+
+def test_plugin_collector_modules(mocker, collector):
+    entry_point = mocker.Mock()
+    entry_point.load.return_value = tests.functional.collector_module5
+    entry_points = mocker.patch("importlib.metadata.entry_points")
+    entry_points.return_value.select.return_value = [entry_point]
+
+    collector.collector_module = tests.functional.collector_module2
+    mocker.patch.object(collector, "PLUGINS_ENTRY_POINT_GROUP", "test.collectors")
+
+    collector.gather()
+    collector.gather()
+
+    entry_points.return_value.select.assert_called_once_with(group="test.collectors")
+    keys = [
+        c.key
+        for packages in collector.packages.values()
+        for p in packages
+        for c in p.collections
+    ]
+    assert "json4" in keys
+    assert "json5" in keys
+
+    collector._gather_cleanup()
+
+
+@pytest.mark.parametrize(
+    "cached_hours_ago, from_cache", [(None, False), (0.5, True), (2, False)]
+)
+def test_cached_json_collection(mocker, collector, cached_hours_ago, from_cache):
+    """'json6' is cached for 1 hour"""
+    cached = None
+    if cached_hours_ago is not None:
+        cached = {
+            "version": "1.6",
+            "gathered_at": now() - timedelta(hours=cached_hours_ago),
+            "data": '{"json6": "Cached"}',
+        }
+    mocker.patch.object(collector, "_load_cached_result", return_value=cached)
+    collector.collector_module = [
+        tests.functional.collector_module2,
+        tests.functional.collector_module5,
+    ]
+    tests.functional.collector_module5.JSON6_CALLS.clear()
+
+    tgz_files = collector.gather(subset=["config", "json6"])
+
+    assert len(tests.functional.collector_module5.JSON6_CALLS) == (
+        0 if from_cache else 1
+    )
+
+    with tarfile.open(tgz_files[0], "r:gz") as archive:
+        data = json.loads(archive.extractfile("./json6.json").read())
+        assert data == {"json6": "Cached" if from_cache else "True"}
+
+        lines = archive.extractfile("./data_collection_status.csv").readlines()
+        row = decode_csv_line(lines[1])
+        assert row[3] == "json6.json"
+        assert row[4] == ("cached" if from_cache else "ok")
+
+    collector._gather_cleanup()
+
+
+def test_cached_json_collection_saved(mocker, collector):
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch("tests.classes.package.Package.ship", return_value=True)
+    save_result = mocker.patch.object(collector, "_save_cached_result")
+    collector.collector_module = [
+        tests.functional.collector_module2,
+        tests.functional.collector_module5,
+    ]
+
+    collector.gather(subset=["config", "json4", "json6"])
+
+    save_result.assert_called_once()
+    key, cached = save_result.call_args[0]
+    assert key == "json6"
+    assert cached["version"] == "1.6"
+    assert cached["data"] == '{"json6": "True"}'
+
+
+def test_longest_expected_first(mocker, collector):
+    """Collections are ordered by duration history, the longest first"""
+    history = {
+        "json1": {"duration": 1.0},
+        "json2": {"duration": 5.0},
+        "json3": {"duration": 3.0},
+    }
+    mocker.patch.object(collector, "_load_collection_history", return_value=history)
+    collector.collector_module = tests.functional.collector_module2
+
+    collector._gather_initialize(None, None, None, None)
+
+    keys = [collection.key for collection in collector.collections["json"]]
+    assert keys == ["json2", "json3", "json1"]
+
+    collector._gather_cleanup()
+
+
+def test_duration_history_saved(mocker, collector):
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch("tests.classes.package.Package.ship", return_value=True)
+    history = {"json1": {"duration": 10.0}}
+    mocker.patch.object(collector, "_load_collection_history", return_value=history)
+    save_history = mocker.patch.object(collector, "_save_collection_history")
+    collector.collector_module = tests.functional.collector_module2
+
+    collector.gather()
+
+    history = save_history.call_args[0][0]
+    assert set(history.keys()) == {"json1", "json2", "json3"}
+    # moving average
+    assert 6.9 < history["json1"]["duration"] < 7.1
+    assert history["json2"]["duration"] < 1
+
+
+def test_collector_timeout(mocker, collector):
+    """
+    Hung query is cancelled by the default cancellation (sqlite3's interrupt()),
+    partial file is deleted and the gathering continues.
+    Slow JSON collector exceeds the global time limit, the result is discarded
+    """
+    collector.collector_module = tests.functional.collector_module7_timeout
+    mocker.patch.object(
+        collector,
+        "db_connection",
+        return_value=tests.functional.collector_module7_timeout.hung_db,
+    )
+    mocker.patch.object(
+        collector, "_pg_advisory_lock", return_value=contextlib.nullcontext(True)
+    )
+    mocker.patch.object(collector, "COLLECTOR_TIMEOUT", 0.1)
+    remove = mocker.spy(os, "remove")
+
+    tgz_files = collector.gather()
+
+    assert len(tgz_files) == 1
+    collections = {c.key: c for c in collector.packages["default"][0].collections}
+    assert collections["csv_hung_query"].status() == "timeout"
+    assert collections["json_slow"].status() == "timeout"
+    assert collections["json_ok"].status() == "ok"
+    removed = [os.path.basename(call.args[0]) for call in remove.call_args_list]
+    assert "csv_hung_query.csv" in removed
+
+    with tarfile.open(tgz_files[0], "r:gz") as archive:
+        files = {member.name: archive.extractfile(member) for member in archive}
+        assert "./json_ok.json" in files
+        assert "./json_slow.json" not in files
+        assert "./csv_hung_query.csv" not in files
+
+        statuses = {
+            line[3]: line[4]
+            for line in map(
+                decode_csv_line, files["./data_collection_status.csv"].readlines()[1:]
+            )
+        }
+        assert statuses["csv_hung_query.csv"] == "timeout"
+        assert statuses["json_slow.json"] == "timeout"
+
+    collector._gather_cleanup()
+
+
+def test_collector_timeout_thread_local_connection(mocker, collector):
+    """Query of the gathering thread's connection is cancelled, not the watchdog's one"""
+    module = tests.functional.collector_module12_thread_local
+    collector.collector_module = module
+    mocker.patch.object(collector, "db_connection", return_value=module.db)
+    mocker.patch.object(
+        collector, "_pg_advisory_lock", return_value=contextlib.nullcontext(True)
+    )
+
+    tgz_files = collector.gather()
+
+    assert len(tgz_files) == 1
+    collections = {c.key: c for c in collector.packages["default"][0].collections}
+    assert collections["csv_hung_query"].status() == "timeout"
+    assert collections["json_ok"].status() == "ok"
+
+    collector._gather_cleanup()
+
+
+def test_collector_retries(mocker, collector):
+    """
+    Transient failure is retried, partial file of failed attempt is deleted.
+    Failures not listed in retry_on aren't retried
+    """
+    collector.collector_module = tests.functional.collector_module7_timeout
+    tests.functional.collector_module7_timeout.FLAKY_CALLS.clear()
+    mocker.patch.object(collector, "RETRY_BACKOFF", 0.01)
+    sleep = mocker.spy(insights_analytics_collector.collection.time, "sleep")
+
+    tgz_files = collector.gather(subset=["config", "csv_flaky", "json_broken"])
+
+    # 2nd attempt doesn't see the file from the 1st attempt
+    assert tests.functional.collector_module7_timeout.FLAKY_CALLS == [0, 0]
+    sleep.assert_called_once_with(0.01)
+    assert len(tgz_files) == 1
+
+    collections = {c.key: c for c in collector.packages["default"][0].collections}
+    assert collections["csv_flaky"].status() == "ok"
+    assert collections["csv_flaky"].gathering_attempts == 2
+    assert collections["json_broken"].status() == "failed"
+    assert collections["json_broken"].gathering_attempts == 1
+
+    with tarfile.open(tgz_files[0], "r:gz") as archive:
+        assert "./csv_flaky.csv" in archive.getnames()
+        attempts = {
+            line[3]: line[6]
+            for line in map(
+                decode_csv_line,
+                archive.extractfile("./data_collection_status.csv").readlines()[1:],
+            )
+        }
+        assert attempts == {"csv_flaky.csv": "2", "json_broken.json": "1"}
+
+    collector._gather_cleanup()
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not available"
+)
+def test_page_cache_friendly_io(mocker, collector):
+    """Staged CSVs and shipped tarballs are dropped from page cache after they're read"""
+    collector.PAGE_CACHE_FRIENDLY_IO = True
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch(
+        "tests.classes.package.Package.is_shipping_configured", return_value=True
+    )
+    shipped = []
+
+    def send_data(url, files, session):
+        shipped.append(files["file"][1].read())
+        return True
+
+    mocker.patch("tests.classes.package.Package._send_data", side_effect=send_data)
+    mocker.patch("tests.classes.package.Package._http_session")
+    mocker.patch(
+        "tests.classes.package.Package._get_http_request_headers",
+        side_effect=lambda: {"Content-Type": "application/json"},
+    )
+    fadvise = mocker.spy(os, "posix_fadvise")
+
+    collector.gather(subset=["config", "big_table"])
+
+    advices = [call.args[3] for call in fadvise.call_args_list]
+    # 10 CSVs and 10 tarballs
+    assert len(shipped) == 10
+    assert advices.count(os.POSIX_FADV_SEQUENTIAL) == 20
+    assert advices.count(os.POSIX_FADV_DONTNEED) == 20
+    for data in shipped:
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:gz") as archive:
+            assert len(archive.extractfile("./big_table.csv").read()) == 1000
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "posix_fadvise"), reason="posix_fadvise is not available"
+)
+def test_page_cache_friendly_csv_file_splitter(mocker, tmp_path):
+    """Finished files are written back and dropped from page cache"""
+    fdatasync = mocker.spy(os, "fdatasync")
+    fadvise = mocker.spy(os, "posix_fadvise")
+
+    file = CsvFileSplitter(
+        filespec=f"{tmp_path}/table", max_file_size=20, page_cache_friendly=True
+    )
+    file.write("id,name\n")
+    for i in range(5):
+        file.write(f"{i},name_{i}\n")
+    files = file.file_list()
+
+    assert len(files) == 3
+    assert fdatasync.call_count == 3
+    assert [call.args[3] for call in fadvise.call_args_list] == [
+        os.POSIX_FADV_DONTNEED
+    ] * 3
+
+
+def test_reexported_and_wrapped_collectors(collector):
+    """Collectors imported from other module and wrapped by other decorators are found"""
+    collector.collector_module = tests.functional.collector_module11_reexport
+
+    registered = AnalyticsCollector.registered_collectors(collector.collector_module)
+    assert list(registered.keys()) == ["config", "json_collection_1", "json_wrapped"]
+
+    tgz_files = collector.gather()
+
+    with tarfile.open(tgz_files[0], "r:gz") as archive:
+        names = archive.getnames()
+        assert "./json_collection_1.json" in names
+        assert "./json_wrapped.json" in names
+    assert tests.functional.collector_module11_reexport.WRAPPED_CALLS == [
+        "json_wrapped"
+    ]
+    collector._gather_cleanup()
+
+
+def test_registry_index():
+    module = tests.functional.collector_module11_reexport
+    index = registry.index([module])
+
+    assert index is registry.index([module])
+    assert [fnc.__name__ for fnc in index.config] == ["config"]
+    assert index.by_key["json_collection_1"] == [module.json_collection_1]
+    assert len(index.by_format["json"]) == 3
+    assert len(index.by_shipping_group["default"]) == 3
+    assert index.subset(["json_wrapped", "config"]) == [
+        module.config,
+        module.json_wrapped,
+    ]
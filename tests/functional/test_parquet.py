@@ -0,0 +1,108 @@
+import io
+import json
+import tarfile
+
+import pytest
+import tests.functional.collector_module10_parquet
+from insights_analytics_collector import ParquetRowsWriter
+from tests.classes.analytics_collector import AnalyticsCollector
+
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+class SmallRowGroupsWriter(ParquetRowsWriter):
+    ROW_GROUP_SIZE = 100
+
+
+@pytest.fixture
+def collector():
+    return AnalyticsCollector(
+        collector_module=tests.functional.collector_module10_parquet,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+
+
+def test_parquet_writer_splits_by_size(tmp_path):
+    """New file is started when next row group doesn't fit"""
+    rows = [(i, f"host-{i % 5}") for i in range(1000)]
+    files = SmallRowGroupsWriter(tmp_path, "table", max_file_size=3000).write(
+        ["id", "host"], rows
+    )
+
+    assert len(files) > 1
+    assert all(file.endswith(".parquet") for file in files)
+
+    read_rows = []
+    for file in files:
+        metadata = pq.ParquetFile(file).metadata
+        assert metadata.num_row_groups >= 1
+        # Dictionary encoded columns
+        assert "RLE_DICTIONARY" in metadata.row_group(0).column(1).encodings
+        table = pq.read_table(file)
+        read_rows += list(zip(*table.to_pydict().values()))
+    assert read_rows == rows
+
+
+def test_parquet_writer_batches_and_no_rows(tmp_path):
+    writer = ParquetRowsWriter(tmp_path, "table")
+    assert writer.write(["id"], iter([[(1,), (2,)], [(3,)]])) != []
+    assert pq.read_table(writer.files[0]).column("id").to_pylist() == [1, 2, 3]
+
+    assert ParquetRowsWriter(tmp_path, "empty").write(["id"], []) == []
+
+
+def test_parquet_writer_widens_null_column(tmp_path):
+    """Column with only NULLs in the first row group gets later values' type"""
+
+    class TwoRowsWriter(ParquetRowsWriter):
+        ROW_GROUP_SIZE = 2
+
+    rows = [(1, None), (2, None), (3, "x")]
+    files = TwoRowsWriter(tmp_path, "table").write(["id", "host"], rows)
+
+    assert len(files) == 2
+    tables = [pq.read_table(file) for file in files]
+    assert str(tables[1].schema.field("host").type) == "string"
+    assert [row for table in tables for row in zip(*table.to_pydict().values())] == (
+        rows
+    )
+
+
+def test_parquet_writer_declared_types(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+
+    class TwoRowsWriter(ParquetRowsWriter):
+        ROW_GROUP_SIZE = 2
+
+    rows = [(1, None), (2, None), (3, "x")]
+    files = TwoRowsWriter(tmp_path, "table").write(
+        [("id", "int32"), ("host", "string")], rows
+    )
+    assert len(files) == 1
+    table = pq.read_table(files[0])
+    assert table.schema == pa.schema([("id", pa.int32()), ("host", pa.string())])
+    assert table.column("host").to_pylist() == [None, None, "x"]
+
+    schema = pa.schema([("id", pa.int64()), ("host", pa.large_string())])
+    files = TwoRowsWriter(tmp_path, "schema").write(schema, rows)
+    assert pq.read_table(files[0]).schema == schema
+
+
+def test_parquet_collection(collector):
+    tgz_files = collector.gather(subset=["config", "parquet_events", "parquet_empty"])
+
+    assert len(tgz_files) == 1
+    with tarfile.open(tgz_files[0], "r:gz") as archive:
+        names = archive.getnames()
+        assert "./parquet_empty.parquet" not in names
+        table = pq.read_table(
+            io.BytesIO(archive.extractfile("./parquet_events.parquet").read())
+        )
+        manifest = json.loads(archive.extractfile("./manifest.json").read())
+
+    assert table.column_names == ["id", "name"]
+    assert table.column("id").to_pylist() == [
+        i for i in range(1, 101) if not 40 < i <= 60
+    ]
+    assert manifest["parquet_events.parquet"] == "1.0"
+    collector._gather_cleanup()
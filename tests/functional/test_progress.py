@@ -0,0 +1,97 @@
+import logging
+
+import pytest
+import tests.functional.collector_module4_slicing
+from django.utils.timezone import now, timedelta
+from insights_analytics_collector.progress import Progress
+from tests.classes.analytics_collector import AnalyticsCollector
+
+
+@pytest.fixture
+def reports():
+    return []
+
+
+@pytest.fixture
+def collector(reports):
+    collector = AnalyticsCollector(
+        collector_module=tests.functional.collector_module4_slicing,
+        collection_type=AnalyticsCollector.DRY_RUN,
+        progress_callback=reports.append,
+    )
+    collector.PROGRESS_INTERVAL = 0
+    return collector
+
+
+def _gather(collector, subset, days=3):
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return collector.gather(
+        subset=subset, since=until - timedelta(days=days), until=until
+    )
+
+
+def test_progress_reports(collector, reports):
+    _gather(collector, ["config", "csv_one_day_slicing_1", "csv_quiet_slicing_1"])
+
+    final = reports[-1]
+    assert final["finished"]
+    assert final["collections_planned"] == 2
+    assert final["collections_completed"] == 2
+    assert final["slices_completed"] == 6
+    assert final["packages_tarred"] == 3
+    assert final["packages_shipped"] == 0  # dry run
+    assert final["bytes_staged"] > 0
+    assert final["bytes_staged"] == sum(collector.gathering_data_sizes.values())
+    assert final["eta"] == 0
+
+    # ETA is known after the first completed collection
+    first_key_done = next(r for r in reports if r["collections_completed"] == 1)
+    assert first_key_done["eta"] is not None
+    assert [r["slices_completed"] for r in reports] == sorted(
+        r["slices_completed"] for r in reports
+    )
+    collector._gather_cleanup()
+
+
+def test_progress_throttled(collector, reports):
+    """Only the first and the final reports within the interval"""
+    collector.PROGRESS_INTERVAL = 3600
+
+    _gather(collector, ["config", "csv_one_day_slicing_1"])
+
+    assert len(reports) == 2
+    assert reports[-1]["finished"]
+    collector._gather_cleanup()
+
+
+def test_progress_logged_by_default(caplog):
+    collector = AnalyticsCollector(
+        collector_module=tests.functional.collector_module4_slicing,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+
+    with caplog.at_level(logging.ERROR):
+        _gather(collector, ["config", "csv_one_day_slicing_1"])
+
+    messages = [r.message for r in caplog.records if "progress" in r.message]
+    assert messages[-1].startswith(
+        "Analytics gathering progress: 1/1 collections, 3 slices"
+    )
+    collector._gather_cleanup()
+
+
+def test_eta_with_known_slices(mocker):
+    clock = mocker.patch("insights_analytics_collector.progress.time.monotonic")
+    clock.return_value = 100.0
+    progress = Progress(collections_planned=2)
+
+    assert progress.eta() is None
+    progress.key_started(slices_count=4)
+    progress.slice_completed(data_size=100)
+    clock.return_value = 110.0
+
+    # 1/8 done in 10s
+    assert progress.completed_fraction() == 0.125
+    assert progress.eta() == 70.0
+    assert progress.snapshot()["slices_planned"] == 4
+    assert progress.snapshot()["bytes_staged"] == 100
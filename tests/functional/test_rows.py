@@ -0,0 +1,87 @@
+import csv
+import io
+import os
+import tarfile
+
+import pytest
+import tests.functional.collector_module9_rows
+from insights_analytics_collector import CsvRowsWriter
+from tests.classes.analytics_collector import AnalyticsCollector
+
+
+@pytest.fixture
+def collector():
+    return AnalyticsCollector(
+        collector_module=tests.functional.collector_module9_rows,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+
+
+def _read_csv(data):
+    return list(csv.reader(io.StringIO(data.decode("utf-8"))))
+
+
+def test_rows_writer_splits_by_size(tmp_path):
+    """Files don't exceed the limit, only single long row gets its own bigger file"""
+    rows = [(i, "x" * 10) for i in range(100)] + [(100, "long,value" * 10)]
+    files = CsvRowsWriter(tmp_path, "table", max_file_size=100).write(
+        ["id", "value"], rows
+    )
+
+    sizes = [os.path.getsize(file) for file in files]
+    assert all(size <= 100 for size in sizes[:-1])
+    assert sizes[-1] > 100
+
+    read_rows = []
+    for file in files:
+        with open(file, "rb") as f:
+            lines = _read_csv(f.read())
+        assert lines[0] == ["id", "value"]
+        read_rows += lines[1:]
+    assert read_rows == [[str(i), value] for i, value in rows]
+
+
+def test_rows_writer_without_rows(tmp_path):
+    assert CsvRowsWriter(tmp_path, "table").write(["id"], iter([])) == []
+    assert os.listdir(tmp_path) == []
+
+
+@pytest.mark.parametrize("key", ["rows_events", "rows_batches"])
+def test_rows_collection(collector, key):
+    """80 events (~1000B) are split to 2 files (sub-collections) with size <= 1000B"""
+    tgz_files = collector.gather(subset=["config", key, "rows_empty"])
+
+    rows = []
+    for tgz_file in tgz_files:
+        with tarfile.open(tgz_file, "r:gz") as archive:
+            assert "./rows_empty.csv" not in archive.getnames()
+            member = archive.getmember(f"./{key}.csv")
+            assert member.size <= 1000
+            lines = _read_csv(archive.extractfile(member).read())
+            assert lines[0] == ["id", "name"]
+            rows += lines[1:]
+
+    assert len(tgz_files) == 2
+    assert [int(row[0]) for row in rows] == [
+        i for i in range(1, 101) if not 40 < i <= 60
+    ]
+    collector._gather_cleanup()
+
+
+def test_rows_coalesced_slices(collector):
+    """Files of slices have unique names, they don't overwrite each other"""
+    collector.coalesce_slices = True
+
+    tgz_files = collector.gather(subset=["config", "rows_sliced"])
+
+    rows = []
+    for tgz_file in tgz_files:
+        with tarfile.open(tgz_file, "r:gz") as archive:
+            for name in archive.getnames():
+                if name.startswith("./rows_sliced"):
+                    rows += _read_csv(archive.extractfile(name).read())[1:]
+
+    assert sorted(int(row[0]) for row in rows) == [
+        i for i in range(1, 101) if not 40 < i <= 60
+    ]
+    collector._gather_cleanup()
@@ -0,0 +1,94 @@
+import json
+import tarfile
+import threading
+import time
+
+import pytest
+import tests.functional.collector_module6_run_cache
+from insights_analytics_collector.run_cache import RunCache
+from tests.classes.analytics_collector import AnalyticsCollector
+
+
+@pytest.fixture
+def collector(mocker):
+    collector = AnalyticsCollector(
+        collector_module=tests.functional.collector_module6_run_cache,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+    mocker.patch.object(collector, "_is_valid_license", return_value=True)
+    tests.functional.collector_module6_run_cache.HOSTS_QUERIES.clear()
+
+    return collector
+
+
+def test_shared_values_and_dependencies(collector):
+    """
+    'a_hosts_by_org' depends on 'hosts' => it's gathered later.
+    Hosts are loaded only once for all collectors
+    """
+    tgz_files = collector.gather()
+
+    assert [c.key for c in collector.collections["json"]] == ["hosts", "a_hosts_by_org"]
+    assert len(tests.functional.collector_module6_run_cache.HOSTS_QUERIES) == 1
+
+    with tarfile.open(tgz_files[0], "r:gz") as archive:
+        orgs = json.loads(archive.extractfile("./a_hosts_by_org.json").read())
+        assert orgs == {"orgs": [0, 1, 2]}
+
+    # discarded by cleanup
+    assert collector.run_cache.size == 0
+    collector._gather_cleanup()
+
+
+def test_get_or_compute_once_in_parallel():
+    cache = RunCache(max_size=1048576)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return "value"
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("name", compute))
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ["value"] * 5
+
+
+def test_eviction_by_size():
+    cache = RunCache(max_size=100)
+
+    cache.set("a", "a", size=40)
+    cache.set("b", "b", size=40)
+    assert cache.get("a") == "a"  # 'b' is least recently used now
+
+    cache.set("c", "c", size=40)
+    assert cache.get("b") is None
+    assert cache.get("a") == "a"
+    assert cache.get("c") == "c"
+    assert cache.size == 80
+
+    # bigger than the cache
+    cache.set("d", "d", size=101)
+    assert cache.get("d") is None
+
+
+def test_keys_with_since_until():
+    cache = RunCache(max_size=1048576)
+
+    cache.set("hosts", [1], since=1, until=2)
+    cache.set("hosts", [2], since=2, until=3)
+
+    assert cache.get("hosts", 1, 2) == [1]
+    assert cache.get("hosts", 2, 3) == [2]
+    assert cache.get("hosts") is None
@@ -1,12 +1,22 @@
 import datetime
+import os
+import sqlite3
 import tarfile
+from types import SimpleNamespace
 
 import pytest
 import pytz
 import tests.functional.collector_module4_slicing
 from django.utils.timezone import now, timedelta
+from insights_analytics_collector import AdaptiveSlicing
+from insights_analytics_collector.throttle import Throttle
 from tests.classes.analytics_collector import AnalyticsCollector
-from tests.functional.helpers import assert_common_files, decode_csv_line
+from tests.functional.helpers import (
+    assert_common_files,
+    decode_csv_line,
+    events_db,
+    one_day_slicing,
+)
 
 
 @pytest.fixture
@@ -127,3 +137,586 @@ def test_slices_by_full_sync(mocker, collector, last_sync_days_ago):
         assert len(tgz_files) == 7
     else:
         assert len(tgz_files) == 10
+
+
+def test_coalesced_slices(collector):
+    """
+    Coalescing mode: 10 one-day slices (80B each) fit into one package (1000B),
+    each slice has unique file name in the tarball
+    """
+    days_to_collect = 10
+    collector.coalesce_slices = True
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=days_to_collect)
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_one_day_slicing_1"], since=since, until=until
+    )
+
+    assert len(tgz_files) == 1
+
+    files = {}
+    with tarfile.open(tgz_files[0], "r:gz") as archive:
+        for member in archive.getmembers():
+            files[member.name] = archive.extractfile(member)
+
+        assert_common_files(files)
+        for i in range(days_to_collect):
+            name = "csv_one_day_slicing_1" + (f"_slice{i}" if i else "")
+            # Slices don't overwrite each other's files
+            row = decode_csv_line(files[f"./{name}.csv"].readlines()[1])
+            slice_since = since + timedelta(days=i)
+            assert row[:6] == slice_since.strftime("%Y,%m,%d,%H,00,00").split(",")
+            assert row[6:] == (slice_since + timedelta(days=1)).strftime(
+                "%Y,%m,%d,%H,00,00"
+            ).split(",")
+
+        lines = files["./data_collection_status.csv"].readlines()
+        assert len(lines) == days_to_collect + 1  # +1 == header
+
+    collector._gather_cleanup()
+
+
+def test_coalesced_slices_disk_budget(mocker, collector):
+    """
+    Coalescing mode: 10 one-day slices, each split to 2 files (160B total).
+    Disk budget 400B => package is shipped each time the staged data exceed it
+    """
+    days_to_collect = 10
+    collector.coalesce_slices = True
+    mocker.patch.object(collector, "MAX_STAGED_DATA_SIZE", 400)
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=days_to_collect)
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_one_day_slicing_2"], since=since, until=until
+    )
+
+    assert len(tgz_files) == 4
+
+
+def test_coalesced_slices_last_gathered_entries(mocker, collector):
+    """Key's timestamp is not moved past a slice from package which wasn't shipped"""
+    days_to_collect = 10
+    collector.coalesce_slices = True
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    mocker.patch.object(collector, "MAX_STAGED_DATA_SIZE", 400)
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    save_entries = mocker.patch.object(collector, "_save_last_gathered_entries")
+
+    shipped = []
+
+    def ship(package):
+        package.shipping_successful = len(shipped) != 2
+        shipped.append(package)
+        return package.shipping_successful
+
+    mocker.patch("tests.classes.package.Package.ship", autospec=True, side_effect=ship)
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=days_to_collect)
+
+    collector.gather(
+        subset=["config", "csv_one_day_slicing_2"], since=since, until=until
+    )
+
+    assert len(shipped) == 4
+    last_shipped_slice = shipped[1].collections[-2]
+    entries = save_entries.call_args[0][0]
+    assert entries["csv_one_day_slicing_2"] == last_shipped_slice.until
+    assert entries["csv_one_day_slicing_2"] < until
+
+
+def test_coalesced_slices_keep_package_order(collector):
+    """Newer slice isn't added to an earlier package with free space (max. 1000B)"""
+    collector._reset_collections_and_packages()
+    packages = []
+    for size in (900, 500, 50):
+        package = collector._find_available_package(
+            "default", "jobs", size, allow_key_reuse=True
+        )
+        package.add_collection(
+            SimpleNamespace(
+                key="jobs",
+                data_type="csv",
+                filename="jobs.csv",
+                data_size=lambda size=size: size,
+            )
+        )
+        packages.append(package)
+
+    assert packages[0] is not packages[1]
+    # The first package has free space, but it's older than the key's newest one
+    assert packages[2] is packages[1]
+
+
+@pytest.mark.parametrize(
+    "bytes_per_day, expected_slices", [(None, 10), (400, 5), (100, 2), (1600, 10)]
+)
+def test_adaptive_slicing(mocker, collector, bytes_per_day, expected_slices):
+    """
+    AdaptiveSlicing targets 800B per slice, between 1 and 5 days.
+    - no history: 1-day slices (default)
+    - 400B/day: 2-day slices
+    - 100B/day: 8-day slices => max 5 days
+    - 1600B/day: 12-hour slices => min 1 day
+    """
+    days_to_collect = 10
+    if bytes_per_day:
+        history = {
+            "csv_adaptive_slicing_1": {
+                "bytes_per_second": bytes_per_day / 86400,
+                "duration_per_second": 0,
+                "samples": 1,
+            }
+        }
+        mocker.patch.object(collector, "_load_collection_history", return_value=history)
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=days_to_collect)
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_adaptive_slicing_1"], since=since, until=until
+    )
+
+    assert len(tgz_files) == expected_slices
+
+    history = collector.collection_history["csv_adaptive_slicing_1"]
+    assert history["samples"] == expected_slices + (1 if bytes_per_day else 0)
+
+
+def test_adaptive_slicing_history_saved(mocker, collector):
+    """Gathered slices are recorded to the history (80B per 1-day slice)"""
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch("tests.classes.package.Package.ship", return_value=True)
+    save_history = mocker.patch.object(collector, "_save_collection_history")
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=3)
+
+    collector.gather(
+        subset=["config", "csv_adaptive_slicing_1"], since=since, until=until
+    )
+
+    history = save_history.call_args[0][0]["csv_adaptive_slicing_1"]
+    assert history["samples"] == 3
+    assert history["bytes_per_second"] == pytest.approx(80 / 86400)
+
+
+def test_adaptive_slicing_full_sync():
+    """Full sync starts at full_sync_since or 4 weeks ago, not at last gathering"""
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    last_gather = until - timedelta(days=1)
+    slicing = AdaptiveSlicing(default_interval=timedelta(days=7))
+
+    slices = list(slicing("key", last_gather, until=until, full_sync_enabled=True))
+    assert slices[0][0] == until - timedelta(weeks=4)
+    assert slices[-1][1] == until
+    assert len(slices) == 4
+
+    slicing = AdaptiveSlicing(full_sync_since=lambda key: until - timedelta(days=3))
+    slices = list(slicing("key", last_gather, until=until, full_sync_enabled=True))
+    assert slices[0][0] == until - timedelta(days=3)
+
+
+@pytest.mark.parametrize(
+    "key, expected_rows",
+    [
+        # ids 1..100 without 41..60, by 20 ids
+        ("csv_keyset_slicing_1", [20, 20, 0, 20, 20]),
+        # by 20 rows
+        ("csv_keyset_slicing_2", [20, 20, 20, 20]),
+    ],
+)
+def test_slices_by_keyset(collector, key, expected_rows):
+    tgz_files = collector.gather(subset=["config", key])
+
+    # empty slice is not shipped
+    expected_rows = [rows for rows in expected_rows if rows]
+    assert len(tgz_files) == len(expected_rows)
+
+    for idx, rows in enumerate(expected_rows):
+        with tarfile.open(tgz_files[idx], "r:gz") as archive:
+            lines = archive.extractfile(f"./{key}.csv").readlines()
+            assert decode_csv_line(lines[0]) == ["id", "name"]
+            assert len(lines) == rows + 1
+
+    collector._gather_cleanup()
+
+
+def test_keyset_slicing_last_gathered_entries(mocker, collector):
+    """The highest shipped id is persisted, next gathering continues from it"""
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch("tests.classes.package.Package.ship", autospec=True, side_effect=_ship)
+    save_entries = mocker.patch.object(collector, "_save_last_gathered_entries")
+
+    collector.gather(subset=["config", "csv_keyset_slicing_2"])
+    assert save_entries.call_args[0][0]["csv_keyset_slicing_2"] == 100
+
+    mocker.patch.object(
+        collector,
+        "_load_last_gathered_entries",
+        return_value={"csv_keyset_slicing_2": 90},
+    )
+    collector.gather(subset=["config", "csv_keyset_slicing_2"])
+    collections = collector.packages["default"][0].collections
+    assert [(c.since, c.until) for c in collections[:-1]] == [(90, 100)]
+
+
+def _ship(package):
+    package.shipping_successful = True
+    return True
+
+
+def test_slices_created_lazily(mocker, collector):
+    """Collection for each slice is created just before gathering"""
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=3)
+    events = []
+
+    def slicing(key, last_gather, since, until, **kwargs):
+        for interval in one_day_slicing(key, last_gather, since, until):
+            events.append("slice")
+            yield interval
+
+    def collecting(**kwargs):
+        events.append("gather")
+        return []
+
+    collector._gather_initialize(
+        None, ["config", "csv_one_day_slicing_1"], since, until
+    )
+    assert len(collector.collections["csv"]) == 1
+
+    template = collector.collections["csv"][0]
+    template.fnc_slicing = slicing
+    template.fnc_collecting = collecting
+
+    collector._gather_csv_collections()
+
+    assert events == ["slice", "gather"] * 3
+
+    collector._gather_cleanup()
+
+
+def test_throttling(mocker, collector):
+    """Slices are paused while probe query is slow (threshold 0.1s)"""
+    mocker.patch.object(collector, "THROTTLE_LATENCY_THRESHOLD", 0.1)
+    mocker.patch.object(collector, "THROTTLE_MAX_PAUSE", 4.0)
+    connection = mocker.Mock()
+    connection.cursor.return_value.fetchall.return_value = [[True]]  # advisory lock
+    mocker.patch.object(collector, "db_connection", return_value=connection)
+    latencies = [0.5, 0.5, 0.5, 0.5, 0.01, 0.01, 0.01, 0.01]
+    mocker.patch(
+        "insights_analytics_collector.throttle.Throttle.probe", side_effect=latencies
+    )
+    sleep = mocker.patch("insights_analytics_collector.throttle.time.sleep")
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=len(latencies))
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_one_day_slicing_1"], since=since, until=until
+    )
+
+    assert len(tgz_files) == len(latencies)
+    # doubled up to max. pause, then halved
+    pauses = [call[0][0] for call in sleep.call_args_list]
+    assert pauses == [1.0, 2.0, 4.0, 4.0, 2.0, 1.0]
+    assert collector.run_metrics == {"throttled_count": 6, "throttled_time": 14.0}
+
+
+def test_throttle_probe_failure(mocker, collector):
+    """Failed probe doesn't abort gathering, the slice isn't throttled"""
+    mocker.patch.object(collector, "THROTTLE_LATENCY_THRESHOLD", 0.1)
+    connection = mocker.Mock()
+    connection.cursor.return_value.fetchall.return_value = [[True]]  # advisory lock
+    mocker.patch.object(collector, "db_connection", return_value=connection)
+    mocker.patch(
+        "insights_analytics_collector.throttle.Throttle.probe",
+        side_effect=[0.5, sqlite3.OperationalError("database is locked"), 0.5],
+    )
+    sleep = mocker.patch("insights_analytics_collector.throttle.time.sleep")
+    log_exception = mocker.spy(collector.logger, "exception")
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=3)
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_one_day_slicing_1"], since=since, until=until
+    )
+
+    assert len(tgz_files) == 3
+    assert [call[0][0] for call in sleep.call_args_list] == [1.0, 2.0]
+    assert "Could not probe DB latency" in log_exception.call_args[0][0]
+
+
+def test_throttle_probe():
+    throttle = Throttle(events_db, latency_threshold=10)
+
+    assert 0 <= throttle.probe() < 10
+    assert throttle.wait() == 0.0
+    assert Throttle(lambda: None, latency_threshold=10).probe() is None
+
+
+def test_deadline_and_priorities(mocker, collector):
+    """
+    Expected duration of each next slice is +1000s, deadline is in 1 hour
+    => 4 slices of each key are gathered.
+    'csv_one_day_slicing_2' has higher priority, it's gathered first
+    """
+    mocker.patch.object(
+        collector,
+        "_expected_duration",
+        side_effect=lambda collection: 1000
+        * len(collector.gathering_durations.get(collection.key, [])),
+    )
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=10)
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_one_day_slicing_1", "csv_one_day_slicing_2"],
+        since=since,
+        until=until,
+        deadline=timedelta(hours=1),
+    )
+
+    keys = [collection.key for collection in collector.collections["csv"]]
+    assert keys == ["csv_one_day_slicing_2", "csv_one_day_slicing_1"]
+    # 4 slices split to 2 files + 4 slices
+    assert len(tgz_files) == 4 * 2 + 4
+    assert collector.run_metrics["deferred"] == keys
+
+
+def test_deadline_prefers_oldest_keys(mocker, collector):
+    """With deadline, key deferred by previous gathering (older timestamp) goes first"""
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    last_gathered_entries = {
+        "csv_one_day_slicing_1": until - timedelta(days=5),
+        "csv_adaptive_slicing_1": until - timedelta(days=2),
+    }
+    mocker.patch.object(
+        collector, "_load_last_gathered_entries", return_value=last_gathered_entries
+    )
+    subset = ["config", "csv_one_day_slicing_1", "csv_adaptive_slicing_1"]
+
+    collector._gather_initialize(None, subset, None, until)
+    keys = [collection.key for collection in collector.collections["csv"]]
+    assert keys == ["csv_adaptive_slicing_1", "csv_one_day_slicing_1"]
+    collector._gather_cleanup()
+
+    collector._gather_initialize(None, subset, None, until, deadline=timedelta(hours=1))
+    keys = [collection.key for collection in collector.collections["csv"]]
+    assert keys == ["csv_one_day_slicing_1", "csv_adaptive_slicing_1"]
+    collector._gather_cleanup()
+
+
+@pytest.mark.parametrize("coalesce_slices, expected_packages", [(False, 10), (True, 1)])
+def test_plan_from_history(mocker, collector, coalesce_slices, expected_packages):
+    """
+    Plan of 10 one-day slices (80B each, known from history) without gathering.
+    Slices are shipped one by one or coalesced into one package (1000B)
+    """
+    collector.coalesce_slices = coalesce_slices
+    history = {
+        "csv_one_day_slicing_1": {
+            "bytes_per_second": 80 / 86400,
+            "duration_per_second": 1 / 86400,
+            "samples": 1,
+        }
+    }
+    mocker.patch.object(collector, "_load_collection_history", return_value=history)
+    gather = mocker.patch.object(collector, "_gather_csv_collection")
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=10)
+
+    plan = collector.plan(since, until, subset=["config", "csv_one_day_slicing_1"])
+
+    assert len(plan["collections"]) == 10
+    assert all(unit["source"] == "history" for unit in plan["collections"])
+    assert plan["bytes"] == pytest.approx(800)
+    assert plan["duration"] == pytest.approx(10)
+    assert plan["unknown"] == 0
+    assert len(plan["packages"]) == expected_packages
+    gather.assert_not_called()
+
+
+def test_plan_from_estimate(collector):
+    """
+    @register(estimate=...) predicts 2 files per day,
+    so the plan matches the real gathering (see test_slices_by_date_and_size)
+    """
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=10)
+    subset = ["config", "csv_one_day_slicing_2"]
+
+    plan = collector.plan(since, until, subset=subset)
+    assert plan["bytes"] == 10 * 160
+    assert plan["duration"] == pytest.approx(5)
+    assert len(plan["packages"]) == 20
+
+    tgz_files = collector.gather(subset=subset, since=since, until=until)
+    assert len(tgz_files) == len(plan["packages"])
+    collector._gather_cleanup()
+
+
+def test_plan_keeps_run_state(collector):
+    """Planning while gathering is in progress doesn't reset its collections"""
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    collector._gather_initialize(
+        None, ["config", "csv_one_day_slicing_1"], until - timedelta(days=2), until
+    )
+    collections, packages = collector.collections, collector.packages
+    run_cache, gather_since = collector.run_cache, collector.gather_since
+
+    plan = collector.plan(
+        until - timedelta(days=5), until, subset=["config", "csv_one_day_slicing_2"]
+    )
+
+    assert len(plan["collections"]) == 5
+    assert collector.collections is collections
+    assert [c.key for c in collections["csv"]] == ["csv_one_day_slicing_1"]
+    assert collector.packages is packages
+    assert collector.run_cache is run_cache
+    assert collector.gather_since == gather_since
+    collector._gather_cleanup()
+
+
+def test_plan_unknown(collector):
+    """Without history and estimate the collections are counted as unknown"""
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=3)
+
+    plan = collector.plan(since, until, subset=["config", "csv_one_day_slicing_1"])
+    assert plan["unknown"] == 3
+    assert plan["bytes"] == 0
+    assert [unit["since"] for unit in plan["collections"]] == [
+        since + timedelta(days=i) for i in range(3)
+    ]
+
+
+def test_probe_skips_empty_slices(mocker, collector):
+    """
+    Ranges of 10 ids, ids 41..60 are missing => 2 slices are skipped by the probe.
+    Skipped slices are successful, timestamp is the highest id
+    """
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch("tests.classes.package.Package.ship", autospec=True, side_effect=_ship)
+    save_entries = mocker.patch.object(collector, "_save_last_gathered_entries")
+    tests.functional.collector_module4_slicing.PROBED_SLICES.clear()
+
+    collector.gather(subset=["config", "csv_keyset_slicing_3"])
+
+    assert tests.functional.collector_module4_slicing.PROBED_SLICES == [
+        (0, 10),
+        (10, 20),
+        (20, 30),
+        (30, 40),
+        (60, 70),
+        (70, 80),
+        (80, 90),
+        (90, 100),
+    ]
+    assert len(collector.packages["default"]) == 8
+    assert [c.status() for c in collector.unpackaged_collections] == ["skipped"] * 2
+    assert save_entries.call_args[0][0]["csv_keyset_slicing_3"] == 100
+
+
+def test_probe_moves_timestamp_of_quiet_key(mocker, collector):
+    """No slice has data, but the key's timestamp is moved to 'until'"""
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch("tests.classes.package.Package.ship", autospec=True, side_effect=_ship)
+    save_entries = mocker.patch.object(collector, "_save_last_gathered_entries")
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=3)
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_quiet_slicing_1"], since=since, until=until
+    )
+
+    assert tgz_files == []
+    assert len(collector.unpackaged_collections) == 3
+    assert save_entries.call_args[0][0]["csv_quiet_slicing_1"] == until
+
+
+def test_failed_slice_locks_quiet_slices(mocker, collector):
+    """Slices without data after a failed slice don't move the key's timestamp"""
+    mocker.patch.object(collector, "_is_shipping_configured", return_value=True)
+    mocker.patch("tests.classes.package.Package.ship", autospec=True, side_effect=_ship)
+    save_entries = mocker.patch.object(collector, "_save_last_gathered_entries")
+    tests.functional.collector_module4_slicing.PROBED_FAILING_SLICES.clear()
+    collector.collection_type = AnalyticsCollector.MANUAL_COLLECTION
+
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=3)
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_failing_quiet_slicing_1"], since=since, until=until
+    )
+
+    assert tgz_files == []
+    statuses = [c.status() for c in collector.unpackaged_collections]
+    assert statuses == ["failed", "skipped", "skipped"]
+    assert "csv_failing_quiet_slicing_1" not in save_entries.call_args[0][0]
+
+
+def test_iter_gather_streams_slices(mocker, collector):
+    """Package of each slice is yielded right after it's shipped"""
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=3)
+    gather = mocker.spy(AnalyticsCollector, "_gather_csv_collection")
+
+    packages = collector.iter_gather(
+        subset=["config", "csv_one_day_slicing_1"], since=since, until=until
+    )
+    first = next(packages)
+    assert gather.call_count == 1
+    assert first["keys"] == {
+        "csv_one_day_slicing_1": {"since": since, "until": since + timedelta(days=1)}
+    }
+    assert first["tar_size"] > 0
+    assert first["shipping_successful"] is None  # dry run
+
+    # Caller consumes and deletes tarballs
+    with tarfile.open(first["tar_path"], "r:gz") as archive:
+        assert "./csv_one_day_slicing_1.csv" in archive.getnames()
+    os.remove(first["tar_path"])
+    rest = list(packages)
+
+    assert gather.call_count == 3
+    assert [package["keys"]["csv_one_day_slicing_1"]["until"] for package in rest] == [
+        since + timedelta(days=2),
+        until,
+    ]
+    assert not collector.tmp_dir.exists()
+    collector.delete_tarballs()
+
+
+def test_iter_gather_closed_early(mocker, collector):
+    """Gathering stops, timestamps aren't persisted, lock is released"""
+    until = now().replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=3)
+    finalize = mocker.spy(AnalyticsCollector, "_gather_finalize")
+
+    packages = collector.iter_gather(
+        subset=["config", "csv_one_day_slicing_1"], since=since, until=until
+    )
+    next(packages)
+    packages.close()
+
+    assert finalize.call_count == 0
+    assert not collector.tmp_dir.exists()
+
+    tgz_files = collector.gather(
+        subset=["config", "csv_one_day_slicing_1"], since=since, until=until
+    )
+    assert len(tgz_files) == 3
+    collector._gather_cleanup()
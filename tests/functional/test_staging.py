@@ -0,0 +1,101 @@
+import csv
+import io
+import tarfile
+
+import pytest
+import tests.functional.collector_module9_rows
+from insights_analytics_collector import CsvRowsWriter, StagedFile, Staging
+from tests.classes.analytics_collector import AnalyticsCollector
+
+
+@pytest.fixture
+def collector():
+    return AnalyticsCollector(
+        collector_module=tests.functional.collector_module9_rows,
+        collection_type=AnalyticsCollector.DRY_RUN,
+    )
+
+
+def test_small_files_in_memory(tmp_path):
+    staging = Staging(tmp_path, max_file_size=100, max_memory_size=250)
+
+    small = staging.create("small")
+    small.write(b"x" * 100)
+    small.close()
+    big = staging.create("big")
+    big.write(b"x" * 101)
+    big.close()
+    assert small.in_memory()
+    assert not big.in_memory()
+    assert staging.reserved_memory_size == 100
+
+    # Memory for max_file_size isn't available => on disk right away
+    reserving = staging.create("reserving")
+    spilled = staging.create("spilled")
+    assert not spilled.in_memory()
+
+    reserving.discard()
+    small.discard()
+    big.discard()
+    spilled.discard()
+    assert staging.reserved_memory_size == 0
+
+
+def test_staged_file_to_tar(tmp_path):
+    staged_file = Staging(tmp_path, 1000, 1000).create("table")
+    staged_file.write(b"id\n1\n")
+    staged_file.close()
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        staged_file.add_to_tar(tar, "./table.csv", 0)
+    buffer.seek(0)
+    with tarfile.open(fileobj=buffer, mode="r:gz") as tar:
+        assert tar.extractfile("./table.csv").read() == b"id\n1\n"
+
+
+def test_rows_writer_discards_staged_files(tmp_path):
+    staging = Staging(tmp_path, 1000, 10000)
+
+    def rows():
+        yield (1, "a")
+        raise RuntimeError("Connection lost")
+
+    with pytest.raises(RuntimeError):
+        CsvRowsWriter(tmp_path, "table", 100, staging=staging).write(
+            ["id", "name"], rows()
+        )
+    assert staging.reserved_memory_size == 0
+
+
+def test_gathering_with_staging(collector, mocker):
+    """Rows and data_collection_status.csv are streamed to tarballs from memory"""
+    add_to_tar = mocker.spy(StagedFile, "add_to_tar")
+
+    tgz_files = collector.gather(subset=["config", "rows_events"])
+
+    arcnames = [call.args[2] for call in add_to_tar.call_args_list]
+    assert arcnames.count("./rows_events.csv") == 2
+    assert arcnames.count("./data_collection_status.csv") == 2
+
+    rows = []
+    for tgz_file in tgz_files:
+        with tarfile.open(tgz_file, "r:gz") as archive:
+            data = archive.extractfile("./rows_events.csv").read().decode("utf-8")
+            rows += list(csv.reader(io.StringIO(data)))[1:]
+    assert len(rows) == 80
+    # All staged files were discarded after shipping
+    assert collector.staging.reserved_memory_size == 0
+    collector._gather_cleanup()
+
+
+def test_staged_files_discarded_on_failure(collector, mocker):
+    mocker.patch.object(
+        collector, "_process_packages", side_effect=RuntimeError("disk full")
+    )
+
+    with pytest.raises(RuntimeError):
+        collector.gather(subset=["config", "rows_events"])
+
+    assert collector.staging.staged_files == set()
+    assert collector.staging.reserved_memory_size == 0